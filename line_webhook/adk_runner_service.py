@@ -2,96 +2,225 @@
 ADK Runner Service สำหรับรับข้อความจาก LINE และส่งต่อไปยัง ADK Agent
 """
 
+import concurrent.futures
 import logging
-from google.adk.runners import Runner
+import os
+from google.adk.agents.invocation_context import new_invocation_context_id
+from google.adk.events import Event
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
-from line_oa_campaign_manager.agent import line_oa_agent
+from line_oa_campaign_manager.agent import (
+    line_oa_agent,
+    line_bot_mcp_pool,
+    line_bot_mcp_breaker,
+    line_bot_mcp_breaker_toolset,
+    image_cache,
+    image_generation_stats,
+)
+from line_oa_campaign_manager import deadline, idempotency
+from agent_loop import get_agent_loop
+from session_cache import SessionCache
+from runner_pool import RunnerPool
+from turn_scheduler import SchedulerBusy, TurnScheduler
+from message_coalescer import MessageCoalescer
+from response_cache import DEFAULT_DENY_PATTERNS, DEFAULT_READ_ONLY_TOOLS, ResponseCache
+import metrics
+import tracing
 
 # ตั้งค่า logger
 logger = logging.getLogger(__name__)
+# บรรทัด debug ต่อ event ถูกสุ่มเก็บตาม LOG_SAMPLE_RATE (ดู log_config.SamplingFilter)
+SAMPLED = {"sample": True}
 
 # ---------------------------
 # Config
 # ---------------------------
 APP_NAME = "line_oa_campaign_manager"
 DEFAULT_USER_ID = "line_user"
+# เวลารอสูงสุดของ generate_text_sync (วินาที) นับตั้งแต่รับข้อความ รวมเวลารอคิว
+SYNC_TIMEOUT_SECONDS = 100.0
+# รอเกิน deadline ได้อีกเล็กน้อย เพื่อรับข้อความ fallback จาก turn ที่หมดเวลา
+SYNC_GRACE_SECONDS = 2.0
+# เวลาสูงสุดของ agent turn หนึ่งครั้ง รวม model calls, tool calls และ retries ภายใน turn (วินาที)
+AGENT_TURN_TIMEOUT_SECONDS = float(os.getenv("AGENT_TURN_TIMEOUT_SECONDS", "60"))
+# session ของผู้ใช้หมดอายุเมื่อไม่มีข้อความเข้ามาเกินเวลานี้ (วินาที)
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+# จำนวน session สูงสุดที่เก็บในหน่วยความจำ (เกินแล้วลบตัวที่ใช้ล่าสุดน้อยที่สุด)
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "1000"))
+# จำนวน Runner สูงสุด (หนึ่งตัวต่อ event loop)
+RUNNER_POOL_SIZE = int(os.getenv("RUNNER_POOL_SIZE", "4"))
+# จำนวน agent turns ที่รันพร้อมกันสูงสุด (ทุกผู้ใช้รวมกัน)
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+# จำนวน turns ที่รอคิวได้สูงสุด ทั้งหมดและต่อผู้ใช้ (เกินแล้วตอบ BUSY_MESSAGE)
+AGENT_MAX_PENDING = int(os.getenv("AGENT_MAX_PENDING", "100"))
+AGENT_MAX_PENDING_PER_USER = int(os.getenv("AGENT_MAX_PENDING_PER_USER", "5"))
+BUSY_MESSAGE = "ขณะนี้มีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้งในอีกสักครู่ครับ"
+# รวมข้อความที่ผู้ใช้ส่งติดกันภายในช่วงเวลานี้เป็น turn เดียว (มิลลิวินาที, 0 = ปิด)
+COALESCE_WINDOW_MS = float(os.getenv("COALESCE_WINDOW_MS", "0"))
+# cache คำตอบของคำถามซ้ำแบบ FAQ (ปิดไว้เป็นค่าเริ่มต้น)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+# regex คั่นด้วย comma: ALLOW (ถ้ากำหนด) cache เฉพาะข้อความที่ตรง, DENY เพิ่มจาก default ที่กันคำสั่งส่ง/บรอดแคสต์
+RESPONSE_CACHE_ALLOW = [p.strip() for p in os.getenv("RESPONSE_CACHE_ALLOW", "").split(",") if p.strip()]
+RESPONSE_CACHE_DENY = [p.strip() for p in os.getenv("RESPONSE_CACHE_DENY", "").split(",") if p.strip()]
+# generate_text_sync คืนค่านี้เมื่อข้อความถูกรวมเข้ากับข้อความถัดไปของผู้ใช้ (ไม่ต้องตอบกลับ)
+COALESCED = object()
+# จับเวลา tool calls ทุกตัว (MCP tools และ gemini_generate_image) ลง /metrics
+metrics.instrument_agent(line_oa_agent)
 # ใช้ InMemorySessionService เพื่อหลีกเลี่ยงปัญหา database schema ใน Cloud Run
 session_service = InMemorySessionService()
-print(f"[ADK] InMemorySessionService initialized successfully")
+logger.info("[ADK] InMemorySessionService initialized successfully")
+
+# Runner ใช้ร่วมกันทุกผู้ใช้ (หนึ่งตัวต่อ event loop)
+runner_pool = RunnerPool(
+    line_oa_agent,
+    APP_NAME,
+    session_service,
+    max_runners=RUNNER_POOL_SIZE,
+)
+
+# เก็บ mapping: user_id -> session_id พร้อม idle TTL และจำกัดจำนวนแบบ LRU
+session_cache = SessionCache(
+    session_service,
+    APP_NAME,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    max_entries=SESSION_MAX_ENTRIES,
+)
 
-runner = Runner(
-    agent=line_oa_agent,
-    app_name=APP_NAME,
-    session_service=session_service,
+# turns ของผู้ใช้คนเดียวกันรันตามลำดับ ผู้ใช้ต่างคนรันพร้อมกันได้ตาม AGENT_MAX_CONCURRENCY
+turn_scheduler = TurnScheduler(
+    max_concurrency=AGENT_MAX_CONCURRENCY,
+    max_pending=AGENT_MAX_PENDING,
+    max_pending_per_user=AGENT_MAX_PENDING_PER_USER,
 )
 
-# เก็บ mapping: user_id -> session_id (อยู่ในหน่วยความจำของโปรเซสนี้)
-# ลบ cache เพื่อให้สร้าง session ใหม่เสมอ (แก้ปัญหา database schema)
-user_sessions: dict[str, str] = {}
+message_coalescer = MessageCoalescer(window_seconds=COALESCE_WINDOW_MS / 1000)
 
-# เก็บ runner instances แยกตาม user เพื่อป้องกัน event loop conflicts
-user_runners: dict[str, Runner] = {}
+response_cache = ResponseCache(
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    allow_patterns=RESPONSE_CACHE_ALLOW,
+    deny_patterns=[*DEFAULT_DENY_PATTERNS, *RESPONSE_CACHE_DENY],
+    read_only_tools=DEFAULT_READ_ONLY_TOOLS,
+) if RESPONSE_CACHE_ENABLED else None
 
 
 # -------------------------
-async def get_or_create_session(user_id: str) -> str:
-    """สร้าง session ใหม่เสมอเพื่อหลีกเลี่ยงปัญหา database schema"""
-    # สร้าง session ใหม่เสมอเพื่อหลีกเลี่ยงปัญหา database schema
+async def get_or_create_session(user_id: str, sessions: SessionCache | None = None) -> str:
+    """ใช้ session เดิมของผู้ใช้ถ้ายังไม่หมดอายุ ไม่เช่นนั้นสร้าง session ใหม่ (sessions: ค่าเริ่มต้นคือ session_cache)"""
+    if sessions is None:
+        sessions = session_cache
     try:
-        new_session = await session_service.create_session(
-            app_name=APP_NAME,
-            user_id=user_id,
-            state={},  # ใส่ state เริ่มต้นได้ตามต้องการ
-        )
-        user_sessions[user_id] = new_session.id
-        print(f"[ADK] Created new session for {user_id}: {new_session.id}")
-        return new_session.id
+        session_id = await sessions.get_or_create(user_id)
+        logger.debug("[ADK] Using session for %s: %s", user_id, session_id)
+        return session_id
     except Exception as e:
-        print(f"[ADK] Error creating session: {e}")
-        import traceback
-        print(f"[ADK] Session creation traceback: {traceback.format_exc()}")
+        logger.exception(f"[ADK] Error creating session: {e}")
         # Fallback: สร้าง session ID แบบง่าย
         fallback_session_id = f"fallback_{user_id}_{hash(user_id) % 10000}"
-        user_sessions[user_id] = fallback_session_id
-        print(f"[ADK] Using fallback session ID: {fallback_session_id}")
+        logger.warning(f"[ADK] Using fallback session ID: {fallback_session_id}")
         return fallback_session_id
 
 
+async def record_cached_exchange(
+    user_id: str, texts: list[str], response: str, sessions: SessionCache | None = None
+) -> None:
+    """บันทึกข้อความของผู้ใช้และคำตอบจาก response cache ลง session (turn ถัดไปของ agent เห็นประวัติครบ)"""
+    if sessions is None:
+        sessions = session_cache
+    try:
+        session_id = await get_or_create_session(user_id, sessions)
+        session = await sessions.session_service.get_session(
+            app_name=sessions.app_name, user_id=user_id, session_id=session_id
+        )
+        if session is None:
+            return
+        invocation_id = new_invocation_context_id()
+        await sessions.session_service.append_event(session, Event(
+            invocation_id=invocation_id,
+            author="user",
+            content=types.Content(role="user", parts=[types.Part(text=text) for text in texts]),
+        ))
+        await sessions.session_service.append_event(session, Event(
+            invocation_id=invocation_id,
+            author=line_oa_agent.name,
+            content=types.Content(role="model", parts=[types.Part(text=response)]),
+        ))
+    except Exception as e:
+        logger.warning(f"[ADK] Failed to record cached response in session: {e}")
+
+
+def warm_up() -> None:
+    """เริ่ม agent loop และ pre-warm MCP server pool ใน background (ไม่ block)"""
+    agent_loop = get_agent_loop()
+    if line_bot_mcp_pool is not None:
+        agent_loop.submit(line_bot_mcp_pool.start())
+        logger.info(f"[ADK] Pre-warming MCP server pool (size={line_bot_mcp_pool.size})")
+
+
+BREAKER_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _on_breaker_state_change(old_state: str, new_state: str) -> None:
+    metrics.MCP_BREAKER_STATE.set(BREAKER_STATE_VALUES[new_state])
+    metrics.MCP_BREAKER_TRANSITIONS.labels(new_state).inc()
+
+
+line_bot_mcp_breaker.on_state_change = _on_breaker_state_change
+
+
+def mcp_breaker_stats() -> dict | None:
+    """สถานะ circuit breaker ของ LINE MCP toolset (None ถ้าไม่ได้เปิดใช้หรือไม่มี MCP toolset)"""
+    if line_bot_mcp_breaker_toolset is None:
+        return None
+    return line_bot_mcp_breaker_toolset.breaker.stats()
+
+
+def stats() -> dict:
+    """สถิติของ session cache, turn scheduler, runner pool, MCP server pool, circuit breaker และการสร้างรูปภาพ"""
+    return {
+        "sessions": session_cache.stats(),
+        "scheduler": turn_scheduler.stats(),
+        "coalescer": message_coalescer.stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "runners": runner_pool.stats(),
+        "mcp_pool": line_bot_mcp_pool.stats() if line_bot_mcp_pool else None,
+        "mcp_breaker": mcp_breaker_stats(),
+        "image_cache": image_cache.stats() if image_cache else None,
+        "image_generation": image_generation_stats(),
+    }
+
+
 # ---------------------------
 # Event processing
 # ---------------------------
 async def process_agent_response(event) -> str | None:
     """คืนข้อความสุดท้าย (final response) หาก event นั้นเป็น final หรือมี text content"""
-    # debug เล็กน้อย (ไม่บังคับ)
-    print(f"[event] id={event.id} author={event.author}")
-
-    # พิมพ์ text part (ถ้ามี) เพื่อดู trace ระหว่างรัน
-    if event.content and event.content.parts:
-        for part in event.content.parts:
-            if getattr(part, "text", None):
-                txt = part.text.strip()
-                if txt:
-                    print(f"  text: {txt[:500]}")  # limit log
-
-            if getattr(part, "tool_response", None):
-                print(f"  tool: {part.tool_response.output}")
-
-            if getattr(part, "executable_code", None):
-                print("  code generated")
-            if getattr(part, "code_execution_result", None):
-                print(f"  code result: {part.code_execution_result.outcome}")
+    # trace ระหว่างรัน (ระดับ DEBUG และสุ่มเก็บ เพื่อไม่ให้ log ท่วมเมื่อมีโหลด)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[event] id=%s author=%s", event.id, event.author, extra=SAMPLED)
+        if event.content and event.content.parts:
+            for part in event.content.parts:
+                if getattr(part, "text", None) and part.text.strip():
+                    logger.debug("  text: %s", part.text.strip(), extra=SAMPLED)
+                if getattr(part, "tool_response", None):
+                    logger.debug("  tool: %s", part.tool_response.output, extra=SAMPLED)
+                if getattr(part, "executable_code", None):
+                    logger.debug("  code generated", extra=SAMPLED)
+                if getattr(part, "code_execution_result", None):
+                    logger.debug("  code result: %s", part.code_execution_result.outcome, extra=SAMPLED)
 
     # ตรวจสอบว่ามี text content หรือไม่ (ไม่จำเป็นต้องเป็น final response เสมอ)
     if event.content and event.content.parts:
         for part in event.content.parts:
             if getattr(part, "text", None) and part.text.strip():
                 text_content = part.text.strip()
-                print(f"[ADK] Found text content: {text_content[:100]}...")
+                logger.debug("[ADK] Found text content: %.100s", text_content, extra=SAMPLED)
                 
                 # ถ้าเป็น final response ให้คืนทันที
                 if event.is_final_response():
-                    print(f"[ADK] Final response detected: {text_content[:100]}...")
+                    logger.debug("[ADK] Final response detected: %.100s", text_content)
                     return text_content
                 
                 # ถ้าไม่ใช่ final response แต่มี text content ให้เก็บไว้
@@ -100,47 +229,78 @@ async def process_agent_response(event) -> str | None:
 
     # ถ้าเป็น final response แต่ไม่มี text content
     if event.is_final_response():
-        print("[ADK] Final response detected but no text content")
+        logger.debug("[ADK] Final response detected but no text content")
         return None
 
     return None
 
-async def generate_text(user_input: str, user_id: str | None = None) -> str:
+async def generate_text(
+    user_input: str | list[str],
+    user_id: str | None = None,
+    *,
+    runners: RunnerPool | None = None,
+    sessions: SessionCache | None = None,
+) -> str:
     """
     รับข้อความจากผู้ใช้และส่งต่อไปยัง ADK Agent
     - ถ้า user_id ซ้ำ จะอ้างอิง session เดิมเสมอ
+    - user_input เป็น list ได้ (ข้อความที่ถูกรวม) จะส่งเป็น Content เดียวที่มีหลาย parts
+    - ถ้าเปิด RESPONSE_CACHE_ENABLED คำถามซ้ำจะได้คำตอบจาก cache โดยไม่รัน agent
+    - session ของผู้ใช้ไม่ถูก evict หรือหมดอายุระหว่าง turn
+    - runners/sessions: RunnerPool และ SessionCache ที่ใช้ (ค่าเริ่มต้นคือ runner_pool และ session_cache ของโมดูล)
     """
+    current_user_id = user_id or DEFAULT_USER_ID
+    if runners is None:
+        runners = runner_pool
+    if sessions is None:
+        sessions = session_cache
+    with sessions.turn(current_user_id):
+        return await _run_turn(user_input, current_user_id, runners, sessions)
+
+
+async def _run_turn(
+    user_input: str | list[str], current_user_id: str, runners: RunnerPool, sessions: SessionCache
+) -> str:
+    """turn หนึ่งของ generate_text (รันภายใน sessions.turn)"""
     import asyncio
 
-    current_user_id = user_id or DEFAULT_USER_ID
-    logger.info(f"[ADK] Processing message from {current_user_id}: {user_input[:100]}...")
+    texts = [user_input] if isinstance(user_input, str) else list(user_input)
+    logger.info(
+        "[ADK] Processing %d message(s) from %s: %.100s", len(texts), current_user_id, texts[-1],
+        extra={"user_id": current_user_id},
+    )
+
+    cache_key_text = "\n".join(texts)
+    if response_cache is not None:
+        # cache แยกตามผู้ใช้: คำตอบจาก read-only tools (เช่น get_profile) เป็นข้อมูลของผู้ใช้คนนั้น
+        cached_response = response_cache.get(cache_key_text, scope=current_user_id)
+        if cached_response is not None:
+            logger.info("[ADK] Response cache hit for %s", current_user_id)
+            await record_cached_exchange(current_user_id, texts, cached_response, sessions)
+            return cached_response
+    # ชื่อ tools ที่ agent เรียกใน turn นี้ (ใช้ตัดสินว่า cache คำตอบได้หรือไม่)
+    tool_names: set[str] = set()
 
     try:
         # 1) ดึง/สร้าง session
-        session_id = await get_or_create_session(current_user_id)
-        logger.info(f"[ADK] Using session: {session_id}")
+        with metrics.observe_stage("session_acquisition"):
+            session_id = await get_or_create_session(current_user_id, sessions)
+        logger.debug("[ADK] Using session: %s", session_id)
 
         # 2) เตรียม content
-        content = types.Content(role="user", parts=[types.Part(text=user_input)])
-
-        # 3) ใช้ runner แยกตาม user เพื่อป้องกัน event loop conflicts
-        if current_user_id not in user_runners:
-            print(f"[ADK] Creating new runner for user: {current_user_id}")
-            user_runners[current_user_id] = Runner(
-                agent=line_oa_agent,
-                app_name=APP_NAME,
-                session_service=session_service,
-            )
-        
-        user_runner = user_runners[current_user_id]
+        content = types.Content(role="user", parts=[types.Part(text=text) for text in texts])
+
+        # 3) ใช้ runner ที่แชร์กันใน event loop นี้
+        user_runner = runners.get_runner()
         
         # 4) รัน agent และดึงคำตอบสุดท้าย
         async def run_once() -> str | None:
             final_text = None
             last_text_response = None
             event_count = 0
+            event_spans = tracing.EventSpans()
             try:
-                print(f"[ADK] Starting agent run for session: {session_id}")
+                logger.debug("[ADK] Starting agent run for session: %s", session_id)
                 
                 # ใช้ try-except เพื่อจัดการกับ async generator
                 try:
@@ -153,28 +313,31 @@ async def generate_text(user_input: str, user_id: str | None = None) -> str:
                     try:
                         async for event in async_gen:
                             event_count += 1
-                            print(f"[ADK] Event {event_count}: {event.id}")
+                            logger.debug("[ADK] Event %d: %s", event_count, event.id, extra=SAMPLED)
+                            event_spans.on_event(event)
+                            tool_names.update(call.name for call in event.get_function_calls())
                             
                             resp = await process_agent_response(event)
                             if resp is not None:
                                 # ถ้าเป็น final response ให้คืนทันที
                                 if event.is_final_response():
                                     final_text = resp
-                                    print(f"[ADK] Final response received: {resp[:100]}...")
+                                    logger.debug("[ADK] Final response received: %.100s", resp)
                                     break
                                 else:
                                     # เก็บ response ล่าสุดไว้เผื่อไม่มี final response
                                     last_text_response = resp
-                                    print(f"[ADK] Non-final response received: {resp[:100]}...")
+                                    logger.debug("[ADK] Non-final response received: %.100s", resp, extra=SAMPLED)
                                 
-                        print(f"[ADK] Agent run completed. Total events: {event_count}")
+                        logger.info("[ADK] Agent run completed. Total events: %d", event_count)
                         
                         # ถ้าไม่มี final response แต่มี text response ให้ใช้ตัวล่าสุด
                         if final_text is None and last_text_response is not None:
                             final_text = last_text_response
-                            print(f"[ADK] Using last text response: {final_text[:100]}...")
+                            logger.debug("[ADK] Using last text response: %.100s", final_text)
                     
                     finally:
+                        event_spans.close()
                         # ปิด async generator อย่างปลอดภัย
                         try:
                             await async_gen.aclose()
@@ -182,178 +345,157 @@ async def generate_text(user_input: str, user_id: str | None = None) -> str:
                             # ไม่ log error นี้เพราะเป็นปัญหาใน MCP library
                             pass
                     
+                except deadline.DeadlineExceeded:
+                    raise
                 except Exception as gen_error:
-                    print(f"[ADK] Error in async generator: {gen_error}")
+                    logger.error(f"[ADK] Error in async generator: {gen_error}")
                     return None
                 
+            except deadline.DeadlineExceeded:
+                raise
             except RuntimeError as e:
                 if "Event loop is closed" in str(e):
-                    print("[ADK] Event loop closed error detected")
+                    logger.error("[ADK] Event loop closed error detected")
                     return None
                 else:
-                    print(f"[ADK] Runtime error: {e}")
+                    logger.error(f"[ADK] Runtime error: {e}")
                     raise
             except Exception as e:
-                print(f"[ADK] Error in run_once: {e}")
-                import traceback
-                print(f"[ADK] Traceback: {traceback.format_exc()}")
+                logger.exception(f"[ADK] Error in run_once: {e}")
                 return None
             return final_text
 
-        # กำหนด timeout 60 วินาที เพื่อรอคำตอบจาก ADK Agent
-        # เพิ่ม retry mechanism สำหรับ MCP toolset ที่ไม่เสถียร
-        max_retries = 3
-        for attempt in range(max_retries):
+        # deadline เดียวต่อ turn: model calls, tool calls และ retries ของแต่ละ call ใช้เวลารวมไม่เกินนี้
+        # ไม่รัน turn ใหม่ทั้งหมดเมื่อล้มเหลว (จะเรียก model และ tools ที่ส่งข้อความซ้ำ)
+        final_response_text = None
+        with deadline.budget(AGENT_TURN_TIMEOUT_SECONDS) as turn_budget, idempotency.turn_scope() as ledger:
             try:
-                print(f"[ADK] Starting agent with 60s timeout (attempt {attempt + 1}/{max_retries})...")
-                final_response_text = await asyncio.wait_for(run_once(), timeout=60.0)
-                print(f"[ADK] Agent completed successfully")
-                break  # สำเร็จแล้ว ออกจาก loop
+                logger.debug("[ADK] Starting agent with %.1fs budget", turn_budget.remaining())
+                with metrics.observe_stage("agent_run"), tracing.span("adk.agent_run", session_id=session_id):
+                    final_response_text = await asyncio.wait_for(
+                        run_once(), timeout=turn_budget.remaining()
+                    )
+                logger.debug("[ADK] Agent completed successfully")
             except asyncio.TimeoutError:
-                print(f"[ADK] Timeout: agent took more than 60 seconds (attempt {attempt + 1})")
-                if attempt == max_retries - 1:
-                    return None
-                print(f"[ADK] Retrying...")
-                await asyncio.sleep(2)  # รอ 2 วินาทีก่อน retry
+                logger.warning("[ADK] Timeout: agent turn ran out of its deadline budget")
+                metrics.AGENT_TIMEOUTS.labels("agent_run").inc()
+                return None
             except RuntimeError as e:
                 if "Event loop is closed" in str(e):
-                    print("[ADK] Event loop closed error in wait_for")
+                    logger.error("[ADK] Event loop closed error in wait_for")
                     return None
                 elif "cancel scope" in str(e).lower():
-                    print(f"[ADK] MCP cancel scope error (attempt {attempt + 1}): {e}")
-                    if attempt == max_retries - 1:
-                        return None
-                    print(f"[ADK] Retrying...")
-                    await asyncio.sleep(2)  # รอ 2 วินาทีก่อน retry
+                    logger.warning(f"[ADK] MCP cancel scope error: {e}")
                 else:
-                    print(f"[ADK] Runtime error in wait_for: {e}")
+                    logger.error(f"[ADK] Runtime error in wait_for: {e}")
                     raise
             except Exception as e:
-                print(f"[ADK] Unexpected error in wait_for (attempt {attempt + 1}): {e}")
-                if attempt == max_retries - 1:
-                    return None
-                print(f"[ADK] Retrying...")
-                await asyncio.sleep(2)  # รอ 2 วินาทีก่อน retry
+                logger.warning(f"[ADK] Unexpected error in wait_for: {e}")
+                return None
+            finally:
+                metrics.AGENT_RETRIES.inc(turn_budget.retries)
+                metrics.DUPLICATE_TOOL_CALLS.inc(ledger.suppressed)
 
         # 5) ส่งเฉพาะคำตอบจาก agent จริงๆ
         if final_response_text and final_response_text.strip():
-            print(f"[ADK] Agent response: {final_response_text[:100]}...")
+            logger.info("[ADK] Agent response: %.100s", final_response_text)
+            if response_cache is not None:
+                response_cache.put(cache_key_text, final_response_text, tool_names, scope=current_user_id)
             return final_response_text
         
-        print("[ADK] No response received from agent")
+        logger.warning("[ADK] No response received from agent")
         
         # ถ้า agent ไม่ตอบเลย ให้ส่งข้อความ fallback
         fallback_message = "ขออภัยครับ ฉันไม่สามารถตอบคำถามนี้ได้ในขณะนี้ กรุณาลองใหม่อีกครั้งครับ"
-        print(f"[ADK] Using fallback response: {fallback_message}")
+        logger.info("[ADK] Using fallback response")
+        metrics.AGENT_FALLBACKS.inc()
         return fallback_message
 
     except Exception as e:
-        import traceback
-        print(f"[ADK] Error in generate_text: {e}")
-        print(f"[ADK] Traceback: {traceback.format_exc()}")
+        logger.exception(f"[ADK] Error in generate_text: {e}")
         return None
 
 
 # ---------------------------
 # Synchronous wrapper for Flask
 # ---------------------------
-def generate_text_sync(user_input: str, user_id: str | None = None) -> str:
+def submit_text(
+    user_input: str,
+    user_id: str | None = None,
+    timeout: float = SYNC_TIMEOUT_SECONDS,
+) -> concurrent.futures.Future:
     """
-    Synchronous wrapper สำหรับ generate_text เพื่อใช้กับ Flask
+    ส่ง turn เข้า agent loop ถาวรของโปรเซสโดยไม่รอผล (รอผลด้วย wait_text)
+    - timeout เป็น deadline ของ turn (turn ที่รอคิวจนเวลาหมดจะไม่ถูกรัน)
+    - turns ของผู้ใช้คนเดียวกันรันตามลำดับผ่าน turn_scheduler
     """
-    import asyncio
-    import threading
-    import signal
-    import os
-    
-    logger.info(f"[ADK-SYNC] Starting sync wrapper for user: {user_id}")
-    logger.info(f"[ADK-SYNC] Input message: {user_input}")
-    
-    # ใช้ threading เพื่อหลีกเลี่ยงปัญหา event loop
-    result_container = [None]
-    error_container = [None]
-    loop_container = [None]
-    
-    def run_in_thread():
-        try:
-            # สร้าง event loop ใหม่ใน thread นี้
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop_container[0] = loop
-            
-            try:
-                logger.info(f"[ADK-SYNC] Running async function in thread...")
-                result = loop.run_until_complete(generate_text(user_input, user_id))
-                result_container[0] = result
-                logger.info(f"[ADK-SYNC] Completed successfully - Result: {result}")
-            except Exception as e:
-                logger.error(f"[ADK-SYNC] Error in async function: {e}")
-                error_container[0] = e
-            finally:
-                # ปิด loop อย่างปลอดภัย
-                try:
-                    # รอสักครู่เพื่อให้ async operations เสร็จสิ้น
-                    import time
-                    time.sleep(0.2)
-                    
-                    # ยกเลิก pending tasks ก่อน
-                    pending = asyncio.all_tasks(loop)
-                    if pending:
-                        print(f"[ADK-SYNC] Cancelling {len(pending)} pending tasks")
-                        for task in pending:
-                            if not task.done():
-                                task.cancel()
-                        
-                        # รอให้ tasks ยกเลิกเสร็จ
-                        try:
-                            if pending:
-                                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                        except Exception as gather_error:
-                            print(f"[ADK-SYNC] Error gathering tasks: {gather_error}")
-                    
-                    # รอสักครู่เพื่อให้ subprocess cleanup เสร็จ
-                    time.sleep(0.3)
-                    
-                    # ปิด loop
-                    if not loop.is_closed():
-                        loop.close()
-                        print("[ADK-SYNC] Event loop closed safely")
-                        
-                except Exception as close_error:
-                    print(f"[ADK-SYNC] Error closing loop: {close_error}")
-                    
-        except Exception as e:
-            import traceback
-            print(f"[ADK-SYNC] Error in thread: {e}")
-            print(f"[ADK-SYNC] Traceback: {traceback.format_exc()}")
-            error_container[0] = e
-    
-    # รันใน thread พร้อม timeout
-    thread = threading.Thread(target=run_in_thread, daemon=True)
-    thread.start()
-    thread.join(timeout=100)  # timeout 100 วินาที
-    
-    # ถ้า thread ยังทำงานอยู่ ให้ยกเลิก
-    if thread.is_alive():
-        print("[ADK-SYNC] Thread timeout - forcing cleanup")
-        try:
-            if loop_container[0] and not loop_container[0].is_closed():
-                # ส่งสัญญาณให้หยุด
-                loop_container[0].call_soon_threadsafe(lambda: None)
-                # รอสักครู่เพื่อให้ cleanup เสร็จ
-                import time
-                time.sleep(0.2)
-        except Exception as cleanup_error:
-            print(f"[ADK-SYNC] Cleanup error: {cleanup_error}")
+    logger.debug("[ADK-SYNC] Submitting turn for user: %s", user_id)
+    logger.debug("[ADK-SYNC] Input message: %s", user_input)
+
+    current_user_id = user_id or DEFAULT_USER_ID
+
+    async def coalesced_turn():
+        texts = await message_coalescer.submit(current_user_id, user_input)
+        if texts is None:
+            return COALESCED
+        return await turn_scheduler.run(current_user_id, lambda: generate_text(texts, user_id))
+
+    # deadline เริ่มนับตั้งแต่รับข้อความ (contextvar ถูกส่งต่อไปยัง turn บน agent loop)
+    with deadline.budget(timeout):
+        return get_agent_loop().submit(coalesced_turn())
+
+
+def wait_text(future: concurrent.futures.Future, user_id: str | None = None, timeout: float | None = None) -> str:
+    """
+    รอผลของ turn จาก submit_text ไม่เกิน timeout วินาที (เกินแล้วยกเลิก turn)
+    - ถ้าคิวเต็มจะคืน BUSY_MESSAGE
+    - ถ้าเปิด COALESCE_WINDOW_MS และข้อความถูกรวมเข้ากับข้อความถัดไป จะคืน COALESCED
+    - error หรือไม่มีคำตอบคืน None
+    """
+    try:
+        result = future.result(timeout=timeout)
+    except SchedulerBusy:
+        logger.warning(f"[ADK-SYNC] Agent is busy, rejecting message from {user_id}")
+        return BUSY_MESSAGE
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        logger.error(f"[ADK-SYNC] Timeout - agent did not finish in time for user: {user_id}")
+        metrics.AGENT_TIMEOUTS.labels("sync_wait").inc()
+        metrics.AGENT_EMPTY_RESPONSES.inc()
         return None
-    
-    if error_container[0]:
-        print(f"[ADK-SYNC] Thread error: {error_container[0]}")
+    except Exception as e:
+        logger.exception(f"[ADK-SYNC] Error in agent loop: {e}")
+        metrics.AGENT_EMPTY_RESPONSES.inc()
         return None  # ส่ง None แทนข้อความ error
-    
-    if result_container[0]:
-        logger.info(f"[ADK-SYNC] Returning result: {result_container[0][:100]}...")
-        return result_container[0]
+
+    if result is COALESCED:
+        logger.info(f"[ADK-SYNC] Message from {user_id} merged into a later turn")
+        return COALESCED
+    if result:
+        logger.debug("[ADK-SYNC] Returning result: %.100s", result)
+        return result
     else:
         logger.warning(f"[ADK-SYNC] No result returned for user: {user_id}")
+        metrics.AGENT_EMPTY_RESPONSES.inc()
         return None  # ส่ง None แทนข้อความ error
+
+
+def generate_text_sync(
+    user_input: str,
+    user_id: str | None = None,
+    timeout: float = SYNC_TIMEOUT_SECONDS,
+) -> str:
+    """
+    Synchronous wrapper สำหรับ generate_text เพื่อใช้กับ Flask
+    - ส่ง coroutine เข้า agent loop ถาวรของโปรเซส แล้วรอผลตาม timeout (submit_text + wait_text)
+    - timeout เป็น deadline ของ turn ด้วย (turn ที่รอคิวจนเวลาหมดจะไม่ถูกรัน)
+    - ถ้าคิวเต็มจะคืน BUSY_MESSAGE ทันที
+    - ถ้าเปิด COALESCE_WINDOW_MS และข้อความถูกรวมเข้ากับข้อความถัดไป จะคืน COALESCED
+    """
+    try:
+        future = submit_text(user_input, user_id, timeout)
+    except Exception as e:
+        logger.exception(f"[ADK-SYNC] Error in agent loop: {e}")
+        metrics.AGENT_EMPTY_RESPONSES.inc()
+        return None
+    return wait_text(future, user_id, timeout + SYNC_GRACE_SECONDS)
@@ -0,0 +1,150 @@
+"""
+Agent loop ถาวรของโปรเซส สำหรับรัน coroutine ของ ADK Agent จาก Flask handler
+
+ทุกข้อความจาก LINE จะถูกส่งเข้า event loop เดียวกันที่รันอยู่ใน background thread
+ทำให้ Runner, InMemorySessionService และการเชื่อมต่อ MCP ถูกใช้ซ้ำข้ามข้อความได้
+แทนการสร้าง thread + event loop ใหม่ทุกครั้ง
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AgentLoop:
+    """event loop ที่รันค้างไว้ใน daemon thread และรับ coroutine จาก thread อื่น"""
+
+    def __init__(self, name: str = "adk-agent-loop"):
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """คืน event loop (เริ่ม thread ให้อัตโนมัติถ้ายังไม่ได้เริ่ม)"""
+        self.start()
+        return self._loop
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _ready(self) -> bool:
+        # thread อาจ alive แล้วแต่ _run ยังไม่ได้ตั้ง self._loop
+        return self.is_running() and self._started.is_set()
+
+    def in_loop_thread(self) -> bool:
+        """True ถ้าถูกเรียกจาก thread ของ agent loop เอง"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def start(self) -> None:
+        """เริ่ม background thread ของ loop (เรียกซ้ำได้)"""
+        if self._ready():
+            return
+        with self._lock:
+            if self.is_running():
+                return
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            self._started.wait()
+            logger.info(f"[AGENT-LOOP] Started persistent event loop: {self.name}")
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            # ยกเลิก task ที่ค้างอยู่และปิด async generator ก่อนปิด loop
+            try:
+                pending = [task for task in asyncio.all_tasks(loop) if not task.done()]
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            except Exception as e:
+                logger.warning(f"[AGENT-LOOP] Error during loop shutdown: {e}")
+            finally:
+                loop.close()
+                logger.info(f"[AGENT-LOOP] Event loop closed: {self.name}")
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """ส่ง coroutine เข้า loop และคืน concurrent.futures.Future"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("submit() must not be called from the agent loop thread")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float | None = None):
+        """
+        รัน coroutine บน agent loop และรอผลลัพธ์แบบ blocking
+
+        Raises:
+            concurrent.futures.TimeoutError: ถ้าเกิน timeout (coroutine จะถูกยกเลิก)
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """หยุด loop และรอให้ thread ปิดตัว"""
+        with self._lock:
+            if not self.is_running():
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+
+# ---------------------------
+# Process-wide singleton
+# ---------------------------
+_agent_loop: AgentLoop | None = None
+_agent_loop_pid: int | None = None
+_agent_loop_lock = threading.Lock()
+
+
+def get_agent_loop() -> AgentLoop:
+    """
+    คืน AgentLoop หนึ่งตัวต่อโปรเซส
+    - ถ้าโปรเซสถูก fork (เช่น gunicorn worker) จะสร้าง loop ใหม่ให้ child process
+    """
+    global _agent_loop, _agent_loop_pid
+    pid = os.getpid()
+    if _agent_loop is not None and _agent_loop_pid == pid:
+        return _agent_loop
+    with _agent_loop_lock:
+        if _agent_loop is None or _agent_loop_pid != pid:
+            _agent_loop = AgentLoop()
+            _agent_loop_pid = pid
+        return _agent_loop
+
+
+def run_coroutine(coro, timeout: float | None = None):
+    """shortcut สำหรับ get_agent_loop().run(coro, timeout)"""
+    return get_agent_loop().run(coro, timeout=timeout)
+
+
+def shutdown_agent_loop() -> None:
+    """ปิด agent loop ของโปรเซสนี้ (ใช้ตอน exit หรือในการทดสอบ)"""
+    global _agent_loop
+    with _agent_loop_lock:
+        loop, _agent_loop = _agent_loop, None
+    if loop is not None and _agent_loop_pid == os.getpid():
+        loop.stop()
+
+
+atexit.register(shutdown_agent_loop)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+HTTP server จำลองของ Gemini API และ LINE Messaging API สำหรับ benchmark/ทดสอบแบบออฟไลน์
+
+- Gemini:   POST .../models/{model}:generateContent (และ :streamGenerateContent แบบ SSE)
+            ตอบข้อความคงที่ ใช้กับ GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:<port>
+- LINE API: POST /v2/bot/chat/loading/start, /v2/bot/message/reply, /v2/bot/message/push
+            ใช้กับ LINE_API_HOST=http://127.0.0.1:<port>
+
+ทุก request ถูกหน่วงตาม latency (+ สุ่มเพิ่มไม่เกิน jitter) วินาที เพื่อจำลองเวลาของ API จริง
+ใช้ standard library เท่านั้น
+
+รัน: python api_standin_servers.py gemini --port 9001 --latency 0.5
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY_TEXT = "สวัสดีครับ นี่คือคำตอบจาก Gemini stand-in"
+
+
+class _StandinHTTPServer(ThreadingHTTPServer):
+    # backlog ค่าเริ่มต้น (5) ทำให้ connection ที่เปิดพร้อมกันจำนวนมากต้องรอ SYN retransmit (~1 วินาที)
+    request_queue_size = 128
+
+
+class StandinServer:
+    """ThreadingHTTPServer ที่รันใน background thread พร้อมตัวนับ request ตาม path"""
+
+    def __init__(self, handler_class, port: int = 0, latency: float = 0.0, jitter: float = 0.0, **options):
+        self.latency = latency
+        self.jitter = jitter
+        self.options = options
+        self.requests: dict[str, int] = {}
+        self.bodies: list[tuple[str, dict]] = []
+        self.arrived_at: list[float] = []  # time.perf_counter() ที่รับแต่ละ request (ลำดับเดียวกับ bodies)
+        self._lock = threading.Lock()
+        self.httpd = _StandinHTTPServer(("127.0.0.1", port), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=handler_class.__name__, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandinServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def record(self, path: str, body: dict) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.bodies.append((path, body))
+            self.arrived_at.append(time.perf_counter())
+
+    def count(self, suffix: str) -> int:
+        with self._lock:
+            return sum(n for path, n in self.requests.items() if path.endswith(suffix))
+
+    def arrivals(self, suffix: str) -> list[tuple[dict, float]]:
+        """(body, เวลาที่รับ) ของ requests ที่ path ลงท้ายด้วย suffix"""
+        with self._lock:
+            return [(body, at) for (path, body), at in zip(self.bodies, self.arrived_at) if path.endswith(suffix)]
+
+    def delay(self) -> None:
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def standin(self) -> StandinServer:
+        return self.server.standin
+
+    def log_message(self, format, *args):
+        pass  # ไม่ log ทุก request (รบกวนผล benchmark)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def send_json(self, status: int, payload: dict, content_type: str = "application/json") -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        if content_type == "text/event-stream":
+            body = b"data: " + body + b"\n\n"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GeminiHandler(_JsonHandler):
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        body = self.read_json()
+        self.standin.record(path, body)
+        self.standin.delay()
+        if not (path.endswith(":generateContent") or path.endswith(":streamGenerateContent")):
+            self.send_json(404, {"error": {"code": 404, "message": f"Unknown path: {path}", "status": "NOT_FOUND"}})
+            return
+        text = self.standin.options.get("reply_text", DEFAULT_REPLY_TEXT)
+        response = {
+            "candidates": [
+                {"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}
+            ],
+            "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 10, "totalTokenCount": 20},
+            "modelVersion": path.rsplit("/", 1)[-1].split(":", 1)[0],
+        }
+        stream = path.endswith(":streamGenerateContent")
+        self.send_json(200, response, "text/event-stream" if stream else "application/json")
+
+
+class LineApiHandler(_JsonHandler):
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        body = self.read_json()
+        self.standin.record(path, body)
+        self.standin.delay()
+        if path == "/v2/bot/chat/loading/start":
+            self.send_json(202, {})
+        elif path in ("/v2/bot/message/reply", "/v2/bot/message/push"):
+            sent = [{"id": str(i), "quoteToken": f"standin-{i}"} for i, _ in enumerate(body.get("messages", []))]
+            self.send_json(200, {"sentMessages": sent})
+        else:
+            self.send_json(404, {"message": f"Not found: {path}"})
+
+
+def start_gemini_standin(port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                         reply_text: str = DEFAULT_REPLY_TEXT) -> StandinServer:
+    return StandinServer(GeminiHandler, port, latency, jitter, reply_text=reply_text).start()
+
+
+def start_line_api_standin(port: int = 0, latency: float = 0.0, jitter: float = 0.0) -> StandinServer:
+    return StandinServer(LineApiHandler, port, latency, jitter).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("api", choices=["gemini", "line"])
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+    start = start_gemini_standin if args.api == "gemini" else start_line_api_standin
+    server = start(port=args.port, latency=args.latency, jitter=args.jitter)
+    print(f"{args.api} stand-in listening on {server.url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
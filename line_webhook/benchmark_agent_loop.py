@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark overhead ต่อข้อความของ generate_text_sync ด้วย agent จำลอง (stub)
+
+เปรียบเทียบ:
+- before: สร้าง thread + event loop ใหม่ทุกข้อความ และ sleep 0.2s + 0.3s ตอนปิด loop
+- after:  ส่ง coroutine เข้า agent loop ถาวรของโปรเซส
+
+รัน: python benchmark_agent_loop.py [จำนวนข้อความ]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import adk_runner_service
+
+
+async def stub_generate_text(texts: list[str], user_id: str | None = None) -> str:
+    """agent จำลองที่ตอบกลับทันที เพื่อวัดเฉพาะ overhead ของ wrapper (รับข้อความที่ถูกรวมเป็น list)"""
+    await asyncio.sleep(0)
+    return f"echo: {' '.join(texts)}"
+
+
+def legacy_generate_text_sync(user_input: str, user_id: str | None = None) -> str:
+    """จำลอง generate_text_sync แบบเดิม (thread + loop ใหม่ต่อข้อความ)"""
+    result_container = [None]
+
+    def run_in_thread():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            result_container[0] = loop.run_until_complete(
+                adk_runner_service.generate_text([user_input], user_id)
+            )
+        finally:
+            time.sleep(0.2)
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            time.sleep(0.3)
+            loop.close()
+
+    thread = threading.Thread(target=run_in_thread, daemon=True)
+    thread.start()
+    thread.join(timeout=100)
+    return result_container[0]
+
+
+def measure(label: str, func, iterations: int) -> list[float]:
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        response = func(f"ข้อความที่ {i}", "benchmark_user")
+        timings.append(time.perf_counter() - start)
+        assert response == f"echo: ข้อความที่ {i}", response
+    print(
+        f"{label:<8} mean={statistics.mean(timings) * 1000:9.2f} ms  "
+        f"p50={statistics.median(timings) * 1000:9.2f} ms  "
+        f"max={max(timings) * 1000:9.2f} ms"
+    )
+    return timings
+
+
+def run_benchmark(iterations: int = 20):
+    print("=" * 60)
+    print(f"Benchmark generate_text_sync overhead ({iterations} messages)")
+    print("=" * 60)
+
+    original = adk_runner_service.generate_text
+    adk_runner_service.generate_text = stub_generate_text
+    try:
+        before = measure("before", legacy_generate_text_sync, iterations)
+        after = measure("after", adk_runner_service.generate_text_sync, iterations)
+    finally:
+        adk_runner_service.generate_text = original
+
+    saved = statistics.mean(before) - statistics.mean(after)
+    print("-" * 60)
+    print(f"Per-message overhead saved: {saved * 1000:.2f} ms")
+    return before, after
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Load test แบบ end-to-end ของ webhook ด้วย server จริงและ API stand-ins
+
+- รัน main.py เป็น subprocess (Flask server เดียวกับที่ใช้ใน Docker) บน port ว่าง
+- Gemini API และ LINE Messaging API ถูกแทนด้วย api_standin_servers ที่หน่วงเวลาได้
+  (ผ่าน GOOGLE_GEMINI_BASE_URL และ LINE_API_HOST) ไม่ต้องใช้ credentials จริง
+- ส่ง webhook ที่ลงลายเซ็นด้วย CHANNEL_SECRET ถูกต้อง หนึ่ง event ต่อ request
+  ที่ concurrency เพิ่มขึ้นเรื่อยๆ แล้ววัด latency ของ request (webhook ack) และ latency จนถึง reply ของแต่ละข้อความ
+  (คำตอบถูกส่งจาก agent loop หลัง webhook ตอบแล้ว จึงวัดจากเวลาที่ LINE API stand-in รับ reply)
+- ผลลัพธ์ (throughput, p50/p95/p99) พิมพ์เป็น JSON ทาง stdout เพื่อเก็บเทียบ regression
+
+server รันใน temp directory จึงไม่อ่าน env.yaml ของเครื่อง
+MCP tools ถูกปิด (ไม่ตั้ง DEST_OA_*) ให้ agent วัดเฉพาะ orchestration + model + LINE API
+
+รัน: python benchmark_e2e.py --concurrency 1,4,16 --requests 50 --gemini-latency 0.3 --output e2e.json
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api_standin_servers import start_gemini_standin, start_line_api_standin
+from test_webhook_queue import make_text_event, sign
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHANNEL_SECRET = os.getenv("MANAGER_OA_LINE_CHANNEL_SECRET") or "benchmark_channel_secret"
+# env ที่ไม่ส่งต่อให้ server (ป้องกันการเรียก API จริงระหว่าง benchmark)
+SCRUBBED_ENV = (
+    "DEST_OA_LINE_CHANNEL_ACCESS_TOKEN",
+    "DEST_OA_LINE_DESTINATION_USER_ID",
+    "GOOGLE_GENAI_USE_VERTEXAI",
+    "GOOGLE_CLOUD_PROJECT",
+    "GEMINI_API_KEY",
+    "TRACE_EXPORT_FILE",
+    "PROMETHEUS_MULTIPROC_DIR",
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """nearest-rank percentile (q ระหว่าง 0-100)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(q / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+class WebhookServer:
+    """main.py ที่รันเป็น subprocess พร้อม env ชี้ไปยัง stand-ins"""
+
+    def __init__(self, gemini_url: str, line_api_url: str, extra_env: dict[str, str] | None = None):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.workdir = tempfile.mkdtemp(prefix="line-webhook-e2e-")
+        self.log_path = os.path.join(self.workdir, "server.log")
+        env = {key: value for key, value in os.environ.items() if key not in SCRUBBED_ENV}
+        env.update({
+            "PORT": str(self.port),
+            "MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN": "benchmark_channel_token",
+            "MANAGER_OA_LINE_CHANNEL_SECRET": CHANNEL_SECRET,
+            "GOOGLE_API_KEY": "benchmark-api-key",
+            "GOOGLE_GEMINI_BASE_URL": gemini_url,
+            "LINE_API_HOST": line_api_url,
+            "LOG_LEVEL": "WARNING",
+            "PYTHONUNBUFFERED": "1",
+        })
+        env.update(extra_env or {})
+        self._log = open(self.log_path, "w")
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "main.py")],
+            cwd=self.workdir, env=env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+
+    def wait_ready(self, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with {self.process.returncode}, see {self.log_path}")
+            try:
+                with urllib.request.urlopen(f"{self.url}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.1)
+        raise TimeoutError(f"server not ready after {timeout}s, see {self.log_path}")
+
+    def get_json(self, path: str) -> dict:
+        with urllib.request.urlopen(f"{self.url}{path}", timeout=10) as response:
+            return json.loads(response.read())
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+
+
+def post_message(server_url: str, user_id: str, text: str, index: int, timeout: float) -> tuple[int, float]:
+    """ส่ง webhook หนึ่ง event คืน (HTTP status, latency วินาที)"""
+    body = json.dumps({"destination": "Ubenchmark", "events": [make_text_event(user_id, text, index)]})
+    request = urllib.request.Request(
+        f"{server_url}/",
+        data=body.encode(),
+        headers={"Content-Type": "application/json", "X-Line-Signature": sign(body, CHANNEL_SECRET)},
+        method="POST",
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def wait_for_reply(line_api, reply_token: str, timeout: float) -> float | None:
+    """เวลา (perf_counter) ที่ LINE API stand-in รับ reply ของ reply_token หรือ None ถ้าเกิน timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for body, at in line_api.arrivals("/v2/bot/message/reply"):
+            if body.get("replyToken") == reply_token:
+                return at
+        time.sleep(0.01)
+    return None
+
+
+def run_level(server: WebhookServer, line_api, gemini, concurrency: int, requests: int,
+              index_counter, timeout: float) -> dict:
+    """ส่ง requests ทั้งหมดด้วย client threads จำนวน concurrency (หนึ่งผู้ใช้ต่อ thread)"""
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    lock = threading.Lock()
+    reply_latencies: list[float] = []
+    remaining = itertools.count()
+    replies_before = line_api.count("/v2/bot/message/reply")
+    model_calls_before = gemini.count("generateContent")
+
+    def client(worker: int) -> None:
+        while next(remaining) < requests:
+            index = next(index_counter)
+            started = time.perf_counter()
+            status, latency = post_message(
+                server.url, f"U-c{concurrency}-w{worker}", "ช่วยแนะนำแคมเปญหน่อย", index, timeout
+            )
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(latency)
+            if status == 200:
+                # ผู้ใช้ส่งข้อความถัดไปหลังได้คำตอบ (reply แรกของ token รวมข้อความชั่วคราว)
+                replied_at = wait_for_reply(line_api, make_text_event("", "", index)["replyToken"], timeout)
+                if replied_at is not None:
+                    with lock:
+                        reply_latencies.append(replied_at - started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    replies = sorted(reply_latencies)
+    ok = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": ok,
+        "errors": requests - ok,
+        "status_codes": {str(status): n for status, n in sorted(statuses.items())},
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+        "reply_latency_ms": {
+            "p50": round(percentile(replies, 50) * 1000, 1),
+            "p95": round(percentile(replies, 95) * 1000, 1),
+            "p99": round(percentile(replies, 99) * 1000, 1),
+            "max": round(replies[-1] * 1000, 1) if replies else 0.0,
+        },
+        "replies_delivered": line_api.count("/v2/bot/message/reply") - replies_before,
+        "model_calls": gemini.count("generateContent") - model_calls_before,
+    }
+
+
+def run_benchmark(concurrency_levels=(1, 4, 16), requests_per_level: int = 50, gemini_latency: float = 0.3,
+                  line_latency: float = 0.05, jitter: float = 0.0, warm_up_requests: int = 2,
+                  timeout: float = 120.0, server_env: dict[str, str] | None = None) -> dict:
+    gemini = start_gemini_standin(latency=gemini_latency, jitter=jitter)
+    line_api = start_line_api_standin(latency=line_latency, jitter=jitter)
+    server = WebhookServer(gemini.url, line_api.url, server_env)
+    index_counter = itertools.count()
+    try:
+        server.wait_ready()
+        # request แรกๆ โหลด ADK และสร้าง client ต่างๆ ไม่นับรวมในผล
+        for i in range(warm_up_requests):
+            index = next(index_counter)
+            post_message(server.url, "U-warm-up", "warm up", index, timeout)
+            wait_for_reply(line_api, make_text_event("", "", index)["replyToken"], timeout)
+
+        levels = []
+        for concurrency in concurrency_levels:
+            result = run_level(server, line_api, gemini, concurrency, requests_per_level, index_counter, timeout)
+            levels.append(result)
+            print(
+                f"concurrency={concurrency:<4} ok={result['ok']:<4} errors={result['errors']:<3} "
+                f"rps={result['throughput_rps']:7.2f}  p50={result['latency_ms']['p50']:8.1f}ms  "
+                f"p95={result['latency_ms']['p95']:8.1f}ms  p99={result['latency_ms']['p99']:8.1f}ms  "
+                f"reply p50={result['reply_latency_ms']['p50']:8.1f}ms  p95={result['reply_latency_ms']['p95']:8.1f}ms",
+                file=sys.stderr,
+            )
+        server_stats = server.get_json("/stats")
+    finally:
+        server.stop()
+        gemini.stop()
+        line_api.stop()
+
+    return {
+        "benchmark": "e2e_webhook",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "concurrency_levels": list(concurrency_levels),
+            "requests_per_level": requests_per_level,
+            "gemini_latency_seconds": gemini_latency,
+            "line_api_latency_seconds": line_latency,
+            "jitter_seconds": jitter,
+            "server_env": server_env or {},
+        },
+        "levels": levels,
+        "scheduler": server_stats.get("scheduler"),
+    }
+
+
+def parse_env(items: list[str]) -> dict[str, str]:
+    return dict(item.split("=", 1) for item in items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="ระดับ concurrency คั่นด้วย comma")
+    parser.add_argument("--requests", type=int, default=50, help="จำนวน requests ต่อระดับ")
+    parser.add_argument("--gemini-latency", type=float, default=0.3)
+    parser.add_argument("--line-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120.0, help="timeout ต่อ request (วินาที)")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="env เพิ่มเติมของ server เช่น AGENT_MAX_CONCURRENCY=4")
+    parser.add_argument("--output", help="เขียนผล JSON ลงไฟล์นี้ด้วย")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        concurrency_levels=[int(level) for level in args.concurrency.split(",")],
+        requests_per_level=args.requests,
+        gemini_latency=args.gemini_latency,
+        line_latency=args.line_latency,
+        jitter=args.jitter,
+        timeout=args.timeout,
+        server_env=parse_env(args.server_env),
+    )
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
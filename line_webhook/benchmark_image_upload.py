@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark ของ gemini_generate_image ด้วย Gemini และ GCS จำลอง (fake backend)
+
+เปรียบเทียบ:
+- before: สร้าง genai.Client + storage.Client ใหม่ทุกครั้ง เขียนรูปลงไฟล์ แล้ว upload_from_filename
+- after:  ใช้ clients ที่ cache ไว้ และอัปโหลดจาก bytes ในหน่วยความจำ
+
+วัด overhead ต่อครั้ง จำนวนไฟล์ที่เหลือบนดิสก์ และหน่วยความจำ Python ที่เพิ่มขึ้น (tracemalloc)
+รัน: python benchmark_image_upload.py [จำนวนครั้ง]
+"""
+
+import gc
+import mimetypes
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google import genai
+from google.genai import types
+
+from line_oa_campaign_manager import agent
+
+IMAGE_BYTES = os.urandom(256 * 1024)  # รูปจำลองขนาด 256 KB
+
+
+class FakeModels:
+    def generate_content(self, model, contents, config):
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=IMAGE_BYTES, mime_type="image/png"))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class FakeGenaiClient:
+    def __init__(self, *args, **kwargs):
+        self.models = FakeModels()
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.uploaded_bytes += len(data)
+
+    def upload_from_filename(self, filename):
+        self.bucket.uploaded_bytes += os.path.getsize(filename)
+
+
+class FakeBucket:
+    def __init__(self):
+        self.uploaded_bytes = 0
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    bucket_instance = FakeBucket()
+
+    @classmethod
+    def from_service_account_json(cls, path):
+        Path(path).read_bytes()  # เดิมอ่านและ parse ไฟล์ service account ทุกครั้ง
+        return cls()
+
+    def bucket(self, name):
+        return self.bucket_instance
+
+
+def legacy_generate_image(prompt: str, service_account: Path) -> str:
+    """จำลอง gemini_generate_image แบบเดิม"""
+    genai.Client(api_key="benchmark-key")  # ต้นทุนสร้าง client จริงทุกครั้ง
+    client = FakeGenaiClient()
+    storage_client = FakeStorageClient.from_service_account_json(service_account)
+    res = client.models.generate_content(
+        model=agent.IMAGE_MODEL,
+        contents=[types.Content(role="user", parts=[types.Part.from_text(text=prompt)])],
+        config=types.GenerateContentConfig(response_modalities=["IMAGE"]),
+    )
+    part = res.candidates[0].content.parts[0]
+    ext = mimetypes.guess_extension(part.inline_data.mime_type) or ".bin"
+    path = Path(f"{uuid.uuid4()}{ext}")
+    path.write_bytes(part.inline_data.data)
+    storage_client.bucket(agent.IMAGE_BUCKET).blob(path.name).upload_from_filename(path)
+    return f"https://storage.googleapis.com/{agent.IMAGE_BUCKET}/{path.name}"
+
+
+def measure(label: str, func, iterations: int, workdir: Path) -> dict:
+    files_before = len(list(workdir.iterdir()))
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        url = func(f"แบนเนอร์โปรโมชั่น {i}")
+        timings.append(time.perf_counter() - start)
+        assert url.startswith("https://storage.googleapis.com/"), url
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p95_ms": sorted(timings)[int(len(timings) * 0.95)] * 1000,
+        "files_left": len(list(workdir.iterdir())) - files_before,
+        "memory_growth_kb": (current - baseline) / 1024,
+    }
+    print(
+        f"{label:<8} mean={result['mean_ms']:8.3f} ms  p95={result['p95_ms']:8.3f} ms  "
+        f"files_left={result['files_left']:5d}  memory_growth={result['memory_growth_kb']:9.1f} KB"
+    )
+    return result
+
+
+def run_benchmark(iterations: int = 1000) -> tuple[dict, dict]:
+    print("=" * 80)
+    print(f"Benchmark gemini_generate_image with fake backends ({iterations} calls)")
+    print("=" * 80)
+
+    original_cwd = os.getcwd()
+    original_clients = (agent._genai_client, agent._storage_client, agent._image_bucket)
+    original_cache = agent.image_cache
+    agent.image_cache = None  # วัดเฉพาะ path ที่สร้างรูปจริง ไม่นับ cache hit
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        service_account = workdir.parent / f"benchmark-sa-{uuid.uuid4()}.json"
+        service_account.write_text('{"type": "service_account"}')
+        os.chdir(workdir)
+        try:
+            before = measure(
+                "before", lambda prompt: legacy_generate_image(prompt, service_account), iterations, workdir
+            )
+            agent._genai_client = FakeGenaiClient()
+            agent._storage_client = FakeStorageClient()
+            agent._image_bucket = None
+            after = measure("after", agent.gemini_generate_image, iterations, workdir)
+        finally:
+            os.chdir(original_cwd)
+            service_account.unlink()
+            agent._genai_client, agent._storage_client, agent._image_bucket = original_clients
+            agent.image_cache = original_cache
+
+    print("-" * 80)
+    print(f"Per-call overhead saved: {before['mean_ms'] - after['mean_ms']:.3f} ms")
+    assert after["files_left"] == 0
+    return before, after
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark การส่ง reply พร้อมกันหลายข้อความไปยัง LINE API stand-in ที่หน่วงเวลาได้ (ไม่ต้องใช้ credentials)
+
+modes:
+- sync:  MessagingApi แบบ sync ตัวเดียวใช้ร่วมกันข้าม worker threads (--workers threads เหมือน Flask/dispatch workers เดิม)
+- async: line_api.call() บน agent loop ด้วย AsyncMessagingApi และ connection pool ขนาด LINE_API_POOL_SIZE
+
+วัด:
+- seconds:        เวลาส่ง --messages replies ทั้งหมด
+- replies_per_s:  throughput
+- extra_threads:  จำนวน threads ที่เพิ่มขึ้นระหว่างส่ง (threads ที่ถูกใช้รอ network I/O ของ LINE)
+
+รัน: python benchmark_line_api.py --messages 64 --workers 8 --line-latency 0.1 [--output line_api.json]
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN", "benchmark_channel_token")
+
+MODES = ("sync", "async")
+
+
+def reply_request(index: int):
+    from linebot.v3.messaging import ReplyMessageRequest, TextMessage
+
+    return ReplyMessageRequest(reply_token=f"reply-token-{index}", messages=[TextMessage(text=f"คำตอบ {index}")])
+
+
+def client_threads() -> int:
+    """จำนวน threads ฝั่ง client (ไม่นับ threads ที่ stand-in สร้างต่อ connection)"""
+    return sum(1 for thread in threading.enumerate() if "process_request_thread" not in thread.name)
+
+
+def run_benchmark(messages: int, workers: int, line_latency: float, modes=MODES) -> dict:
+    from api_standin_servers import start_line_api_standin
+
+    standin = start_line_api_standin(latency=line_latency)
+    os.environ["LINE_API_HOST"] = standin.url
+
+    from linebot.v3.messaging import ApiClient, Configuration, MessagingApi
+
+    import line_api
+    from agent_loop import get_agent_loop, run_coroutine, shutdown_agent_loop
+
+    def run_sync() -> float:
+        line_bot_api = MessagingApi(ApiClient(Configuration(host=standin.url, access_token="benchmark_channel_token")))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="worker") as executor:
+            list(executor.map(lambda i: line_bot_api.reply_message_with_http_info(reply_request(i)), range(workers)))
+            started = time.perf_counter()
+            list(executor.map(lambda i: line_bot_api.reply_message_with_http_info(reply_request(i)), range(messages)))
+            return time.perf_counter() - started
+
+    async def reply_all(count: int) -> None:
+        await asyncio.gather(
+            *(line_api.call("reply_message_with_http_info", reply_request(i)) for i in range(count))
+        )
+
+    def run_async() -> float:
+        run_coroutine(reply_all(workers))  # warm-up: client และ connections ของ agent loop
+        started = time.perf_counter()
+        run_coroutine(reply_all(messages))
+        return time.perf_counter() - started
+
+    runners = {"sync": run_sync, "async": run_async}
+    get_agent_loop().run(asyncio.sleep(0))  # เริ่ม agent loop thread ก่อนนับ threads
+    results = {}
+    try:
+        for mode in modes:
+            threads_before = client_threads()
+            peak = threads_before
+            done = threading.Event()
+
+            def watch_threads():
+                nonlocal peak
+                while not done.wait(0.01):
+                    peak = max(peak, client_threads())
+
+            watcher = threading.Thread(target=watch_threads, daemon=True)
+            watcher.start()
+            seconds = runners[mode]()
+            done.set()
+            watcher.join()
+            results[mode] = {
+                "seconds": round(seconds, 3),
+                "replies_per_s": round(messages / seconds, 1),
+                "extra_threads": peak - threads_before - 1,  # ไม่นับ watcher
+            }
+        results["line_api"] = line_api.stats()
+    finally:
+        run_coroutine(line_api.close_async_line_bot_api())
+        shutdown_agent_loop()
+        standin.stop()
+
+    return {
+        "config": {"messages": messages, "workers": workers, "line_latency": line_latency},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8, help="จำนวน worker threads ของ mode sync")
+    parser.add_argument("--line-latency", type=float, default=0.1, help="latency ของ LINE API stand-in (วินาที)")
+    parser.add_argument("--modes", default=",".join(MODES), help="modes คั่นด้วย comma")
+    parser.add_argument("--output", help="เขียนผล JSON ลงไฟล์นี้ด้วย")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.messages, args.workers, args.line_latency, args.modes.split(","))
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
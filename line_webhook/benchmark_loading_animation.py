@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark เวลาที่ loading animation เพิ่มให้ critical path ของ turn กับ LINE API stand-in ที่หน่วงเวลาได้
+
+จำลอง handle_text_message หนึ่งข้อความ: แสดง loading animation -> agent (sleep --agent-latency) -> reply
+ด้วย ReplyDelivery บน agent loop และ AsyncMessagingApi ที่ชี้ไปยัง api_standin_servers (LINE_API_HOST)
+ไม่ต้องใช้ credentials
+
+modes:
+- blocking:        รอ show_loading_animation ตอบก่อนเริ่ม agent (พฤติกรรมเดิม)
+- fire_and_forget: ส่ง show_loading_animation โดยไม่รอผลแล้วเริ่ม agent ทันที
+
+วัด:
+- before_agent: เวลาตั้งแต่รับข้อความจนเริ่ม agent (ส่วนที่ loading animation เพิ่มให้ critical path)
+- turn:         เวลาตั้งแต่รับข้อความจน reply สำเร็จ
+
+รัน: python benchmark_loading_animation.py --messages 30 --line-latency 0.1 --agent-latency 0.2 [--output loading.json]
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN", "benchmark_channel_token")
+
+MODES = ("blocking", "fire_and_forget")
+
+
+def summarize_ms(values: list[float]) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+    n = len(values)
+    return {
+        "n": n,
+        "mean": round(statistics.mean(values) * 1000, 3),
+        "p50": round(values[n // 2] * 1000, 3),
+        "p95": round(values[min(n - 1, int(n * 0.95))] * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
+
+
+def run_benchmark(messages: int, line_latency: float, agent_latency: float, modes=MODES) -> dict:
+    from api_standin_servers import start_line_api_standin
+
+    standin = start_line_api_standin(latency=line_latency)
+    os.environ["LINE_API_HOST"] = standin.url
+
+    from linebot.v3.messaging import ShowLoadingAnimationRequest
+
+    import line_api
+    from agent_loop import run_coroutine, shutdown_agent_loop
+    from reply_delivery import ReplyDelivery
+
+    agent = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="fake-agent")
+
+    async def one_turn(mode: str, index: int) -> tuple[float, float]:
+        received = time.perf_counter()
+        delivery = ReplyDelivery(f"U{index}", f"reply-token-{index}")
+        if mode == "blocking":
+            delivery.loading_until = delivery.clock() + delivery.loading_seconds
+            await line_api.call(
+                "show_loading_animation",
+                ShowLoadingAnimationRequest(chat_id=delivery.user_id, loading_seconds=delivery.loading_seconds),
+            )
+        else:
+            delivery.show_loading()
+        before_agent = time.perf_counter() - received
+        future = asyncio.wrap_future(agent.submit(lambda: time.sleep(agent_latency) or "คำตอบ"))
+        await delivery.wait(future, delivery.reply_time_left())
+        await delivery.deliver(future.result())
+        return before_agent, time.perf_counter() - received
+
+    def one_message(mode: str, index: int) -> tuple[float, float]:
+        return run_coroutine(one_turn(mode, index))
+
+    results = {}
+    try:
+        for mode in modes:
+            one_message(mode, -1)  # warm-up: connection pool และ client ของ agent loop
+            samples = [one_message(mode, i) for i in range(messages)]
+            results[mode] = {
+                "before_agent_ms": summarize_ms([before for before, _ in samples]),
+                "turn_ms": summarize_ms([turn for _, turn in samples]),
+            }
+        if "blocking" in results and "fire_and_forget" in results:
+            results["critical_path_saved_ms"] = round(
+                results["blocking"]["turn_ms"]["p50"] - results["fire_and_forget"]["turn_ms"]["p50"], 3
+            )
+        results["loading_requests"] = standin.count("/v2/bot/chat/loading/start")
+    finally:
+        run_coroutine(line_api.close_async_line_bot_api())
+        shutdown_agent_loop()
+        agent.shutdown()
+        standin.stop()
+
+    return {
+        "config": {"messages": messages, "line_latency": line_latency, "agent_latency": agent_latency},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=30)
+    parser.add_argument("--line-latency", type=float, default=0.1, help="latency ของ LINE API stand-in (วินาที)")
+    parser.add_argument("--agent-latency", type=float, default=0.2, help="เวลาของ agent จำลอง (วินาที)")
+    parser.add_argument("--modes", default=",".join(MODES), help="modes คั่นด้วย comma")
+    parser.add_argument("--output", help="เขียนผล JSON ลงไฟล์นี้ด้วย")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.messages, args.line_latency, args.agent_latency, args.modes.split(","))
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark ต้นทุน logging ต่อข้อความใน thread ที่รัน agent
+
+- before: print trace แบบเดิมของ process_agent_response/generate_text ลง stdout ตรงๆ
+- after:  process_agent_response ปัจจุบัน + structured JSON logging ผ่าน QueueHandler
+          (ระดับ INFO และระดับ DEBUG ที่สุ่มเก็บบรรทัดต่อ event ตาม LOG_SAMPLE_RATE)
+
+stdout ถูกเปลี่ยนไปเขียนลง pipe แบบ line-buffered (เหมือน stdout ของ container ที่ Cloud Logging อ่าน)
+โดยมี thread อ่านทิ้งอีกฝั่ง เพื่อให้ทุกบรรทัดมี write syscall จริง
+รัน: python benchmark_logging.py [จำนวนข้อความ]
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.events import Event
+from google.genai import types
+
+import adk_runner_service
+import log_config
+
+EVENTS_PER_MESSAGE = 6
+TEXT = "แคมเปญโปรโมชั่นลดราคาสินค้าประจำเดือน " * 60  # ~2 KB ต่อ event เหมือนผลลัพธ์ของ tool
+
+
+def make_events() -> list[Event]:
+    return [
+        Event(author="line_oa_campaign_manager", content=types.Content(role="model", parts=[types.Part(text=TEXT)]))
+        for _ in range(EVENTS_PER_MESSAGE)
+    ]
+
+
+async def legacy_trace(events: list[Event]) -> None:
+    """print trace ต่อข้อความแบบเดิม"""
+    print("[ADK] Processing message from U1: ...")
+    print("[ADK] Using session for U1: session")
+    print("[ADK] Starting agent with 60s timeout (attempt 1/3)...")
+    print("[ADK] Starting agent run for session: session")
+    for count, event in enumerate(events, 1):
+        print(f"[ADK] Event {count}: {event.id}")
+        print(f"[event] id={event.id} author={event.author}")
+        for part in event.content.parts:
+            print(f"  text: {part.text.strip()[:500]}")
+        text = event.content.parts[0].text.strip()
+        print(f"[ADK] Found text content: {text[:100]}...")
+        print(f"[ADK] Non-final response received: {text[:100]}...")
+    print(f"[ADK] Agent run completed. Total events: {len(events)}")
+    print("[ADK] Agent completed successfully")
+    print(f"[ADK] Agent response: {TEXT[:100]}...")
+
+
+async def current_trace(events: list[Event]) -> None:
+    """logging ต่อข้อความของโค้ดปัจจุบัน (เรียก process_agent_response จริง)"""
+    logger = adk_runner_service.logger
+    logger.info("[ADK] Processing %d message(s) from %s: %.100s", 1, "U1", "...", extra={"user_id": "U1"})
+    for count, event in enumerate(events, 1):
+        logger.debug("[ADK] Event %d: %s", count, event.id, extra=adk_runner_service.SAMPLED)
+        await adk_runner_service.process_agent_response(event)
+    logger.info("[ADK] Agent run completed. Total events: %d", len(events))
+    logger.info("[ADK] Agent response: %.100s", TEXT)
+
+
+async def measure(label: str, trace, messages: int) -> float:
+    events = make_events()
+    timings = []
+    for _ in range(messages):
+        start = time.perf_counter()
+        await trace(events)
+        timings.append(time.perf_counter() - start)
+    mean_us = statistics.mean(timings) * 1e6
+    print(f"{label:<22} mean={mean_us:9.1f} us/message  p95={sorted(timings)[int(messages * 0.95)] * 1e6:9.1f} us",
+          file=sys.__stderr__)
+    return mean_us
+
+
+def open_pipe_sink():
+    """stdout จำลอง: pipe แบบ line-buffered ที่มี thread อ่านทิ้งอีกฝั่ง คืน (stream, จำนวน bytes ที่อ่าน)"""
+    read_fd, write_fd = os.pipe()
+    total = [0]
+
+    def drain():
+        with os.fdopen(read_fd, "rb") as reader:
+            while chunk := reader.read1(65536):
+                total[0] += len(chunk)
+
+    thread = threading.Thread(target=drain, daemon=True)
+    thread.start()
+    stream = io.TextIOWrapper(os.fdopen(write_fd, "wb"), encoding="utf-8", line_buffering=True)
+    return stream, total, thread
+
+
+def run_benchmark(messages: int = 2000) -> dict:
+    async def scenario():
+        results = {"before (print)": await measure("before (print)", legacy_trace, messages)}
+        for label, level in (("after (INFO)", "INFO"), ("after (DEBUG sampled)", "DEBUG")):
+            log_config.setup_logging(level=level, sample_rate=0.1)
+            results[label] = await measure(label, current_trace, messages)
+            log_config.flush_logging()
+        return results
+
+    stream, total, drain_thread = open_pipe_sink()
+    with contextlib.redirect_stdout(stream):
+        results = asyncio.run(scenario())
+    stream.close()
+    drain_thread.join()
+    print(f"log bytes written: {total[0] / 1024:.0f} KB", file=sys.__stderr__)
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark การเรียก MCP tools ผ่าน MCPToolset กับ mcp_standin_server.py (ไม่ต้องใช้ Node หรือ LINE credentials)
+
+วัดแยกเป็นช่วง:
+- connect:    spawn process + MCP initialize (สร้าง session ใหม่)
+- list_tools: round trip ของ tools/list บน session ที่เปิดแล้ว
+- call:       MCPTool.run_async หนึ่งครั้ง (ตามที่ agent เรียก tool)
+
+modes:
+- one_shot:   MCPToolset ใหม่ทุก call (connect + list_tools + call + close) เหมือนไม่มี connection ค้าง
+- persistent: MCPToolset เดียวเปิด session ค้างไว้ใช้ซ้ำทุก call (MCP_POOL_SIZE=0)
+- pool:       McpServerPool ที่ pre-warm ไว้ (MCP_POOL_SIZE>0 ค่าเริ่มต้นของ service)
+              pool cache รายชื่อ tools หลังครั้งแรก list_tools ของ pool จึงใกล้ 0
+
+overhead_per_call = เวลาของ call - latency ที่ stand-in หน่วง (เวลาของ stdio, JSON-RPC และ ADK เอง)
+
+รัน: python benchmark_mcp_tools.py --calls 50 --one-shot-calls 10 --latency 0.05 [--output mcp_tools.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.agents import Agent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
+from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
+from google.adk.tools.tool_context import ToolContext
+from mcp import StdioServerParameters
+
+from line_oa_campaign_manager.mcp_pool import McpServerPool, _read_field
+
+STANDIN_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_standin_server.py")
+MODES = ("one_shot", "persistent", "pool")
+
+
+def standin_params(startup_delay: float, latency: float, jitter: float, failure_rate: float,
+                   seed: int | None = None) -> StdioServerParameters:
+    args = [STANDIN_SERVER, "--startup-delay", str(startup_delay), "--latency", str(latency),
+            "--jitter", str(jitter), "--failure-rate", str(failure_rate)]
+    if seed is not None:
+        args += ["--seed", str(seed)]
+    return StdioServerParameters(command=sys.executable, args=args)
+
+
+async def make_tool_context() -> ToolContext:
+    """ToolContext ขั้นต่ำสำหรับเรียก MCPTool.run_async นอก Runner"""
+    session_service = InMemorySessionService()
+    session = await session_service.create_session(app_name="benchmark_mcp_tools", user_id="benchmark")
+    invocation_context = InvocationContext(
+        session_service=session_service,
+        invocation_id="benchmark",
+        agent=Agent(name="benchmark_mcp_tools", model="gemini-2.0-flash-001"),
+        session=session,
+    )
+    return ToolContext(invocation_context)
+
+
+def summarize_ms(values: list[float]) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+    n = len(values)
+    return {
+        "n": n,
+        "mean": round(statistics.mean(values) * 1000, 3),
+        "p50": round(values[n // 2] * 1000, 3),
+        "p95": round(values[min(n - 1, int(n * 0.95))] * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
+
+
+def is_error(result) -> bool:
+    if isinstance(result, dict):
+        return bool(result.get("isError") or result.get("is_error") or result.get("error"))
+    return bool(_read_field(result, "isError", "is_error"))
+
+
+async def _timed(coro) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - started, result
+
+
+async def _open_toolset(params: StdioServerParameters, timeout: float):
+    """เปิด MCPToolset พร้อม session คืน (toolset, เวลา connect, เวลา list_tools, tools ตามชื่อ)"""
+    toolset = MCPToolset(connection_params=StdioConnectionParams(server_params=params, timeout=timeout))
+    # สร้าง session ก่อน get_tools เพื่อแยกเวลา connect ออกจาก list_tools
+    connect, session = await _timed(toolset._mcp_session_manager.create_session())
+    list_tools, _ = await _timed(session.list_tools())
+    tools = {tool.name: tool for tool in await toolset.get_tools()}
+    return toolset, connect, list_tools, tools
+
+
+async def bench_one_shot(params, tool_name: str, tool_args: dict, calls: int, timeout: float) -> dict:
+    tool_context = await make_tool_context()
+    connect, list_tools, call, close, total, errors = [], [], [], [], [], 0
+    for _ in range(calls):
+        started = time.perf_counter()
+        toolset, connect_time, list_time, tools = await _open_toolset(params, timeout)
+        call_time, result = await _timed(tools[tool_name].run_async(args=tool_args, tool_context=tool_context))
+        close_time, _ = await _timed(toolset.close())
+        total.append(time.perf_counter() - started)
+        connect.append(connect_time)
+        list_tools.append(list_time)
+        call.append(call_time)
+        close.append(close_time)
+        errors += is_error(result)
+    return {
+        "connect_ms": summarize_ms(connect),
+        "list_tools_ms": summarize_ms(list_tools),
+        "call_ms": summarize_ms(call),
+        "close_ms": summarize_ms(close),
+        "end_to_end_call_ms": summarize_ms(total),
+        "errors": errors,
+    }
+
+
+async def bench_persistent(params, tool_name: str, tool_args: dict, calls: int, timeout: float) -> dict:
+    tool_context = await make_tool_context()
+    toolset, connect_time, _, tools = await _open_toolset(params, timeout)
+    try:
+        session = await toolset._mcp_session_manager.create_session()  # session เดิมจาก cache
+        list_tools = [(await _timed(session.list_tools()))[0] for _ in range(calls)]
+        call, errors = [], 0
+        for _ in range(calls):
+            call_time, result = await _timed(tools[tool_name].run_async(args=tool_args, tool_context=tool_context))
+            call.append(call_time)
+            errors += is_error(result)
+    finally:
+        await toolset.close()
+    return {
+        "connect_ms": summarize_ms([connect_time]),
+        "list_tools_ms": summarize_ms(list_tools),
+        "call_ms": summarize_ms(call),
+        "end_to_end_call_ms": summarize_ms(call),
+        "errors": errors,
+    }
+
+
+async def bench_pool(params, tool_name: str, tool_args: dict, calls: int, pool_size: int) -> dict:
+    pool = McpServerPool(params, size=pool_size, health_check_interval=0)
+    try:
+        connect_time, _ = await _timed(pool.start())
+        list_tools = [(await _timed(pool.list_tools()))[0] for _ in range(calls)]
+        call, errors = [], 0
+        for _ in range(calls):
+            call_time, result = await _timed(pool.call_tool(tool_name, tool_args))
+            call.append(call_time)
+            errors += is_error(result)
+    finally:
+        await pool.close()
+    return {
+        "pool_size": pool_size,
+        "connect_ms": summarize_ms([connect_time]),
+        "list_tools_ms": summarize_ms(list_tools),
+        "call_ms": summarize_ms(call),
+        "end_to_end_call_ms": summarize_ms(call),
+        "errors": errors,
+    }
+
+
+def run_benchmark(calls: int = 50, one_shot_calls: int = 10, tool_name: str = "get_message_quota",
+                  tool_args: dict | None = None, startup_delay: float = 0.0, latency: float = 0.0,
+                  jitter: float = 0.0, failure_rate: float = 0.0, seed: int | None = None,
+                  pool_size: int = 2, modes=MODES, timeout: float = 30.0) -> dict:
+    tool_args = tool_args or {}
+    params = standin_params(startup_delay, latency, jitter, failure_rate, seed)
+    expected_latency = latency + jitter / 2
+
+    async def run_all() -> dict:
+        results = {}
+        for mode in modes:
+            if mode == "one_shot":
+                result = await bench_one_shot(params, tool_name, tool_args, one_shot_calls, timeout)
+            elif mode == "persistent":
+                result = await bench_persistent(params, tool_name, tool_args, calls, timeout)
+            else:
+                result = await bench_pool(params, tool_name, tool_args, calls, pool_size)
+            mean_call = result["end_to_end_call_ms"]["mean"]
+            result["overhead_per_call_ms"] = round(mean_call - expected_latency * 1000, 3)
+            results[mode] = result
+            print(
+                f"{mode:<11} connect={result['connect_ms']['mean']:8.1f}ms  "
+                f"list_tools p50={result['list_tools_ms']['p50']:7.2f}ms  "
+                f"call p50={result['call_ms']['p50']:7.2f}ms  "
+                f"end-to-end/call={mean_call:8.2f}ms  errors={result['errors']}",
+                file=sys.stderr,
+            )
+        return results
+
+    results = asyncio.run(run_all())
+    return {
+        "benchmark": "mcp_tools",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "calls": calls,
+            "one_shot_calls": one_shot_calls,
+            "tool": tool_name,
+            "startup_delay_seconds": startup_delay,
+            "latency_seconds": latency,
+            "jitter_seconds": jitter,
+            "failure_rate": failure_rate,
+            "pool_size": pool_size,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50, help="จำนวน calls ของ persistent และ pool")
+    parser.add_argument("--one-shot-calls", type=int, default=10, help="จำนวน calls ของ one_shot (spawn ทุกครั้ง)")
+    parser.add_argument("--tool", default="get_message_quota")
+    parser.add_argument("--args", default="{}", help="arguments ของ tool เป็น JSON")
+    parser.add_argument("--startup-delay", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--modes", default=",".join(MODES), help="modes คั่นด้วย comma")
+    parser.add_argument("--output", help="เขียนผล JSON ลงไฟล์นี้ด้วย")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        calls=args.calls,
+        one_shot_calls=args.one_shot_calls,
+        tool_name=args.tool,
+        tool_args=json.loads(args.args),
+        startup_delay=args.startup_delay,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+        pool_size=args.pool_size,
+        modes=args.modes.split(","),
+    )
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark overhead ของ orchestration ต่อ turn และต่อ event (ไม่รวมเวลาของ Gemini)
+
+agent ใช้ ScriptedLlm (AGENT_MODEL_SCRIPT) แทน Gemini โดยแต่ละ model call หน่วง --delay-ms
+overhead = เวลาของ turn - (จำนวน model calls x delay) คือเวลาที่ ADK runner, session,
+tool dispatch และ adk_runner_service ใช้เอง
+
+scenarios:
+- text:       model call เดียว ตอบข้อความ (1 event)
+- image_tool: เรียก gemini_generate_image_async (cache hit ไม่เรียก API) แล้วตอบข้อความ (3 events)
+paths:
+- generate_text:      coroutine บน agent loop โดยตรง
+- generate_text_sync: ผ่าน thread hop + coalescer + turn scheduler เหมือน webhook handler
+
+รัน: python benchmark_orchestration.py --turns 200 --delay-ms 0 [--output orchestration.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_PROMPT = "แบนเนอร์โปรโมชั่นลดราคา 50%"
+SCENARIOS = {
+    "text": {"message": "สวัสดีครับ", "model_calls": 1},
+    "image_tool": {"message": "ขอรูปแบนเนอร์โปรโมชั่น", "model_calls": 2},
+}
+USERS_PER_SCENARIO = 10
+
+
+def write_script(delay_ms: float) -> str:
+    script = {
+        "default_delay_ms": delay_ms,
+        "turns": [
+            {"match": "รูป|แบนเนอร์", "steps": [
+                {"function_call": {"name": "gemini_generate_image_async", "args": {"prompt": IMAGE_PROMPT}}},
+                {"text": "สร้างรูปแบนเนอร์เรียบร้อยแล้วครับ"},
+            ]},
+            {"steps": [{"text": "สวัสดีครับ มีแคมเปญอะไรให้ช่วยวางแผนไหมครับ"}]},
+        ],
+    }
+    path = os.path.join(tempfile.mkdtemp(prefix="scripted-llm-"), "script.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(script, f, ensure_ascii=False)
+    return path
+
+
+def summarize(timings: list[float], events: int, model_calls: int, delay_ms: float) -> dict:
+    timings = sorted(timings)
+    turns = len(timings)
+    mean = statistics.mean(timings)
+    overhead = mean - model_calls * delay_ms / 1000
+    return {
+        "turns": turns,
+        "events_per_turn": events / turns,
+        "turn_ms": {
+            "mean": round(mean * 1000, 3),
+            "p50": round(timings[turns // 2] * 1000, 3),
+            "p95": round(timings[min(turns - 1, int(turns * 0.95))] * 1000, 3),
+        },
+        "overhead_per_turn_ms": round(overhead * 1000, 3),
+        "overhead_per_event_ms": round(overhead * 1000 / (events / turns), 3),
+    }
+
+
+def run_benchmark(turns: int = 200, delay_ms: float = 0.0, warm_up: int = 5) -> dict:
+    os.environ["AGENT_MODEL_SCRIPT"] = write_script(delay_ms)
+    os.environ["IMAGE_CACHE_DB"] = ""  # cache เฉพาะในหน่วยความจำ
+    os.environ.setdefault("ADK_WARM_UP", "lazy")
+    import log_config
+    log_config.setup_logging(level="WARNING")
+
+    import adk_runner_service
+    from agent_loop import run_coroutine
+    from line_oa_campaign_manager import agent
+
+    agent.image_cache.put(IMAGE_PROMPT, agent.IMAGE_MODEL, "https://storage.googleapis.com/benchmark/banner.png")
+
+    # นับ events ที่ generate_text ประมวลผล
+    event_count = [0]
+    process_agent_response = adk_runner_service.process_agent_response
+
+    async def counting_process_agent_response(event):
+        event_count[0] += 1
+        return await process_agent_response(event)
+
+    adk_runner_service.process_agent_response = counting_process_agent_response
+
+    def via_loop(message: str, user_id: str):
+        return run_coroutine(adk_runner_service.generate_text(message, user_id))
+
+    def via_sync(message: str, user_id: str):
+        return adk_runner_service.generate_text_sync(message, user_id)
+
+    results = {}
+    for path_name, call in (("generate_text", via_loop), ("generate_text_sync", via_sync)):
+        for scenario_name, scenario in SCENARIOS.items():
+            for i in range(warm_up):
+                call(scenario["message"], f"warm-{path_name}-{scenario_name}")
+            timings = []
+            event_count[0] = 0
+            for i in range(turns):
+                user_id = f"{path_name}-{scenario_name}-{i % USERS_PER_SCENARIO}"
+                start = time.perf_counter()
+                response = call(scenario["message"], user_id)
+                timings.append(time.perf_counter() - start)
+                assert response, f"empty response for {scenario_name}"
+            result = summarize(timings, event_count[0], scenario["model_calls"], delay_ms)
+            results[f"{path_name}/{scenario_name}"] = result
+            print(
+                f"{path_name + '/' + scenario_name:<32} turn p50={result['turn_ms']['p50']:8.2f}ms  "
+                f"overhead/turn={result['overhead_per_turn_ms']:8.2f}ms  "
+                f"overhead/event={result['overhead_per_event_ms']:7.2f}ms  events/turn={result['events_per_turn']:.0f}",
+                file=sys.stderr,
+            )
+
+    adk_runner_service.process_agent_response = process_agent_response
+    return {
+        "benchmark": "orchestration_overhead",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {"turns": turns, "delay_ms": delay_ms, "users_per_scenario": USERS_PER_SCENARIO},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200, help="จำนวน turns ต่อ scenario")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="เวลาหน่วงของแต่ละ model call")
+    parser.add_argument("--output", help="เขียนผล JSON ลงไฟล์นี้ด้วย")
+    args = parser.parse_args()
+
+    results = run_benchmark(turns=args.turns, delay_ms=args.delay_ms)
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
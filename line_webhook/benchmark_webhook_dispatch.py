@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark การประมวลผล events หลายตัวใน webhook เดียว (โหมด sync)
+
+ส่ง webhook ที่ลงลายเซ็นถูกต้อง มี events จากหลายผู้ใช้ (ผู้ใช้ละหลายข้อความ) ไปยัง Flask app
+โดย agent จำลองใช้เวลา AGENT_DELAY_SECONDS ต่อข้อความ แล้ววัดเวลาที่ webhook ตอบ และเวลาที่แต่ละ event
+ได้รับคำตอบ
+
+handler ส่ง agent turn และการส่งคำตอบเข้า agent loop แล้วคืนทันที webhook จึงตอบภายในไม่กี่มิลลิวินาที
+turns ของผู้ใช้ต่างคนรันพร้อมกัน (event สุดท้ายได้คำตอบหลัง ~ข้อความต่อผู้ใช้ x AGENT_DELAY_SECONDS
+ไม่ใช่ จำนวน events ทั้งหมด x AGENT_DELAY_SECONDS) และข้อความของผู้ใช้คนเดียวกันยังตามลำดับ
+
+รัน: python benchmark_webhook_dispatch.py [จำนวนผู้ใช้] [ข้อความต่อผู้ใช้]
+"""
+
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from unittest.mock import AsyncMock, patch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_webhook_queue import as_submit_text, make_text_event, sign
+
+AGENT_DELAY_SECONDS = 0.2
+
+
+def build_body(users: int, messages_per_user: int) -> str:
+    events = []
+    for seq in range(messages_per_user):
+        for user in range(users):
+            index = len(events)
+            events.append(make_text_event(f"U{user}", f"ข้อความ {seq}", index))
+    return json.dumps({"destination": "Udestination", "events": events})
+
+
+def post_webhook(main, body: str) -> tuple[float, list[float], dict]:
+    """คืน (เวลาที่ webhook ตอบ, เวลาที่แต่ละ event ได้คำตอบ, ลำดับข้อความต่อผู้ใช้)"""
+    completions = []
+    order: dict[str, list[str]] = {}
+    lock = threading.Lock()
+    start = 0.0
+
+    def slow_agent(user_input, user_id=None):
+        time.sleep(AGENT_DELAY_SECONDS)
+        with lock:
+            order.setdefault(user_id, []).append(user_input)
+        return f"echo: {user_input}"
+
+    def record_reply(request, **kwargs):
+        with lock:
+            completions.append(time.perf_counter() - start)
+
+    line_bot_api = AsyncMock()
+    line_bot_api.reply_message_with_http_info.side_effect = record_reply
+    with patch.object(main, "WEBHOOK_MODE", "sync"), \
+            patch("line_api.get_async_line_bot_api", AsyncMock(return_value=line_bot_api)), \
+            patch("line_api.fire_and_forget"), \
+            patch("adk_runner_service.submit_text", as_submit_text(slow_agent)):
+        with main.app.test_client() as client:
+            start = time.perf_counter()
+            response = client.post(
+                "/",
+                data=body,
+                content_type="application/json",
+                headers={"X-Line-Signature": sign(body, main.CHANNEL_SECRET)},
+            )
+            elapsed = time.perf_counter() - start
+            # คำตอบถูกส่งจาก agent loop หลัง webhook ตอบแล้ว
+            assert main.wait_for_deliveries(timeout=60)
+    assert response.status_code == 200, response.data
+    return elapsed, completions, order
+
+
+def report(label: str, elapsed: float, completions: list[float]) -> dict:
+    completions = sorted(completions)
+    result = {
+        "webhook_seconds": elapsed,
+        "p50_seconds": statistics.median(completions),
+        "max_seconds": completions[-1],
+        "events": len(completions),
+    }
+    print(
+        f"{label:<8} webhook={elapsed:6.2f}s  per-event p50={result['p50_seconds']:6.2f}s  "
+        f"max={result['max_seconds']:6.2f}s  events={result['events']}"
+    )
+    return result
+
+
+def run_benchmark(users: int = 5, messages_per_user: int = 2) -> dict:
+    os.environ.setdefault("ADK_WARM_UP", "lazy")
+    import main
+    import linebot.v3.messaging  # noqa: F401 (import ครั้งแรกใช้เวลานาน ไม่นับรวมในผล)
+
+    body = build_body(users, messages_per_user)
+    print("=" * 80)
+    print(f"Webhook with {users} users x {messages_per_user} messages, agent delay {AGENT_DELAY_SECONDS}s")
+    print("=" * 80)
+
+    elapsed, completions, order = post_webhook(main, body)
+    result = report("sync", elapsed, completions)
+
+    # ข้อความของผู้ใช้คนเดียวกันยังต้องได้รับการประมวลผลตามลำดับ
+    for user_id, texts in order.items():
+        assert texts == [f"ข้อความ {seq}" for seq in range(messages_per_user)], (user_id, texts)
+    print("-" * 80)
+    print(
+        f"Last reply after {result['max_seconds']:.2f}s "
+        f"(sequential agent would need {users * messages_per_user * AGENT_DELAY_SECONDS:.2f}s)"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2,
+    )
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+นาฬิกาจำลองสำหรับทดสอบ caches และ circuit breaker ที่รับ clock ได้ (แทน time.monotonic)
+
+ใช้: clock = FakeClock(); cache = SessionCache(..., clock=clock); clock.now += 61
+"""
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
@@ -0,0 +1,167 @@
+"""
+LINE Messaging API client แบบ async ที่ใช้ร่วมกันบน agent loop
+
+outbound LINE calls ทั้งหมด (loading animation, reply, push) รันบน agent loop ด้วย AsyncMessagingApi ตัวเดียว
+แทน ApiClient แบบ sync ที่ใช้ร่วมกันข้าม Flask threads worker threads จึงไม่ต้องรอ network I/O ของ LINE เอง
+
+- get_async_line_bot_api(): AsyncMessagingApi ของ agent loop (สร้างครั้งแรกที่ใช้ และสร้างใหม่หลัง fork)
+  connection pool ของ aiohttp ขนาด LINE_API_POOL_SIZE ต่อ host และเก็บ connection ว่างไว้ LINE_API_KEEPALIVE_SECONDS
+- call(): coroutine เรียก API หนึ่งครั้งพร้อม timeout ต่อ call (ต้อง await บน agent loop)
+- fire_and_forget(): ส่ง call ที่ไม่อยู่ใน critical path (เช่น loading animation) โดยไม่รอผล เรียกได้จากทุก thread
+  error ถูก log เท่านั้น ไม่หน่วงหรือทำให้ agent turn ล้มเหลว
+
+aiohttp.ClientSession ไม่ thread-safe จึงใช้ client ได้เฉพาะบน agent loop thread (เรียกจาก thread อื่น = RuntimeError)
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import logging
+import os
+import threading
+import time
+
+from agent_loop import get_agent_loop
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# timeout รวมต่อ LINE API call และ timeout ของการเปิด connection (วินาที)
+LINE_API_TIMEOUT_SECONDS = float(os.getenv("LINE_API_TIMEOUT_SECONDS", "10"))
+LINE_API_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LINE_API_CONNECT_TIMEOUT_SECONDS", "3"))
+# จำนวน connections พร้อมกันสูงสุดไปยัง LINE API และเวลาที่เก็บ connection ว่างไว้ใช้ซ้ำ (วินาที)
+LINE_API_POOL_SIZE = int(os.getenv("LINE_API_POOL_SIZE", "32"))
+LINE_API_KEEPALIVE_SECONDS = float(os.getenv("LINE_API_KEEPALIVE_SECONDS", "30"))
+
+_async_api = None
+_async_api_loop = None
+# fire-and-forget tasks ที่ยังรันอยู่ (asyncio เก็บ task แบบ weak reference)
+_background_tasks: set[asyncio.Task] = set()
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "failed": 0, "cancelled": 0, "in_flight": 0}
+
+
+def import_client_modules() -> None:
+    """import linebot.v3.messaging และ aiohttp ล่วงหน้านอก agent loop
+
+    import ครั้งแรกใช้เวลาราว 1 วินาที ถ้าเกิดใน get_async_line_bot_api จะบล็อก turns อื่นบน agent loop
+    """
+    import aiohttp  # noqa: F401
+    import linebot.v3.messaging  # noqa: F401
+
+
+async def get_async_line_bot_api():
+    """คืน AsyncMessagingApi ของ agent loop (สร้างครั้งแรกที่ใช้)"""
+    global _async_api, _async_api_loop
+    if not get_agent_loop().in_loop_thread():
+        raise RuntimeError("LINE API client must be used on the agent loop")
+    loop = asyncio.get_running_loop()
+    if _async_api is None or _async_api_loop is not loop:
+        # import เมื่อใช้งานครั้งแรก (linebot.v3.messaging และ aiohttp ใช้เวลา import นาน)
+        import ssl
+
+        import aiohttp
+        from linebot.v3.messaging import AsyncApiClient, AsyncMessagingApi, Configuration
+
+        configuration = Configuration(
+            host=os.environ.get("LINE_API_HOST", "https://api.line.me"),
+            access_token=os.environ.get("MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN", ""),
+        )
+        api_client = AsyncApiClient(configuration)
+        # SDK กำหนดได้แค่ขนาด pool จึงแทน ClientSession ด้วยตัวที่กำหนด keep-alive ได้
+        default_session = api_client.rest_client.pool_manager
+        api_client.rest_client.pool_manager = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=LINE_API_POOL_SIZE,
+                keepalive_timeout=LINE_API_KEEPALIVE_SECONDS,
+                ssl=ssl.create_default_context(cafile=configuration.ssl_ca_cert),
+            ),
+            trust_env=True,
+        )
+        _async_api = AsyncMessagingApi(api_client)
+        _async_api_loop = loop
+        await default_session.close()
+        logger.info(
+            f"[LINE-API] Async client created (pool={LINE_API_POOL_SIZE}, keepalive={LINE_API_KEEPALIVE_SECONDS}s)"
+        )
+    return _async_api
+
+
+async def close_async_line_bot_api() -> None:
+    """ปิด connection pool ของ AsyncMessagingApi (เรียกบน agent loop ตอนปิดโปรเซสหรือในการทดสอบ)"""
+    global _async_api, _async_api_loop
+    api, _async_api, _async_api_loop = _async_api, None, None
+    if api is not None:
+        await api.api_client.close()
+
+
+async def call(method: str, *args, timeout: float | None = None, stage: str | None = None):
+    """
+    await AsyncMessagingApi.<method>(*args) บน agent loop ภายใน timeout วินาที เช่น
+    await call("reply_message_with_http_info", ReplyMessageRequest(...), stage="reply_message")
+
+    stage: ชื่อ stage ใน line_oa_stage_seconds ที่ใช้จับเวลาของ call
+    """
+    import aiohttp
+
+    timeout = LINE_API_TIMEOUT_SECONDS if timeout is None else timeout
+    client_timeout = aiohttp.ClientTimeout(total=timeout, connect=min(timeout, LINE_API_CONNECT_TIMEOUT_SECONDS))
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["in_flight"] += 1
+    try:
+        with metrics.observe_stage(stage) if stage else contextlib.nullcontext(), tracing.span(f"line.{method}"):
+            api = await get_async_line_bot_api()
+            return await asyncio.wait_for(
+                getattr(api, method)(*args, _request_timeout=client_timeout), timeout=timeout
+            )
+    except asyncio.CancelledError:
+        # ยกเลิกตอนปิด loop หรือเมื่อ turn ถูกยกเลิก ไม่ใช่ความล้มเหลวของ LINE API
+        with _stats_lock:
+            _stats["cancelled"] += 1
+        raise
+    except Exception:
+        with _stats_lock:
+            _stats["failed"] += 1
+        raise
+    finally:
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+
+
+def _log_failure(method: str, started: float):
+    def done(future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(
+                f"[LINE-API] {method} failed after {time.perf_counter() - started:.2f}s: {future.exception()!r}"
+            )
+    return done
+
+
+def fire_and_forget(
+    method: str, *args, timeout: float | None = None, stage: str | None = None
+) -> asyncio.Task | concurrent.futures.Future:
+    """
+    เรียก call(method, *args) โดยไม่รอผล เช่น
+    fire_and_forget("show_loading_animation", ShowLoadingAnimationRequest(chat_id=user_id))
+
+    เรียกจาก agent loop ได้ asyncio.Task, จาก thread อื่นได้ concurrent.futures.Future
+    """
+    coro = call(method, *args, timeout=timeout, stage=stage)
+    agent_loop = get_agent_loop()
+    if agent_loop.in_loop_thread():
+        future = asyncio.ensure_future(coro)
+        _background_tasks.add(future)
+        future.add_done_callback(_background_tasks.discard)
+    else:
+        future = agent_loop.submit(coro)
+    future.add_done_callback(_log_failure(method, time.perf_counter()))
+    return future
+
+
+def stats() -> dict:
+    """จำนวน LINE API calls ทั้งหมด, ที่ล้มเหลว, ที่ถูกยกเลิก และที่ยังค้างอยู่ พร้อมการตั้งค่า pool"""
+    with _stats_lock:
+        return {**_stats, "pool_size": LINE_API_POOL_SIZE, "keepalive_seconds": LINE_API_KEEPALIVE_SECONDS}
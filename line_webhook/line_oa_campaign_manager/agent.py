@@ -1,26 +1,134 @@
 import os
+import json
+import asyncio
+import concurrent.futures
+import logging
 import mimetypes
 import uuid
 import shutil
+import threading
+import time
+import weakref
 from pathlib import Path
-from google import genai
-from google.genai import types
 from google.adk.agents import Agent
-from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, SseConnectionParams
-from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
 from mcp import StdioServerParameters
-from google.cloud import storage
 from dotenv import load_dotenv
+from . import deadline, idempotency
+from .circuit_breaker import CircuitBreaker, CircuitBreakerToolset
+from .image_cache import ImageCache
+from .mcp_pool import McpServerPool, PooledMcpToolset
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-def gemini_generate_image(prompt: str):
+
+IMAGE_MODEL = "gemini-2.5-flash-image-preview"
+IMAGE_BUCKET = "line-oa-campaign-manager-images"
+SERVICE_ACCOUNT_FILE = Path(__file__).parent / "ai-agent-sa.json"
+
+# clients ที่ใช้ร่วมกันทั้งโปรเซส (สร้างครั้งแรกที่ใช้ และใช้ connection pool เดิมซ้ำ)
+_genai_client = None
+_storage_client = None
+_image_bucket = None
+_clients_lock = threading.Lock()
+
+# cache ของรูปที่สร้างแล้ว: prompt ที่ normalize แล้ว + โมเดล -> public URL
+# เป็น cache ของแต่ละ instance (/tmp บน Cloud Run อยู่ในหน่วยความจำ ไม่คงอยู่เมื่อ instance ถูกปิด)
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+image_cache = ImageCache(
+    db_path=os.getenv("IMAGE_CACHE_DB", "/tmp/line_oa_image_cache.sqlite3"),
+    ttl_seconds=float(os.getenv("IMAGE_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "256")),
+) if IMAGE_CACHE_ENABLED else None
+
+
+def get_genai_client():
+    """คืน genai.Client ที่ใช้ร่วมกันทั้งโปรเซส"""
+    global _genai_client
+    if _genai_client is None:
+        with _clients_lock:
+            if _genai_client is None:
+                # import เมื่อใช้งานครั้งแรก เพื่อไม่ให้ถ่วงเวลา cold start
+                from google import genai
+                _genai_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return _genai_client
+
+
+def get_storage_client():
+    """คืน storage.Client ที่ใช้ร่วมกันทั้งโปรเซส (อ่าน service account ครั้งเดียว)"""
+    global _storage_client
+    if _storage_client is None:
+        with _clients_lock:
+            if _storage_client is None:
+                from google.cloud import storage
+                if SERVICE_ACCOUNT_FILE.exists():
+                    _storage_client = storage.Client.from_service_account_json(SERVICE_ACCOUNT_FILE)
+                else:
+                    # บน Cloud Run ใช้ credentials ของ service ได้โดยตรง
+                    _storage_client = storage.Client()
+    return _storage_client
+
+
+def get_image_bucket():
+    """คืน bucket สำหรับเก็บรูปภาพ Campaign"""
+    global _image_bucket
+    if _image_bucket is None:
+        _image_bucket = get_storage_client().bucket(IMAGE_BUCKET)
+    return _image_bucket
+
+
+def _cached_image_url(prompt: str, force_regenerate: bool) -> str | None:
+    if image_cache is None or force_regenerate:
+        return None
+    cached_url = image_cache.get(prompt, IMAGE_MODEL)
+    if cached_url:
+        logger.info(f"Image cache hit: {cached_url}")
+    return cached_url
+
+
+def _image_request(prompt: str) -> dict:
+    """arguments ของ generate_content ที่ใช้ร่วมกันทั้ง sync และ async client"""
+    from google.genai import types
+
+    return {
+        "model": IMAGE_MODEL,
+        "contents": [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])],
+        "config": types.GenerateContentConfig(response_modalities=["IMAGE"]),
+    }
+
+
+def _first_image_part(res):
+    for part in res.candidates[0].content.parts:
+        if getattr(part, "inline_data", None) and part.inline_data.data:
+            return part.inline_data
+    return None
+
+
+def _upload_image(prompt: str, inline_data, started: float) -> str:
+    """อัปโหลดรูปไปยัง GCS แล้วบันทึก URL ลง image cache (blocking: เวอร์ชัน async เรียกใน thread pool)"""
+    mime_type = inline_data.mime_type
+    ext = mimetypes.guess_extension(mime_type) or ".bin"
+    filename = f"{uuid.uuid4()}{ext}"
+    # อัปโหลดจาก bytes ในหน่วยความจำโดยตรง ไม่เขียนไฟล์ลงดิสก์ (tmpfs บน Cloud Run คือ RAM)
+    blob = get_image_bucket().blob(filename)
+    blob.upload_from_string(inline_data.data, content_type=mime_type)
+    logger.info(f"Uploaded image to: gs://{IMAGE_BUCKET}/{filename}")
+    public_url = f"https://storage.googleapis.com/{IMAGE_BUCKET}/{filename}"
+    if image_cache is not None:
+        image_cache.put(prompt, IMAGE_MODEL, public_url, time.perf_counter() - started)
+    return public_url
+
+
+def gemini_generate_image(prompt: str, force_regenerate: bool = False):
     """
     สร้างรูปภาพโดยใช้ Gemini AI และอัปโหลดไปยัง Google Cloud Storage
+    ถ้าเคยสร้างรูปด้วย prompt เดียวกันแล้ว จะคืน URL ของรูปเดิมจาก cache
     
     Args:
         prompt (str): คำอธิบายหรือข้อความที่ใช้ในการสร้างรูปภาพ
+        force_regenerate (bool): True เพื่อสร้างรูปใหม่เสมอโดยไม่ใช้รูปจาก cache
+            (ใช้เมื่อผู้ใช้ขอให้ "ลองใหม่" หรือไม่พอใจรูปเดิม)
         
     Returns:
         str: URL ของรูปภาพใน Google Cloud Storage (รูปแบบ https://storage.googleapis.com/line-oa-campaign-manager-images/filename)
@@ -30,33 +138,103 @@ def gemini_generate_image(prompt: str):
         Exception: หากเกิดข้อผิดพลาดในการเชื่อมต่อ API หรือการอัปโหลดไฟล์
     """
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        sa = Path(__file__).parent / "ai-agent-sa.json"
-        storage_client = storage.Client.from_service_account_json(sa)
-
-        res = client.models.generate_content(
-            model="gemini-2.5-flash-image-preview",
-            contents=[types.Content(role="user", parts=[types.Part.from_text(text=prompt)])],
-            config=types.GenerateContentConfig(response_modalities=["IMAGE"])
+        cached_url = _cached_image_url(prompt, force_regenerate)
+        if cached_url:
+            return cached_url
+
+        started = time.perf_counter()
+        res = get_genai_client().models.generate_content(**_image_request(prompt))
+        inline_data = _first_image_part(res)
+        if inline_data is None:
+            return "Image generation failed"
+        return _upload_image(prompt, inline_data, started)
+    except Exception as e:
+        logger.exception(f"Error in gemini_generate_image: {e}")
+        return f"Error generating image: {str(e)}"
+
+
+# จำกัดจำนวนการสร้างรูปพร้อมกัน (ต่อ event loop; ในทางปฏิบัติทุก turn รันบน agent loop เดียว)
+IMAGE_MAX_CONCURRENCY = int(os.getenv("IMAGE_MAX_CONCURRENCY", "2"))
+IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", "4"))
+_image_semaphores = weakref.WeakKeyDictionary()
+_image_upload_executor = None
+_image_generation_stats = {"active": 0, "waiting": 0, "completed": 0, "failed": 0, "max_wait_seconds": 0.0}
+
+
+def _get_image_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _image_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _image_semaphores[loop] = asyncio.Semaphore(IMAGE_MAX_CONCURRENCY)
+    return semaphore
+
+
+def _get_image_upload_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _image_upload_executor
+    if _image_upload_executor is None:
+        with _clients_lock:
+            if _image_upload_executor is None:
+                _image_upload_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=IMAGE_UPLOAD_WORKERS, thread_name_prefix="image-upload"
+                )
+    return _image_upload_executor
+
+
+def image_generation_stats() -> dict:
+    """สถิติของการสร้างรูปแบบ async (จำนวนที่กำลังทำ/รอ semaphore)"""
+    return {"max_concurrency": IMAGE_MAX_CONCURRENCY, **_image_generation_stats}
+
+
+async def gemini_generate_image_async(prompt: str, force_regenerate: bool = False):
+    """
+    สร้างรูปภาพโดยใช้ Gemini AI และอัปโหลดไปยัง Google Cloud Storage
+    ถ้าเคยสร้างรูปด้วย prompt เดียวกันแล้ว จะคืน URL ของรูปเดิมจาก cache
+    
+    Args:
+        prompt (str): คำอธิบายหรือข้อความที่ใช้ในการสร้างรูปภาพ
+        force_regenerate (bool): True เพื่อสร้างรูปใหม่เสมอโดยไม่ใช้รูปจาก cache
+            (ใช้เมื่อผู้ใช้ขอให้ "ลองใหม่" หรือไม่พอใจรูปเดิม)
+        
+    Returns:
+        str: URL ของรูปภาพใน Google Cloud Storage (รูปแบบ https://storage.googleapis.com/line-oa-campaign-manager-images/filename)
+             หรือข้อความแสดงข้อผิดพลาดหากการสร้างรูปภาพล้มเหลว
+    """
+    # เวอร์ชัน async ของ gemini_generate_image: ไม่ block event loop ที่รัน turn ของผู้ใช้คนอื่น
+    # และ MCP sessions อยู่ (genai async client, SQLite ของ image cache และ upload ใน thread pool)
+    try:
+        cached_url = await asyncio.get_running_loop().run_in_executor(
+            None, _cached_image_url, prompt, force_regenerate
         )
+        if cached_url:
+            return cached_url
 
-        for part in res.candidates[0].content.parts:
-            if getattr(part, "inline_data", None) and part.inline_data.data:
-                ext = mimetypes.guess_extension(part.inline_data.mime_type) or ".bin"
-                image_uuid = str(uuid.uuid4())
-                path = Path(f"{image_uuid}{ext}")
-                path.write_bytes(part.inline_data.data)
-                print(f"Saved image: {path}")
-                gcs_path = f"gs://line-oa-campaign-manager-images/{path.name}"
-                public_url = f"https://storage.googleapis.com/line-oa-campaign-manager-images/{path.name}"
-                bucket = storage_client.bucket("line-oa-campaign-manager-images")
-                blob = bucket.blob(path.name)
-                blob.upload_from_filename(path)
-                print(f"Uploaded image to: {gcs_path}")
-                return public_url
-        return "Image generation failed"
+        queued = time.perf_counter()
+        _image_generation_stats["waiting"] += 1
+        try:
+            await _get_image_semaphore().acquire()
+        finally:
+            _image_generation_stats["waiting"] -= 1
+        wait_seconds = time.perf_counter() - queued
+        _image_generation_stats["max_wait_seconds"] = max(_image_generation_stats["max_wait_seconds"], wait_seconds)
+        _image_generation_stats["active"] += 1
+        try:
+            started = time.perf_counter()
+            res = await get_genai_client().aio.models.generate_content(**_image_request(prompt))
+            inline_data = _first_image_part(res)
+            if inline_data is None:
+                _image_generation_stats["failed"] += 1
+                return "Image generation failed"
+            url = await asyncio.get_running_loop().run_in_executor(
+                _get_image_upload_executor(), _upload_image, prompt, inline_data, started
+            )
+            _image_generation_stats["completed"] += 1
+            return url
+        finally:
+            _image_generation_stats["active"] -= 1
+            _get_image_semaphore().release()
     except Exception as e:
-        print(f"Error in gemini_generate_image: {e}")
+        _image_generation_stats["failed"] += 1
+        logger.exception(f"Error in gemini_generate_image_async: {e}")
         return f"Error generating image: {str(e)}"
 
 # ใช้ absolute path ของ npx สำหรับ Docker container
@@ -65,13 +243,13 @@ def get_npx_path():
     # ใช้ environment variable ก่อน
     npx_path = os.getenv('NPX_PATH')
     if npx_path and os.path.exists(npx_path):
-        print(f"Using NPX_PATH: {npx_path}")
+        logger.info(f"Using NPX_PATH: {npx_path}")
         return npx_path
     
     # ลองหา npx ใน PATH
     npx_path = shutil.which('npx')
     if npx_path:
-        print(f"Found npx in PATH: {npx_path}")
+        logger.info(f"Found npx in PATH: {npx_path}")
         return npx_path
     
     # Docker container paths ที่เป็นไปได้
@@ -84,69 +262,221 @@ def get_npx_path():
     
     for path in docker_paths:
         if os.path.exists(path):
-            print(f"Found npx at: {path}")
+            logger.info(f"Found npx at: {path}")
             return path
     
     # ถ้าหาไม่เจอเลย ให้ใช้ 'npx' และให้ระบบจัดการเอง
-    print("Warning: npx not found in common paths, using 'npx'")
+    logger.warning("npx not found in common paths, using 'npx'")
     return 'npx'
 
-npx_path = get_npx_path()
-print(f"Using npx command: {npx_path}")
+MCP_SERVER_PACKAGE = "@line/line-bot-mcp-server"
+
+
+def get_node_path() -> str | None:
+    """หาตำแหน่ง node command สำหรับรัน MCP server โดยตรง"""
+    node_path = os.getenv('NODE_BINARY')
+    if node_path and os.path.exists(node_path):
+        return node_path
+
+    node_path = shutil.which('node')
+    if node_path:
+        return node_path
+
+    for path in ['/usr/bin/node', '/usr/local/bin/node', '/opt/nodejs/bin/node']:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def find_mcp_server_entry(node_path: str | None = None) -> str | None:
+    """
+    หา entry point (.js) ของ @line/line-bot-mcp-server ที่ติดตั้งแบบ global (npm install -g)
+    เพื่อรันด้วย node โดยตรงโดยไม่ต้องผ่าน npx
+    """
+    entry = os.getenv('LINE_BOT_MCP_SERVER_ENTRY')
+    if entry and os.path.exists(entry):
+        return entry
+
+    roots = []
+    if os.getenv('NPM_GLOBAL_ROOT'):
+        roots.append(os.getenv('NPM_GLOBAL_ROOT'))
+    if node_path:
+        # global modules อยู่ที่ <prefix>/lib/node_modules โดย node อยู่ที่ <prefix>/bin/node
+        prefix = Path(os.path.realpath(node_path)).parent.parent
+        roots.append(str(prefix / 'lib' / 'node_modules'))
+    roots += ['/usr/lib/node_modules', '/usr/local/lib/node_modules']
+
+    for root in roots:
+        package_dir = Path(root) / MCP_SERVER_PACKAGE
+        package_json = package_dir / 'package.json'
+        if not package_json.exists():
+            continue
+        try:
+            package = json.loads(package_json.read_text())
+        except Exception as e:
+            logger.warning(f"Cannot read {package_json}: {e}")
+            continue
+        bin_field = package.get('bin')
+        if isinstance(bin_field, dict):
+            bin_field = next(iter(bin_field.values()), None)
+        for candidate in [bin_field, package.get('main'), 'dist/index.js']:
+            if candidate and (package_dir / candidate).exists():
+                return str(package_dir / candidate)
+    return None
+
+
+def get_mcp_server_command() -> tuple[str, list[str]]:
+    """
+    คืน (command, args) สำหรับ launch LINE Bot MCP server
+    - ใช้ node รัน package ที่ติดตั้งแบบ global โดยตรงถ้าหาเจอ (เร็วกว่า npx)
+    - fallback เป็น npx -y @line/line-bot-mcp-server
+    - ตั้ง MCP_SERVER_LAUNCH=npx เพื่อบังคับใช้ npx
+    """
+    if os.getenv('MCP_SERVER_LAUNCH', 'auto').lower() != 'npx':
+        node_path = get_node_path()
+        entry = find_mcp_server_entry(node_path)
+        if node_path and entry:
+            logger.info(f"Using globally installed MCP server: {node_path} {entry}")
+            return node_path, [entry]
+
+    npx_path = get_npx_path()
+    logger.info(f"Using npx command: {npx_path}")
+    return npx_path, ["-y", MCP_SERVER_PACKAGE]
+
+
+mcp_server_command, mcp_server_args = get_mcp_server_command()
+
+# จำนวน MCP server processes ที่รันค้างไว้ใน pool (0 = ให้ MCPToolset spawn process เอง)
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+# timeout ต่อ MCP tool call (ไม่เกินเวลาที่เหลือของ turn) และจำนวนครั้งที่ลองของ tools ที่อ่านข้อมูลอย่างเดียว
+MCP_CALL_TIMEOUT_SECONDS = float(os.getenv("MCP_CALL_TIMEOUT_SECONDS", "30"))
+MCP_RETRY_ATTEMPTS = int(os.getenv("MCP_RETRY_ATTEMPTS", "3"))
+# circuit breaker: เมื่อ MCP server ล้มเหลว/ช้าเกิน agent ตอบโดยไม่มี LINE tools แทนการรอ timeout
+MCP_BREAKER_ENABLED = os.getenv("MCP_BREAKER_ENABLED", "true").lower() == "true"
+line_bot_mcp_breaker = CircuitBreaker(
+    name="line_bot_mcp",
+    failure_rate_threshold=float(os.getenv("MCP_BREAKER_FAILURE_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("MCP_BREAKER_SLOW_CALL_SECONDS", "10")),
+    window_size=int(os.getenv("MCP_BREAKER_WINDOW", "20")),
+    minimum_calls=int(os.getenv("MCP_BREAKER_MIN_CALLS", "5")),
+    open_seconds=float(os.getenv("MCP_BREAKER_OPEN_SECONDS", "30")),
+)
+line_bot_mcp_pool = None
+line_bot_mcp_server_params = None
 
 try:
     channel_token = os.getenv("DEST_OA_LINE_CHANNEL_ACCESS_TOKEN")
     destination_user_id = os.getenv("DEST_OA_LINE_DESTINATION_USER_ID")
 
     if not channel_token or not destination_user_id:
-        print("Warning: Missing LINE credentials for MCP server")
+        logger.warning("Missing LINE credentials for MCP server")
         line_bot_mcp_toolset = None
     else:
         # ปรับปรุงการตั้งค่า MCP เพื่อลดปัญหา event loop และ subprocess cleanup
-        line_bot_mcp_toolset = MCPToolset(
-            connection_params=StdioConnectionParams(
-                server_params=StdioServerParameters(
-                    command=npx_path,
-                    args=[
-                        "-y",
-                        "@line/line-bot-mcp-server",
-                    ],
-                    env={
-                        "CHANNEL_ACCESS_TOKEN": channel_token,
-                        "DESTINATION_USER_ID": destination_user_id,
-                        "MCP_RETRY_COUNT": "3",  # เพิ่ม retry เป็น 3 ครั้ง
-                        "MCP_TIMEOUT": "45",     # เพิ่ม timeout เป็น 45 วินาที
-                        "MCP_INITIALIZATION_TIMEOUT": "45",  # เพิ่ม initialization timeout
-                        "NODE_ENV": "production",  # เพิ่ม NODE_ENV
-                        "NODE_NO_WARNINGS": "1",   # ปิด warnings
-                        "MCP_CLEANUP_TIMEOUT": "15",  # เพิ่ม cleanup timeout
-                        "MCP_CONNECTION_RETRY_DELAY": "2000",  # เพิ่ม delay ระหว่าง retry
-                        "MCP_MAX_CONNECTION_ATTEMPTS": "5",  # เพิ่มจำนวนครั้งที่พยายามเชื่อมต่อ
-                    },
-                ),
-            ),
+        line_bot_mcp_server_params = StdioServerParameters(
+            command=mcp_server_command,
+            args=mcp_server_args,
+            env={
+                "CHANNEL_ACCESS_TOKEN": channel_token,
+                "DESTINATION_USER_ID": destination_user_id,
+                "MCP_RETRY_COUNT": "3",  # เพิ่ม retry เป็น 3 ครั้ง
+                "MCP_TIMEOUT": "45",     # เพิ่ม timeout เป็น 45 วินาที
+                "MCP_INITIALIZATION_TIMEOUT": "45",  # เพิ่ม initialization timeout
+                "NODE_ENV": "production",  # เพิ่ม NODE_ENV
+                "NODE_NO_WARNINGS": "1",   # ปิด warnings
+                "MCP_CLEANUP_TIMEOUT": "15",  # เพิ่ม cleanup timeout
+                "MCP_CONNECTION_RETRY_DELAY": "2000",  # เพิ่ม delay ระหว่าง retry
+                "MCP_MAX_CONNECTION_ATTEMPTS": "5",  # เพิ่มจำนวนครั้งที่พยายามเชื่อมต่อ
+            },
         )
-        print("✓ MCP Toolset created successfully")
+        if MCP_POOL_SIZE > 0:
+            # ใช้ pool ของ MCP server ที่รันค้างไว้ แทนการ spawn Node ใหม่ทุก session
+            line_bot_mcp_pool = McpServerPool(
+                line_bot_mcp_server_params,
+                size=MCP_POOL_SIZE,
+                health_check_interval=float(os.getenv("MCP_POOL_HEALTH_CHECK_INTERVAL", "30")),
+            )
+            line_bot_mcp_toolset = PooledMcpToolset(
+                line_bot_mcp_pool,
+                call_timeout=MCP_CALL_TIMEOUT_SECONDS,
+                retry_attempts=MCP_RETRY_ATTEMPTS,
+            )
+            logger.info(f"MCP server pool created (size={MCP_POOL_SIZE})")
+        else:
+            from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
+            from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
+
+            line_bot_mcp_toolset = MCPToolset(
+                connection_params=StdioConnectionParams(
+                    server_params=line_bot_mcp_server_params,
+                ),
+            )
+            logger.info("MCP Toolset created successfully")
 except Exception as e:
-    print(f"Failed to create MCP Toolset: {e}")
-    import traceback
-    print(f"Traceback: {traceback.format_exc()}")
+    logger.exception(f"Failed to create MCP Toolset: {e}")
     line_bot_mcp_toolset = None
+    line_bot_mcp_pool = None
+    line_bot_mcp_server_params = None
 
 agent_instruction_prompt = Path(__file__).parent / "agent_instruction_prompt.txt"
 agent_instruction_prompt = agent_instruction_prompt.read_text()
 
-agent_tools = [gemini_generate_image]
+line_bot_mcp_breaker_toolset = None
+if line_bot_mcp_toolset is not None and MCP_BREAKER_ENABLED:
+    line_bot_mcp_breaker_toolset = CircuitBreakerToolset(
+        line_bot_mcp_toolset,
+        line_bot_mcp_breaker,
+        probe=line_bot_mcp_pool.ping if line_bot_mcp_pool is not None else None,
+    )
+    line_bot_mcp_toolset = line_bot_mcp_breaker_toolset
+
+agent_tools = [gemini_generate_image_async]
 if line_bot_mcp_toolset is not None:
     agent_tools.append(line_bot_mcp_toolset)
-    print("MCP Toolset added to agent tools")
+    logger.info("MCP Toolset added to agent tools")
 else:
-    print("MCP Toolset not available")
+    logger.warning("MCP Toolset not available")
+
+# AGENT_MODEL_SCRIPT=default หรือ path ของ script JSON: ใช้ LLM จำลองแทน Gemini (วัด overhead ของ orchestration)
+AGENT_MODEL_SCRIPT = os.getenv("AGENT_MODEL_SCRIPT", "")
+if AGENT_MODEL_SCRIPT:
+    from .scripted_llm import ScriptedLlm, load_script
+
+    agent_model = ScriptedLlm(script=load_script(AGENT_MODEL_SCRIPT))
+    logger.warning(f"Using scripted LLM stub instead of Gemini: {AGENT_MODEL_SCRIPT}")
+else:
+    from google.adk.models.google_llm import Gemini
+    from google.genai import types
+
+    # retry เฉพาะ model call ที่ล้มเหลว (408/429/5xx) แบบ exponential backoff + jitter
+    # timeout ของแต่ละ request มาจาก deadline ของ turn (deadline.before_model_callback)
+    agent_model = Gemini(
+        model='gemini-2.0-flash-001',
+        retry_options=types.HttpRetryOptions(
+            attempts=int(os.getenv("MODEL_RETRY_ATTEMPTS", "3")),
+            initial_delay=float(os.getenv("MODEL_RETRY_INITIAL_DELAY", "0.5")),
+            max_delay=float(os.getenv("MODEL_RETRY_MAX_DELAY", "4")),
+            exp_base=2,
+            jitter=1,
+            http_status_codes=[408, 429, 500, 502, 503, 504],
+        ),
+    )
+
+
+
+def tool_callbacks(name: str) -> list:
+    """callbacks ของ circuit breaker (ถ้าเปิดใช้) ต้องมาก่อน idempotency เพื่อตอบ error ทันทีเมื่อ circuit เปิด"""
+    return [getattr(line_bot_mcp_breaker_toolset, name)] if line_bot_mcp_breaker_toolset is not None else []
+
 
 line_oa_agent = Agent(
-    model='gemini-2.0-flash-001',
+    model=agent_model,
     name='line_oa_campaign_manager',
     description="LINE Bot Campaign Manager",
     instruction=agent_instruction_prompt,
     tools=agent_tools,
+    before_model_callback=deadline.before_model_callback,
+    before_tool_callback=[*tool_callbacks("before_tool_callback"), idempotency.before_tool_callback],
+    after_tool_callback=[*tool_callbacks("after_tool_callback"), idempotency.after_tool_callback],
+    on_tool_error_callback=[*tool_callbacks("on_tool_error_callback"), idempotency.on_tool_error_callback],
 )
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""
+Circuit breaker ของ LINE MCP toolset
+
+- closed:    ใช้ MCP tools ตามปกติ นับผลของ tool calls ล่าสุด (window) ถ้าสัดส่วนที่ล้มเหลวหรือช้าเกิน
+             slow_call_seconds ถึง failure_rate_threshold (เมื่อมีอย่างน้อย minimum_calls) จะเปิด circuit
+- open:      agent รันโดยไม่มี MCP tools (ตอบเร็วแทนการรอ timeout) และ tool calls ที่ค้างอยู่ถูกตอบ error ทันที
+- half_open: หลัง open_seconds ให้ turn หนึ่ง probe MCP server (ping) สำเร็จ = closed, ล้มเหลว = open ต่อ
+             probe ที่ถูกยกเลิก (turn ถูก cancel) หรือค้างเกิน probe_timeout คืนสิทธิ์ให้ turn ถัดไป probe ใหม่
+
+LINE API ตอบ error (isError) ไม่นับเป็นความล้มเหลวของ MCP server (เช่น arguments ไม่ถูกต้อง)
+pool เต็ม (McpPoolExhausted) ไม่ถูกนับ และ timeout ฝั่งเรา (call timeout/deadline ของ turn) นับเฉพาะเมื่อ
+call ใช้เวลาถึง slow_call_seconds แล้ว (turn ที่เหลือเวลาน้อยไม่ทำให้ circuit เปิด)
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+import weakref
+from typing import Awaitable, Callable
+
+from google.adk.tools.base_toolset import BaseToolset
+
+from . import deadline
+from .mcp_pool import McpPoolExhausted
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+DEGRADED_INSTRUCTION = (
+    "ขณะนี้เครื่องมือ LINE OA (ส่งข้อความ, บรอดแคสต์, rich menu, โควต้า, โปรไฟล์) ใช้งานไม่ได้ชั่วคราว "
+    "ห้ามบอกผู้ใช้ว่าส่งหรือตรวจสอบข้อมูลบน LINE OA แล้ว ให้แจ้งว่าระบบ LINE OA ขัดข้องชั่วคราว "
+    "และช่วยเรื่องที่ไม่ต้องใช้เครื่องมือเหล่านี้ (เช่น วางแผนแคมเปญ, ร่าง Flex Message) ไปก่อน"
+)
+
+
+class CircuitBreaker:
+    """circuit breaker แบบนับสัดส่วน calls ที่ล้มเหลว/ช้า ใน window ล่าสุด พร้อม half-open probe"""
+
+    def __init__(
+        self,
+        name: str = "mcp",
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        window_size: int = 20,
+        minimum_calls: int = 5,
+        open_seconds: float = 30.0,
+        probe_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        # เรียกเมื่อเปลี่ยนสถานะ: on_state_change(old, new)
+        self.on_state_change: Callable[[str, str], None] | None = None
+
+        self._window: collections.deque[bool] = collections.deque(maxlen=window_size)  # True = ล้มเหลว/ช้า
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _transition(self, new_state: str) -> None:
+        # เรียกขณะถือ lock
+        old_state, self._state = self._state, new_state
+        if new_state == OPEN:
+            self._opened_at = self.clock()
+            self.opened += 1
+        if new_state != HALF_OPEN:
+            self._probe_in_flight = False
+        if new_state == CLOSED:
+            self._window.clear()
+        logger.warning(f"[MCP-BREAKER] {self.name}: {old_state} -> {new_state}")
+        if self.on_state_change is not None:
+            try:
+                self.on_state_change(old_state, new_state)
+            except Exception:
+                logger.exception("[MCP-BREAKER] on_state_change callback failed")
+
+    def allow_request(self) -> bool:
+        """closed = ใช้ได้, open = ไม่ได้ (จนครบ open_seconds แล้วให้ probe ได้หนึ่งครั้ง)"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN and self._probe_in_flight and (
+                self.clock() - self._probe_started >= self.probe_timeout
+            ):
+                logger.warning(f"[MCP-BREAKER] {self.name}: probe did not finish, allowing a new probe")
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_started = self.clock()
+                return True
+            self.rejected += 1
+            return False
+
+    def reject(self) -> None:
+        """นับ call ที่ถูกปฏิเสธนอก allow_request (เช่น tool call ที่ค้างอยู่ตอน circuit เปิด)"""
+        with self._lock:
+            self.rejected += 1
+
+    def release_probe(self) -> None:
+        """คืนสิทธิ์ probe โดยไม่บันทึกผล (probe ถูกยกเลิกก่อนรู้ผล) ให้ turn ถัดไป probe ใหม่"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def is_probing(self) -> bool:
+        return self._state == HALF_OPEN
+
+    def record_error(self, error: BaseException, duration: float = 0.0) -> bool:
+        """บันทึก call ที่ raise error: pool เต็มไม่นับ, timeout ฝั่งเรานับเฉพาะเมื่อช้าถึง slow_call_seconds
+
+        คืน False เมื่อไม่ได้บันทึก
+        """
+        if isinstance(error, McpPoolExhausted):
+            return False
+        if isinstance(error, asyncio.TimeoutError) and duration < self.slow_call_seconds:
+            return False
+        self.record(True, duration)
+        return True
+
+    def record(self, failed: bool, duration: float = 0.0) -> None:
+        """บันทึกผลของ call (ช้ากว่า slow_call_seconds นับเป็นล้มเหลว)"""
+        failed = failed or duration >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(OPEN if failed else CLOSED)
+                return
+            if self._state == OPEN:
+                return
+            self._window.append(failed)
+            if len(self._window) >= self.minimum_calls and self.failure_rate() >= self.failure_rate_threshold:
+                self._transition(OPEN)
+
+    def failure_rate(self) -> float:
+        return sum(self._window) / len(self._window) if self._window else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            retry_in = max(0.0, self.open_seconds - (self.clock() - self._opened_at)) if self._state == OPEN else 0.0
+            return {
+                "state": self._state,
+                "failure_rate": round(self.failure_rate(), 3),
+                "window_calls": len(self._window),
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "retry_in_seconds": round(retry_in, 1),
+            }
+
+
+class CircuitBreakerToolset(BaseToolset):
+    """ครอบ MCP toolset ด้วย CircuitBreaker
+
+    - get_tools คืนรายการว่างเมื่อ circuit เปิดหรือดึงรายการ tools ไม่ได้ (agent รันต่อโดยไม่มี MCP tools)
+      และเพิ่ม DEGRADED_INSTRUCTION ให้ model ใน request นั้น
+    - ตอน half-open ใช้ probe (เช่น McpServerPool.ping) ตรวจ server จริงก่อนปิด circuit
+    - ผลของ tool calls บันทึกผ่าน ADK tool callbacks ของ toolset นี้ (ผูกกับ agent ใน agent.py)
+    """
+
+    def __init__(
+        self,
+        toolset: BaseToolset,
+        breaker: CircuitBreaker,
+        probe: Callable[[], Awaitable] | None = None,
+        probe_timeout: float = 10.0,
+    ):
+        super().__init__()
+        self.toolset = toolset
+        self.breaker = breaker
+        self.probe = probe
+        self.probe_timeout = probe_timeout
+        self.tool_names: set[str] = set()
+        # invocation_id -> InvocationContext ของ run ที่ได้รายการ tools ว่าง
+        # entry หายไปเองเมื่อ run จบ (รวม run ที่ถูกยกเลิก/timeout/error ก่อนถึง process_llm_request)
+        self._degraded_invocations: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        self._started: dict[str, float] = {}
+        self._started_lock = threading.Lock()
+
+    def _mark_degraded(self, readonly_context) -> list:
+        invocation_context = getattr(readonly_context, "_invocation_context", None)
+        if invocation_context is not None:
+            self._degraded_invocations[invocation_context.invocation_id] = invocation_context
+        return []
+
+    async def get_tools(self, readonly_context=None) -> list:
+        if not self.breaker.allow_request():
+            return self._mark_degraded(readonly_context)
+        probing = self.breaker.is_probing()
+        started = time.perf_counter()
+        try:
+            if probing and self.probe is not None:
+                await asyncio.wait_for(self.probe(), timeout=deadline.call_timeout(self.probe_timeout))
+            tools = await asyncio.wait_for(
+                self.toolset.get_tools(readonly_context), timeout=deadline.call_timeout(self.probe_timeout)
+            )
+        except Exception as e:
+            logger.warning(f"[MCP-BREAKER] Listing MCP tools failed, running without them: {e!r}")
+            if not self.breaker.record_error(e, time.perf_counter() - started) and probing:
+                # probe ไม่ได้ผลจาก server (pool เต็ม/turn เหลือเวลาน้อย) ให้ turn ถัดไป probe ใหม่
+                self.breaker.release_probe()
+            return self._mark_degraded(readonly_context)
+        except BaseException:
+            # turn ถูกยกเลิก (เช่น wait_text หมดเวลา) ไม่ใช่ความล้มเหลวของ server แต่ต้องคืนสิทธิ์ probe
+            if probing:
+                self.breaker.release_probe()
+            raise
+        if probing:
+            # รายการ tools ใน closed state มักมาจาก cache จึงนับเฉพาะตอน probe
+            self.breaker.record(False, time.perf_counter() - started)
+        self.tool_names.update(tool.name for tool in tools)
+        return tools
+
+    async def process_llm_request(self, *, tool_context, llm_request) -> None:
+        await self.toolset.process_llm_request(tool_context=tool_context, llm_request=llm_request)
+        invocation_id = getattr(tool_context, "invocation_id", None)
+        if invocation_id and self._degraded_invocations.pop(invocation_id, None) is not None:
+            llm_request.append_instructions([DEGRADED_INSTRUCTION])
+
+    async def close(self) -> None:
+        await self.toolset.close()
+
+    # ---------------------------
+    # ADK tool callbacks
+    # ---------------------------
+    def _call_key(self, tool, tool_context) -> str:
+        return getattr(tool_context, "function_call_id", None) or f"{tool.name}:{id(tool_context)}"
+
+    def before_tool_callback(self, tool, args, tool_context):
+        """ตอบ error ทันทีเมื่อ circuit เปิดระหว่าง turn แทนการรอ MCP server ที่ไม่ตอบ"""
+        if tool.name not in self.tool_names:
+            return None
+        if self.breaker.state == OPEN:
+            self.breaker.reject()
+            return {
+                "content": [{"type": "text", "text": "LINE OA tools are temporarily unavailable (circuit open)."}],
+                "isError": True,
+            }
+        with self._started_lock:
+            self._started[self._call_key(tool, tool_context)] = time.perf_counter()
+        return None
+
+    def _finish(self, tool, tool_context, error: BaseException | None = None) -> None:
+        with self._started_lock:
+            started = self._started.pop(self._call_key(tool, tool_context), None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        if error is None:
+            self.breaker.record(False, duration)
+        else:
+            self.breaker.record_error(error, duration)
+
+    def after_tool_callback(self, tool, args, tool_context, tool_response):
+        self._finish(tool, tool_context)
+        return None
+
+    def on_tool_error_callback(self, tool, args, tool_context, error):
+        self._finish(tool, tool_context, error)
+        return None
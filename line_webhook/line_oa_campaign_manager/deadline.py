@@ -0,0 +1,149 @@
+"""
+Deadline budget ต่อ turn และ retry ระดับ call แบบ exponential backoff + jitter
+
+- budget(seconds): กำหนด deadline ของ turn ใน contextvar (ซ้อนกันได้ ใช้ deadline ที่ใกล้กว่า)
+  contextvar ถูกส่งต่อผ่าน agent loop, turn scheduler และ tasks ที่ ADK สร้างเพื่อเรียก tools
+- remaining(): เวลาที่เหลือของ turn (None = ไม่มี deadline)
+- retry_async: retry เฉพาะ call ที่ล้มเหลว (ไม่รันทั้ง turn ใหม่) และไม่ retry เกิน deadline ที่เหลือ
+- before_model_callback: ส่งเวลาที่เหลือต่อเป็น timeout ของ Gemini request แต่ละครั้ง
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """เวลาของ turn หมดแล้ว (ไม่ retry ต่อ)"""
+
+
+class TurnBudget:
+    """deadline ของ turn หนึ่งพร้อมตัวนับ retry ของ calls ภายใน turn"""
+
+    def __init__(self, deadline: float, clock: Callable[[], float] = time.monotonic):
+        self.deadline = deadline
+        self.clock = clock
+        self.retries = 0
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - self.clock())
+
+
+_current_budget: contextvars.ContextVar[TurnBudget | None] = contextvars.ContextVar("turn_budget", default=None)
+
+
+@contextlib.contextmanager
+def budget(seconds: float, clock: Callable[[], float] = time.monotonic):
+    """กำหนด deadline ของ turn เป็น seconds จากตอนนี้ (ไม่เกิน deadline ของ scope ชั้นนอก)"""
+    deadline = clock() + seconds
+    outer = _current_budget.get()
+    if outer is not None:
+        deadline = min(deadline, outer.deadline)
+    turn_budget = TurnBudget(deadline, clock)
+    token = _current_budget.set(turn_budget)
+    try:
+        yield turn_budget
+    finally:
+        _current_budget.reset(token)
+
+
+def current() -> TurnBudget | None:
+    return _current_budget.get()
+
+
+def remaining() -> float | None:
+    """เวลาที่เหลือของ turn ปัจจุบัน (วินาที) หรือ None ถ้าไม่มี deadline"""
+    turn_budget = _current_budget.get()
+    return None if turn_budget is None else turn_budget.remaining()
+
+
+def call_timeout(timeout: float | None = None) -> float | None:
+    """timeout ของ call หนึ่งครั้ง: ค่าที่น้อยกว่าระหว่าง timeout ของ call กับเวลาที่เหลือของ turn"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("turn deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """full jitter: สุ่มระหว่าง 0 ถึง min(max_delay, base_delay * 2^attempt)"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+async def retry_async(
+    call: Callable[[], Awaitable[Any]],
+    *,
+    attempts: int = 3,
+    base_delay: float = 0.2,
+    max_delay: float = 2.0,
+    timeout: float | None = None,
+    should_retry: Callable[[Exception], bool] = lambda e: True,
+    retry_result: Callable[[Any], bool] | None = None,
+    label: str = "call",
+) -> Any:
+    """
+    เรียก call() จนสำเร็จไม่เกิน attempts ครั้ง ภายใน deadline ของ turn
+
+    - แต่ละครั้งถูกจำกัดเวลาด้วย call_timeout(timeout)
+    - exception ที่ should_retry คืน False และ DeadlineExceeded ถูก raise ทันที
+    - ผลลัพธ์ที่ retry_result คืน True (เช่น isError) ถูก retry และคืนผลสุดท้ายเมื่อครบ attempts
+    - ถ้าเวลาที่เหลือไม่พอสำหรับ backoff ครั้งถัดไปจะไม่ retry
+    """
+    for attempt in range(attempts):
+        per_call = call_timeout(timeout)
+        left = remaining()
+        try:
+            result = await asyncio.wait_for(call(), timeout=per_call)
+        except DeadlineExceeded:
+            raise
+        except asyncio.TimeoutError as e:
+            if left is not None and per_call >= left:
+                raise DeadlineExceeded(f"{label}: turn deadline exceeded") from e
+            error, result = e, None
+        except Exception as e:
+            error, result = e, None
+        else:
+            if retry_result is None or not retry_result(result):
+                return result
+            error = None
+
+        if attempt == attempts - 1 or (error is not None and not should_retry(error)):
+            if error is not None:
+                raise error
+            return result
+        delay = backoff_delay(attempt, base_delay, max_delay)
+        left = remaining()
+        if left is not None and delay >= left:
+            if error is not None:
+                raise error
+            return result
+        reason = repr(error) if error is not None else "error result"
+        logger.warning(f"[RETRY] {label} failed (attempt {attempt + 1}/{attempts}): {reason}; retrying in {delay:.2f}s")
+        turn_budget = _current_budget.get()
+        if turn_budget is not None:
+            turn_budget.retries += 1
+        await asyncio.sleep(delay)
+
+
+def before_model_callback(callback_context, llm_request):
+    """ADK before_model_callback: ใช้เวลาที่เหลือของ turn เป็น timeout ของ Gemini request"""
+    left = remaining()
+    if left is None:
+        return None
+    if left <= 0:
+        raise DeadlineExceeded("turn deadline exceeded before model call")
+    if llm_request.config.http_options is None:
+        llm_request.config.http_options = types.HttpOptions()
+    # genai ใช้หน่วยมิลลิวินาที และใช้ timeout นี้กับแต่ละ attempt ของ retry_options
+    llm_request.config.http_options.timeout = max(1, int(left * 1000))
+    return None
@@ -0,0 +1,131 @@
+"""
+กันการเรียก MCP tools ที่มีผลข้างเคียง (ส่งข้อความ, บรอดแคสต์, แก้ rich menu) ซ้ำภายใน turn เดียว
+
+model อาจเรียก tool เดิมด้วย arguments เดิมซ้ำ (เช่น หลัง tool อื่นล้มเหลว หรือเรียกซ้ำใน response เดียว)
+ledger ของ turn จำ call ที่สำเร็จแล้วหรือกำลังรันอยู่ตาม (ชื่อ tool, arguments) แล้วตอบผลเดิมแทนการส่งซ้ำ
+call ที่ LINE API ตอบ error หรือ raise exception ถูกลบออกจาก ledger (model ตัดสินใจเรียกใหม่ได้)
+
+ใช้ turn_scope() ครอบ agent turn และผูก callbacks เข้ากับ agent (ดู agent.py)
+นอก turn_scope callbacks ไม่ทำอะไร
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# tools ของ LINE Bot MCP server ที่ส่งข้อความหรือเปลี่ยนสถานะของ LINE OA (ห้ามทำซ้ำโดยไม่ตั้งใจ)
+SIDE_EFFECT_TOOLS = frozenset({
+    "push_text_message",
+    "push_flex_message",
+    "broadcast_text_message",
+    "broadcast_flex_message",
+    "create_rich_menu",
+    "delete_rich_menu",
+    "set_rich_menu_default",
+    "cancel_rich_menu_default",
+})
+
+
+def _is_error(tool_response) -> bool:
+    return isinstance(tool_response, dict) and bool(tool_response.get("isError") or tool_response.get("is_error"))
+
+
+class ToolCallLedger:
+    """side-effecting tool calls ของ turn หนึ่ง: key -> (function_call_id เจ้าของ, ผลลัพธ์)"""
+
+    def __init__(self):
+        self._calls: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    @staticmethod
+    def key(tool_name: str, args: dict) -> str:
+        return f"{tool_name}:{json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    def reserve(self, tool_name: str, args: dict, call_id: str) -> dict | None:
+        """จอง call ใหม่ (คืน None) หรือคืนผลของ call เดิมถ้าเคยเรียกด้วย arguments เดียวกันแล้ว"""
+        key = self.key(tool_name, args)
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is None:
+                self._calls[key] = {"owner": call_id, "result": None}
+                return None
+            self.suppressed += 1
+            result = entry["result"]
+        logger.warning(f"[IDEMPOTENCY] Suppressed duplicate {tool_name} call in this turn")
+        if result is None:
+            note = f"{tool_name} with the same arguments is already running in this turn; not sent again."
+            return {"content": [{"type": "text", "text": note}], "isError": False}
+        note = f"{tool_name} with the same arguments was already executed in this turn; not sent again."
+        return {**result, "content": [*result.get("content", []), {"type": "text", "text": note}]}
+
+    def complete(self, tool_name: str, args: dict, call_id: str, tool_response) -> None:
+        key = self.key(tool_name, args)
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is None or entry["owner"] != call_id:
+                return  # call ที่ถูกตอบจาก ledger ไม่ใช่เจ้าของ
+            if _is_error(tool_response):
+                del self._calls[key]
+            else:
+                entry["result"] = tool_response if isinstance(tool_response, dict) else {"result": tool_response}
+
+    def release(self, tool_name: str, args: dict, call_id: str) -> None:
+        key = self.key(tool_name, args)
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is not None and entry["owner"] == call_id:
+                del self._calls[key]
+
+
+_current_ledger: contextvars.ContextVar[ToolCallLedger | None] = contextvars.ContextVar(
+    "tool_call_ledger", default=None
+)
+
+
+@contextlib.contextmanager
+def turn_scope():
+    """เริ่ม ledger ใหม่สำหรับ agent turn หนึ่งครั้ง"""
+    ledger = ToolCallLedger()
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+
+
+def _guarded(tool) -> ToolCallLedger | None:
+    ledger = _current_ledger.get()
+    return ledger if ledger is not None and tool.name in SIDE_EFFECT_TOOLS else None
+
+
+def _call_id(tool, tool_context) -> str:
+    return getattr(tool_context, "function_call_id", None) or f"{tool.name}:{id(tool_context)}"
+
+
+def before_tool_callback(tool, args, tool_context):
+    """ADK before_tool_callback: ตอบผลเดิมแทนการเรียก side-effecting tool ซ้ำ"""
+    ledger = _guarded(tool)
+    if ledger is None:
+        return None
+    return ledger.reserve(tool.name, args, _call_id(tool, tool_context))
+
+
+def after_tool_callback(tool, args, tool_context, tool_response):
+    """ADK after_tool_callback: บันทึกผลของ call ที่จองไว้"""
+    ledger = _guarded(tool)
+    if ledger is not None:
+        ledger.complete(tool.name, args, _call_id(tool, tool_context), tool_response)
+    return None
+
+
+def on_tool_error_callback(tool, args, tool_context, error):
+    """ADK on_tool_error_callback: ยกเลิกการจองเมื่อ tool raise (ไม่จัดการ error แทน)"""
+    ledger = _guarded(tool)
+    if ledger is not None:
+        ledger.release(tool.name, args, _call_id(tool, tool_context))
+    return None
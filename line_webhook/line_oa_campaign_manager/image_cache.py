@@ -0,0 +1,151 @@
+"""
+Cache ของรูปภาพ Campaign ที่สร้างแล้ว (content-addressed)
+
+key = hash ของ (ชื่อโมเดล + prompt ที่ normalize แล้ว) -> public URL บน GCS
+- tier 1: LRU ในหน่วยความจำของโปรเซส
+- tier 2: SQLite file ของ instance (แชร์ระหว่าง workers และ restart ของ process บน instance เดียวกัน)
+ทั้งสอง tier หมดอายุตาม TTL เดียวกัน
+
+cache นี้เป็นของแต่ละ instance: บน Cloud Run ไฟล์ใน /tmp อยู่ในหน่วยความจำของ instance
+และหายไปเมื่อ instance ถูกปิดหรือ scale ลง instance ใหม่จึงเริ่มจาก cache ว่างเสมอ
+"""
+
+import collections
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """normalize prompt เพื่อให้ prompt ที่ต่างกันแค่ช่องว่าง/ตัวพิมพ์ได้ key เดียวกัน"""
+    text = unicodedata.normalize("NFKC", prompt)
+    text = text.replace("\u200b", "")  # zero-width space ที่พบบ่อยในข้อความภาษาไทย
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def prompt_key(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """LRU ในหน่วยความจำ + SQLite สำหรับ mapping prompt -> URL ของรูปภาพ"""
+
+    def __init__(
+        self,
+        db_path: str | None = None,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 256,
+        clock=time.time,
+    ):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (url, created_at, generation_seconds)
+        self._memory: collections.OrderedDict[str, tuple[str, float, float]] = collections.OrderedDict()
+        self._db: sqlite3.Connection | None = None
+
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS image_cache ("
+                    "key TEXT PRIMARY KEY, url TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, generation_seconds REAL NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"[IMAGE-CACHE] SQLite tier disabled ({db_path}): {e}")
+                self._db = None
+
+    def get(self, prompt: str, model: str) -> str | None:
+        """คืน URL ของรูปที่เคยสร้างด้วย prompt และโมเดลเดียวกัน (หรือ None)"""
+        key = prompt_key(prompt, model)
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += entry[2]
+                return entry[0]
+            if entry is not None:
+                del self._memory[key]
+
+            entry = self._get_sqlite(key, now)
+            if entry is not None:
+                self._remember(key, entry)
+                self.sqlite_hits += 1
+                self.saved_seconds += entry[2]
+                return entry[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, prompt: str, model: str, url: str, generation_seconds: float = 0.0) -> None:
+        key = prompt_key(prompt, model)
+        entry = (url, self._clock(), generation_seconds)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO image_cache VALUES (?, ?, ?, ?)", (key, *entry)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"[IMAGE-CACHE] Failed to write SQLite entry: {e}")
+
+    def _remember(self, key: str, entry: tuple[str, float, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _get_sqlite(self, key: str, now: float) -> tuple[str, float, float] | None:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT url, created_at, generation_seconds FROM image_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl_seconds:
+                self._db.execute("DELETE FROM image_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            return row
+        except sqlite3.Error as e:
+            logger.warning(f"[IMAGE-CACHE] Failed to read SQLite tier: {e}")
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.sqlite_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "sqlite": self._db is not None,
+                "memory_hits": self.memory_hits,
+                "sqlite_hits": self.sqlite_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "saved_generation_seconds": self.saved_seconds,
+            }
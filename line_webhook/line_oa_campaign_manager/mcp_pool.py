@@ -0,0 +1,359 @@
+"""
+Pool ของ MCP server subprocess (stdio) ที่รันค้างไว้และใช้ซ้ำข้าม agent runs
+
+- pre-warm: spawn และ initialize ทุก process ตั้งแต่ตอน start
+- checkout/return: tool call แต่ละครั้งยืม connection ไปใช้แล้วคืนทันทีเมื่อ call จบ
+  (agent runs พร้อมกันเกินขนาด pool จึงรอแค่ช่วงที่ tool call กำลังทำงาน ไม่ใช่ตลอด run)
+- health check: ping connection ที่ว่างอยู่เป็นระยะ (interval <= 0 = ปิด)
+- restart อัตโนมัติเมื่อ process ตายหรือไม่ตอบ ping
+- tool calls จำกัดเวลาตาม deadline ของ turn และ retry เฉพาะ tools ที่อ่านข้อมูลอย่างเดียว
+"""
+
+import asyncio
+import contextlib
+import logging
+import sys
+import time
+from typing import Any
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.genai import types
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from opentelemetry import trace
+
+from . import deadline
+from .idempotency import SIDE_EFFECT_TOOLS
+
+logger = logging.getLogger(__name__)
+# span ของแต่ละ MCP request (no-op จนกว่าโปรเซสจะตั้ง TracerProvider)
+tracer = trace.get_tracer(__name__)
+
+
+class McpPoolExhausted(Exception):
+    """ไม่มี connection ว่างใน pool ภายใน checkout_timeout (pool เต็ม ไม่ได้แปลว่า MCP server เสีย)"""
+
+
+def _read_field(obj, *names):
+    """อ่าน field ที่ชื่อต่างกันระหว่างเวอร์ชันของ mcp (camelCase / snake_case)"""
+    for name in names:
+        value = getattr(obj, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+class McpServerConnection:
+    """MCP server process หนึ่งตัวพร้อม ClientSession
+
+    context ของ stdio_client/ClientSession ถูกเปิดและปิดภายใน task เดียวกันเสมอ
+    (anyio ไม่อนุญาตให้ปิด cancel scope จาก task อื่น)
+    """
+
+    def __init__(self, server_params: StdioServerParameters, index: int = 0, errlog=sys.stderr):
+        self.server_params = server_params
+        self.index = index
+        self.errlog = errlog
+        self.session: ClientSession | None = None
+        self.needs_check = False
+        self.started_at: float | None = None
+        self.startup_seconds: float | None = None
+
+        self._task: asyncio.Task | None = None
+        self._ready: asyncio.Future | None = None
+        self._closing: asyncio.Event | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self, timeout: float | None = None) -> None:
+        """spawn process และ initialize MCP session"""
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        self._closing = asyncio.Event()
+        self.needs_check = False
+        started = time.perf_counter()
+        self._task = asyncio.create_task(self._run(), name=f"mcp-server-{self.index}")
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready), timeout=timeout)
+        except BaseException:
+            await self.close()
+            raise
+        self.started_at = time.time()
+        self.startup_seconds = time.perf_counter() - started
+
+    async def _run(self) -> None:
+        try:
+            async with stdio_client(self.server_params, errlog=self.errlog) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set_result(None)
+                    await self._closing.wait()
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                logger.warning(f"[MCP-POOL] Connection {self.index} terminated: {e}")
+        finally:
+            self.session = None
+
+    async def ping(self, timeout: float) -> bool:
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"[MCP-POOL] Connection {self.index} failed health check: {e}")
+            return False
+
+    async def close(self, timeout: float = 5.0) -> None:
+        if self._task is None:
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+            with contextlib.suppress(BaseException):
+                await self._task
+        self._task = None
+        self.session = None
+
+
+class McpServerPool:
+    """Pool ของ MCP server processes ขนาดคงที่"""
+
+    def __init__(
+        self,
+        server_params: StdioServerParameters,
+        size: int = 2,
+        startup_timeout: float = 60.0,
+        checkout_timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+        errlog=sys.stderr,
+    ):
+        self.server_params = server_params
+        self.size = size
+        self.startup_timeout = startup_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+
+        self._connections = [McpServerConnection(server_params, i, errlog) for i in range(size)]
+        self._idle: asyncio.Queue | None = None
+        self._start_lock: asyncio.Lock | None = None
+        self._health_task: asyncio.Task | None = None
+        self._tools: list | None = None
+        self.started = False
+
+        self.checkouts = 0
+        self.exhausted = 0
+        self.restarts = 0
+        self.failed_health_checks = 0
+        self.total_wait_seconds = 0.0
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    async def start(self) -> None:
+        """pre-warm: spawn และ initialize ทุก process พร้อมกัน (เรียกซ้ำได้)"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.started:
+                return
+            self._idle = asyncio.Queue()
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(conn.start(timeout=self.startup_timeout) for conn in self._connections),
+                return_exceptions=True,
+            )
+            for conn, result in zip(self._connections, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"[MCP-POOL] Connection {conn.index} failed to start: {result}")
+                    conn.needs_check = True
+                self._idle.put_nowait(conn)
+            self.started = True
+            if self.health_check_interval > 0:
+                self._health_task = asyncio.create_task(self._health_loop(), name="mcp-pool-health")
+            logger.info(
+                f"[MCP-POOL] Pre-warmed {self.size} MCP servers in "
+                f"{time.perf_counter() - started:.2f}s"
+            )
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            with contextlib.suppress(BaseException):
+                await self._health_task
+            self._health_task = None
+        await asyncio.gather(*(conn.close() for conn in self._connections), return_exceptions=True)
+        self.started = False
+        self._tools = None
+
+    async def _restart(self, conn: McpServerConnection) -> None:
+        logger.warning(f"[MCP-POOL] Restarting MCP server {conn.index}")
+        await conn.close()
+        self.restarts += 1
+        await conn.start(timeout=self.startup_timeout)
+
+    async def _ensure_healthy(self, conn: McpServerConnection) -> None:
+        if conn.alive and not conn.needs_check:
+            return
+        if conn.alive and await conn.ping(self.ping_timeout):
+            conn.needs_check = False
+            return
+        await self._restart(conn)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            # ตรวจเฉพาะ connection ที่ว่างอยู่ ตัวที่ถูกยืมไปจะถูกตรวจตอนคืน/ยืมครั้งถัดไป
+            idle = []
+            while not self._idle.empty():
+                idle.append(self._idle.get_nowait())
+            for conn in idle:
+                try:
+                    if not await conn.ping(self.ping_timeout):
+                        self.failed_health_checks += 1
+                        await self._restart(conn)
+                except Exception as e:
+                    logger.error(f"[MCP-POOL] Failed to restart MCP server {conn.index}: {e}")
+                    conn.needs_check = True
+                finally:
+                    self._idle.put_nowait(conn)
+
+    # ---------------------------
+    # Checkout / return
+    # ---------------------------
+    @contextlib.asynccontextmanager
+    async def checkout(self, timeout: float | None = None):
+        """ยืม connection ที่พร้อมใช้งานจาก pool และคืนเมื่อออกจาก context"""
+        await self.start()
+        waited = time.perf_counter()
+        timeout = timeout or self.checkout_timeout
+        try:
+            conn = await asyncio.wait_for(self._idle.get(), timeout=timeout)
+        except asyncio.TimeoutError as e:
+            self.exhausted += 1
+            raise McpPoolExhausted(f"no idle MCP server in pool of {self.size} after {timeout:.1f}s") from e
+        self.total_wait_seconds += time.perf_counter() - waited
+        self.checkouts += 1
+        try:
+            await self._ensure_healthy(conn)
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    # ---------------------------
+    # MCP operations
+    # ---------------------------
+    async def list_tools(self) -> list:
+        if self._tools is None:
+            async with self.checkout() as conn:
+                with tracer.start_as_current_span("mcp.list_tools", attributes={"mcp.server_index": conn.index}):
+                    result = await conn.session.list_tools()
+                self._tools = list(result.tools)
+        return self._tools
+
+    async def ping(self) -> None:
+        """ตรวจว่ามี MCP server ใน pool ที่ตอบ ping ได้ (ใช้เป็น probe ของ circuit breaker)"""
+        async with self.checkout() as conn:
+            if not await conn.ping(self.ping_timeout):
+                raise ConnectionError(f"MCP server {conn.index} did not answer ping")
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]):
+        async with self.checkout() as conn:
+            return await self._call(conn, name, arguments)
+
+    async def _call(self, conn: McpServerConnection, name: str, arguments: dict[str, Any]):
+        try:
+            with tracer.start_as_current_span(
+                "mcp.call_tool", attributes={"mcp.tool": name, "mcp.server_index": conn.index}
+            ) as span:
+                result = await conn.session.call_tool(name, arguments)
+                if _read_field(result, "isError", "is_error"):
+                    span.set_status(trace.Status(trace.StatusCode.ERROR, "tool returned isError"))
+                return result
+        except Exception:
+            # connection อาจตายไปแล้ว ให้ตรวจสุขภาพก่อนถูกยืมครั้งถัดไป
+            conn.needs_check = True
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "started": self.started,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "alive": sum(1 for conn in self._connections if conn.alive),
+            "checkouts": self.checkouts,
+            "exhausted": self.exhausted,
+            "restarts": self.restarts,
+            "failed_health_checks": self.failed_health_checks,
+            "avg_checkout_wait_seconds": (
+                self.total_wait_seconds / self.checkouts if self.checkouts else 0.0
+            ),
+        }
+
+
+class PooledMcpTool(BaseTool):
+    """ADK tool ที่เรียก MCP tool ผ่าน connection จาก McpServerPool"""
+
+    def __init__(self, pool: McpServerPool, mcp_tool, call_timeout: float | None = None,
+                 retry_attempts: int = 3, retry_base_delay: float = 0.2, retry_max_delay: float = 2.0):
+        super().__init__(name=mcp_tool.name, description=mcp_tool.description or "")
+        self.pool = pool
+        self.call_timeout = call_timeout
+        # side-effecting tools ไม่ retry อัตโนมัติ: call ที่ timeout หรือ connection หลุดอาจส่งไปแล้ว
+        self.retry_attempts = 1 if self.name in SIDE_EFFECT_TOOLS else retry_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._input_schema = _read_field(mcp_tool, "inputSchema", "input_schema")
+
+    def _get_declaration(self) -> types.FunctionDeclaration:
+        return types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters_json_schema=self._input_schema,
+        )
+
+    async def run_async(self, *, args: dict[str, Any], tool_context) -> Any:
+        result = await deadline.retry_async(
+            lambda: self.pool.call_tool(self.name, args),
+            attempts=self.retry_attempts,
+            base_delay=self.retry_base_delay,
+            max_delay=self.retry_max_delay,
+            timeout=self.call_timeout,
+            # pool เต็มรอมาครบ checkout_timeout แล้ว retry จะรอซ้ำเปล่า ๆ
+            should_retry=lambda e: not isinstance(e, McpPoolExhausted),
+            retry_result=lambda result: bool(_read_field(result, "isError", "is_error")),
+            label=f"MCP {self.name}",
+        )
+        return result.model_dump(exclude_none=True, mode="json")
+
+
+class PooledMcpToolset(BaseToolset):
+    """Toolset ที่ดึงรายการ tools จาก McpServerPool (แทน MCPToolset ที่ spawn process เอง)"""
+
+    def __init__(self, pool: McpServerPool, tool_filter=None, **tool_options):
+        super().__init__(tool_filter=tool_filter)
+        self.pool = pool
+        # call_timeout, retry_attempts, retry_base_delay, retry_max_delay ของ PooledMcpTool
+        self.tool_options = tool_options
+        self._tools: list[PooledMcpTool] | None = None
+
+    async def get_tools(self, readonly_context=None) -> list[BaseTool]:
+        if self._tools is None:
+            self._tools = [
+                PooledMcpTool(self.pool, tool, **self.tool_options) for tool in await self.pool.list_tools()
+            ]
+        return [tool for tool in self._tools if self._is_tool_selected(tool, readonly_context)]
+
+    async def close(self) -> None:
+        # pool ถูกใช้ร่วมกันทั้งโปรเซส จึงไม่ปิดตอน runner ปิด toolset
+        pass
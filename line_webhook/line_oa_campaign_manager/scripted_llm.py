@@ -0,0 +1,122 @@
+"""
+LLM จำลองที่ตอบตาม script สำหรับวัด overhead ของ orchestration (ADK, runner, tools) โดยไม่เรียก Gemini
+
+เลือกใช้แทน Gemini ด้วย AGENT_MODEL_SCRIPT=default (script ในตัว) หรือ path ของไฟล์ JSON:
+
+    {
+      "default_delay_ms": 0,
+      "turns": [
+        {"match": "รูป|แบนเนอร์", "steps": [
+          {"function_call": {"name": "gemini_generate_image_async", "args": {"prompt": "banner"}}, "delay_ms": 300},
+          {"text": "สร้างรูปเรียบร้อยแล้วครับ", "delay_ms": 200}
+        ]},
+        {"steps": [{"text": "สวัสดีครับ"}]}
+      ]
+    }
+
+- turn แรกที่ regex "match" ตรงกับข้อความล่าสุดของผู้ใช้ถูกใช้ (turn ที่ไม่มี match ตรงกับทุกข้อความ)
+- step ที่ n ของ turn คือคำตอบของ model call ครั้งที่ n หลังข้อความผู้ใช้
+  (นับจาก contents ใน request จึงไม่มี state และใช้พร้อมกันหลายผู้ใช้ได้)
+- step เป็น {"text": ...}, {"function_call": {...}} หรือ {"function_calls": [...]} (เรียกหลาย tools พร้อมกัน)
+- หน่วงเวลาแต่ละ step ด้วย delay_ms (ค่าเริ่มต้น default_delay_ms) เพื่อจำลองเวลาของ model
+"""
+
+import asyncio
+import json
+import re
+from typing import AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+DEFAULT_SCRIPT = {
+    "default_delay_ms": 0,
+    "turns": [
+        {
+            "match": "รูป|ภาพ|แบนเนอร์|image|banner",
+            "steps": [
+                {"function_call": {"name": "gemini_generate_image_async",
+                                   "args": {"prompt": "แบนเนอร์โปรโมชั่นลดราคา 50%"}}},
+                {"text": "สร้างรูปแบนเนอร์เรียบร้อยแล้วครับ"},
+            ],
+        },
+        {
+            "match": "โควต้า|เหลือ.*ข้อความ|quota",
+            "steps": [
+                {"function_call": {"name": "get_message_quota", "args": {}}},
+                {"text": "เดือนนี้ส่งข้อความไปแล้ว 42 จาก 500 ข้อความครับ"},
+            ],
+        },
+        {"steps": [{"text": "สวัสดีครับ มีแคมเปญอะไรให้ช่วยวางแผนไหมครับ"}]},
+    ],
+}
+
+
+def load_script(source: str) -> dict:
+    """อ่าน script จาก path ของไฟล์ JSON ("default" = DEFAULT_SCRIPT)"""
+    if source.strip().lower() in ("default", "1", "true"):
+        return DEFAULT_SCRIPT
+    with open(source, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _is_user_message(content: types.Content) -> bool:
+    return content.role == "user" and any(part.text for part in content.parts or [])
+
+
+class ScriptedLlm(BaseLlm):
+    """BaseLlm ที่ตอบตาม script แทนการเรียก Gemini"""
+
+    model: str = "scripted-llm"
+    script: dict = DEFAULT_SCRIPT
+
+    @staticmethod
+    def turn_position(llm_request: LlmRequest) -> tuple[str, int]:
+        """คืน (ข้อความล่าสุดของผู้ใช้, จำนวน model responses หลังข้อความนั้น)"""
+        model_responses = 0
+        for content in reversed(llm_request.contents or []):
+            if _is_user_message(content):
+                return "\n".join(part.text for part in content.parts if part.text), model_responses
+            if content.role == "model":
+                model_responses += 1
+        return "", model_responses
+
+    def select_steps(self, user_text: str) -> list[dict]:
+        for turn in self.script.get("turns", []):
+            pattern = turn.get("match")
+            if pattern is None or re.search(pattern, user_text, re.IGNORECASE):
+                return turn.get("steps", [])
+        return []
+
+    def build_parts(self, step: dict) -> list[types.Part]:
+        calls = step.get("function_calls") or ([step["function_call"]] if "function_call" in step else [])
+        parts = [
+            types.Part(function_call=types.FunctionCall(name=call["name"], args=call.get("args", {})))
+            for call in calls
+        ]
+        if step.get("text"):
+            parts.append(types.Part(text=step["text"]))
+        return parts
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        user_text, position = self.turn_position(llm_request)
+        steps = self.select_steps(user_text)
+        if position < len(steps):
+            step = steps[position]
+        else:
+            # script หมดแล้ว: จบ turn ด้วยข้อความ (ไม่เรียก tool ซ้ำจนวนไม่รู้จบ)
+            texts = [step["text"] for step in steps if step.get("text")]
+            step = {"text": texts[-1] if texts else "(end of script)"}
+
+        delay_ms = step.get("delay_ms", self.script.get("default_delay_ms", 0))
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=self.build_parts(step)),
+            model_version=self.model,
+            turn_complete=True,
+        )
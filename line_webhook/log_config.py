@@ -0,0 +1,221 @@
+"""
+ตั้งค่า logging แบบ structured JSON สำหรับ Cloud Logging
+
+- ทุก record ถูกส่งผ่าน QueueHandler (ไม่ block thread ที่ log) แล้ว QueueListener เขียนลง stdout
+  คิวจำกัดขนาดที่ LOG_QUEUE_MAXSIZE เมื่อเต็ม (stdout ช้ากว่าอัตราการ log) record ใหม่ถูกทิ้งและนับไว้ใน stats()
+- ระดับ log แยกตาม component: LOG_LEVELS="adk_runner_service=WARNING,main=DEBUG"
+- ตัด string ที่ยาวเกิน LOG_MAX_FIELD_CHARS และปิดบังค่าของ field ที่เป็นความลับ (token, signature ฯลฯ)
+  รวมถึงค่าแบบ key=value / "key": "value" / Bearer ใน message และ exception ที่ format แล้ว
+- บรรทัด debug ต่อ event (log ด้วย extra={"sample": True}) ถูกสุ่มเก็บตาม LOG_SAMPLE_RATE
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+LOG_QUEUE_MAXSIZE = int(os.getenv("LOG_QUEUE_MAXSIZE", "10000"))
+
+REDACT_KEYS = re.compile(r"token|secret|signature|authorization|password|api_key", re.IGNORECASE)
+REDACTED = "[REDACTED]"
+# ค่าความลับในข้อความอิสระ: replyToken":"...", access_token=..., Authorization: Bearer ...
+REDACT_TEXT = re.compile(
+    r"""([\w-]*(?:token|secret|signature|authorization|password|api_key)[\w-]*["']?\s*[:=]\s*["']?)"""
+    r"""((?:bearer\s+)?[^"'\s,&}]+)""",
+    re.IGNORECASE,
+)
+REDACT_BEARER = re.compile(r"(bearer\s+)[\w.~+/=-]+", re.IGNORECASE)
+
+# attributes มาตรฐานของ LogRecord ที่ไม่ต้องใส่ซ้ำใน JSON
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample"}
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: "_QueueHandler | None" = None
+
+
+def truncate(value: str, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}…(+{len(value) - limit} chars)"
+
+
+def redact_text(text: str) -> str:
+    """ปิดบังค่าความลับที่ปนอยู่ในข้อความ (message, exception) ที่ format แล้ว"""
+    text = REDACT_TEXT.sub(lambda m: m.group(1) + REDACTED, text)
+    return REDACT_BEARER.sub(lambda m: m.group(1) + REDACTED, text)
+
+
+def redact(value, limit: int = LOG_MAX_FIELD_CHARS):
+    """ปิดบัง field ที่เป็นความลับและตัด string ยาวใน dict/list ซ้อนกัน"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if REDACT_KEYS.search(str(key)) else redact(item, limit)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, limit) for item in value]
+    if isinstance(value, str):
+        return truncate(value, limit)
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return truncate(str(value), limit)
+
+
+class JsonFormatter(logging.Formatter):
+    """หนึ่ง record ต่อหนึ่งบรรทัด JSON (ใช้ field severity/message ตามที่ Cloud Logging อ่าน)"""
+
+    def __init__(self, max_field_chars: int = LOG_MAX_FIELD_CHARS):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "severity": record.levelname,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "logger": record.name,
+            "message": truncate(record.getMessage(), self.max_field_chars),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = REDACTED if REDACT_KEYS.search(key) else redact(value, self.max_field_chars)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """ปล่อย record ที่ติด extra={"sample": True} ผ่านตามอัตรา rate (record อื่นผ่านทั้งหมด)"""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sample", False) and random.random() >= self.rate:
+            self.dropped += 1
+            return False
+        return True
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """เขียนลง sys.stdout ปัจจุบันเสมอ (stdout อาจถูกแทนที่หลังตั้งค่า logging เช่นตอนทดสอบ)"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # รวม args เข้ากับ message ตอนนี้ (args อาจถูกแก้ไขหลังจากนี้) แต่ให้ listener เป็นคน format JSON
+        record.msg = redact_text(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if record.exc_text:
+            record.exc_text = redact_text(record.exc_text)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # คิวเต็ม: ทิ้ง record แทนการ block thread ที่ log (เช่น agent loop)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # รอให้ listener ระบายคิวที่เต็มก่อนใส่ sentinel (put_nowait ของ stdlib จะ raise queue.Full)
+        self.queue.put(self._sentinel)
+
+
+def parse_levels(spec: str) -> dict[str, int]:
+    """แปลง "main=DEBUG,adk_runner_service=WARNING" เป็น {logger: level}"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(stream=None, level: str = LOG_LEVEL, levels: str = LOG_LEVELS,
+                  log_format: str = LOG_FORMAT, sample_rate: float = LOG_SAMPLE_RATE,
+                  queue_maxsize: int = LOG_QUEUE_MAXSIZE):
+    """ตั้งค่า root logger (เรียกซ้ำได้ จะแทนที่ handler เดิมของ setup_logging)"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream) if stream is not None else _StdoutHandler()
+    if log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    log_queue = queue.Queue(maxsize=queue_maxsize)
+    queue_handler = _queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name, component_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(component_level)
+
+    _listener = _QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stats() -> dict:
+    """ขนาดคิวของ log และจำนวน records ที่ถูกทิ้งเพราะคิวเต็ม"""
+    if _queue_handler is None:
+        return {"queued": 0, "queue_maxsize": 0, "dropped": 0}
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "queue_maxsize": _queue_handler.queue.maxsize,
+        "dropped": _queue_handler.dropped,
+    }
+
+
+def flush_logging() -> None:
+    """รอจน log ที่ค้างในคิวถูกเขียนออก (ใช้ก่อนปิดโปรเซสและในการทดสอบ)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+@atexit.register
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
@@ -1,9 +1,11 @@
 import os
+import sys
+import time
 import asyncio
 import threading
 import logging
 import yaml
-from flask import Flask, request
+from flask import Flask, Response, request, jsonify
 
 # โหลด environment variables จากไฟล์ env.yaml
 def load_env_vars():
@@ -24,6 +26,23 @@ def load_env_vars():
 # โหลด environment variables
 load_env_vars()
 
+# structured JSON logging ผ่าน queue handler (ตั้งค่าหลังโหลด env เพื่อให้ LOG_* ใน env.yaml มีผล)
+import log_config
+from log_config import setup_logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics (import หลังโหลด env เพื่อให้ PROMETHEUS_MULTIPROC_DIR ใน env.yaml มีผล)
+import metrics
+# OpenTelemetry spans ลงไฟล์ JSONL เมื่อตั้ง TRACE_EXPORT_FILE
+import tracing
+tracing.setup_tracing()
+
+# โหมดวินิจฉัย cold start ของ MCP server: python main.py --profile-startup
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    from mcp_startup_profiler import main as profile_startup
+    sys.exit(profile_startup([arg for arg in sys.argv[1:] if arg != "--profile-startup"]))
+
 # LINE Bot SDK
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3 import WebhookHandler
@@ -31,120 +50,236 @@ from linebot.v3.webhooks import (
     MessageEvent,
     TextMessageContent
 )
-from linebot.v3.messaging import (
-    Configuration,
-    ApiClient,
-    MessagingApi,
-    MessagingApiBlob,
-    ReplyMessageRequest,
-    TextMessage,
-    ShowLoadingAnimationRequest,
-)
 
 
 CHANNEL_ACCESS_TOKEN = os.environ.get("MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN", "")
 CHANNEL_SECRET = os.environ.get("MANAGER_OA_LINE_CHANNEL_SECRET","")
-
-print(f"MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN: {'SET' if CHANNEL_ACCESS_TOKEN else 'NOT SET'}")
-print(f"MANAGER_OA_LINE_CHANNEL_SECRET: {'SET' if CHANNEL_SECRET else 'NOT SET'}")
+logger.info(f"MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN is {'SET' if CHANNEL_ACCESS_TOKEN else 'NOT SET'}")  # ไม่ใช้ 'KEY: value' เพราะถูก redact
+logger.info(f"MANAGER_OA_LINE_CHANNEL_SECRET is {'SET' if CHANNEL_SECRET else 'NOT SET'}")
 
 
-configuration = Configuration(access_token=CHANNEL_ACCESS_TOKEN)
 handler = WebhookHandler(CHANNEL_SECRET)
-api_client = ApiClient(configuration)
-line_bot_api = MessagingApi(api_client)
-line_bot_blob_api = MessagingApiBlob(api_client)
-from adk_runner_service import generate_text
 
+def get_runner_service():
+    """import adk_runner_service (ADK agent, genai, MCP) เมื่อใช้งานครั้งแรก"""
+    import adk_runner_service
+    return adk_runner_service
 
-app = Flask(__name__)
 
-# ตั้งค่า logging สำหรับ Cloud Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+import concurrent.futures
+from webhook_queue import WebhookEventQueue, dispatch_event
+from reply_delivery import ReplyDelivery
+from agent_loop import get_agent_loop
+import line_api
+
+# โหมดประมวลผล webhook
+# - sync:  ส่ง events เข้า agent loop ใน request แล้วค่อยตอบ LINE (คำตอบส่งจาก agent loop ภายหลัง)
+# - queue: ใส่ events ลงคิวแล้วตอบ 200 ทันที ให้ worker pool ประมวลผลภายหลัง
+WEBHOOK_MODE = os.environ.get("WEBHOOK_MODE", "sync").lower()
+WEBHOOK_QUEUE_MAXSIZE = int(os.environ.get("WEBHOOK_QUEUE_MAXSIZE", "100"))
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "4"))
+logger.info(f"WEBHOOK_MODE: {WEBHOOK_MODE}")
+
+webhook_queue = WebhookEventQueue(
+    dispatch=lambda event, destination: dispatch_event(handler, event, destination),
+    maxsize=WEBHOOK_QUEUE_MAXSIZE,
+    workers=WEBHOOK_WORKERS,
 )
-logger = logging.getLogger(__name__)
+
+
+app = Flask(__name__)
+
+# การโหลด ADK agent ตอนเริ่มโปรเซส
+# - background: โหลดใน background thread เพื่อให้ Flask bind port ได้ทันที
+# - lazy:       โหลดเมื่อมีข้อความแรกเข้ามา
+ADK_WARM_UP = os.environ.get("ADK_WARM_UP", "background").lower()
+
+
+def warm_up():
+    """โหลด ADK agent และ LINE Messaging API client (บน agent loop) แล้ว pre-warm MCP servers"""
+    started = time.perf_counter()
+    try:
+        line_api.import_client_modules()
+        get_agent_loop().submit(line_api.get_async_line_bot_api()).result()
+        get_runner_service().warm_up()
+        logger.info(f"Warm-up completed in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.exception(f"Error during warm-up: {e}")
+
+
+if ADK_WARM_UP == "background":
+    threading.Thread(target=warm_up, name="adk-warm-up", daemon=True).start()
 
 @app.route("/", methods=["POST"])
 def webhook_listening():
     try:
         # ดึงค่า Signature จาก header
         signature = request.headers.get("X-Line-Signature", "")
-        logger.info(f"Received signature: {signature[:20]}...")
 
-        # แปลง request body เป็น text
+        # แปลง request body เป็น text (ไม่ log body เพราะมีข้อความของผู้ใช้และ reply token)
         body = request.get_data(as_text=True)
-        logger.info(f"Request body length: {len(body)}")
-        logger.info(f"Request body: {body}")
+        logger.info("Received webhook", extra={"body_length": len(body)})
 
         # ตรวจสอบและส่งให้ handler จาก LINE SDK จัดการ
-        if CHANNEL_ACCESS_TOKEN and CHANNEL_SECRET:
-            logger.info("Processing webhook with LINE SDK")
-            handler.handle(body, signature)
-            logger.info("Webhook processed successfully")
-        else:
-            logger.error("ERROR: Missing LINE credentials, cannot process webhook")
-            return "ERROR: Missing credentials", 500
+        with tracing.span("line.webhook", body_length=len(body)):
+            if CHANNEL_ACCESS_TOKEN and CHANNEL_SECRET:
+                if WEBHOOK_MODE == "queue":
+                    # ตรวจ signature แล้วใส่ events ลงคิว ตอบ LINE ทันทีโดยไม่รอ agent
+                    with metrics.observe_stage("signature_verification"):
+                        payload = handler.parser.parse(body, signature, as_payload=True)
+                    if not webhook_queue.put_events(payload.events, payload.destination):
+                        logger.error("ERROR: Webhook queue is full")
+                        return "Busy", 503
+                    logger.info(f"Queued {len(payload.events)} events (depth={webhook_queue.depth()})")
+                else:
+                    # handler ส่ง turn เข้า agent loop แล้วคืนทันที จึงวนตามลำดับใน request ได้เลย
+                    # (turns ของผู้ใช้ต่างคนรันพร้อมกันบน agent loop ของผู้ใช้คนเดียวกันตามลำดับ)
+                    logger.debug("Processing webhook with LINE SDK")
+                    with metrics.observe_stage("signature_verification"):
+                        payload = handler.parser.parse(body, signature, as_payload=True)
+                    for event in payload.events:
+                        dispatch_event(handler, event, payload.destination)
+                    logger.debug("Webhook processed successfully")
+            else:
+                logger.error("ERROR: Missing LINE credentials, cannot process webhook")
+                return "ERROR: Missing credentials", 500
 
         return "OK"
     except InvalidSignatureError as e:
         logger.error(f"Invalid signature error: {e}")
         return "Invalid signature", 400
     except Exception as e:
-        import traceback
-        logger.error(f"Unexpected error in webhook: {e}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Unexpected error in webhook: {e}")
         return f"ERROR: {str(e)}", 500
 
+
+# deliver_turn ที่ยังรันอยู่บน agent loop
+_pending_deliveries: set[concurrent.futures.Future] = set()
+_pending_deliveries_lock = threading.Lock()
+
+
+def track_delivery(future: concurrent.futures.Future, user_id: str) -> None:
+    """เก็บ deliver_turn ที่กำลังรันไว้ใน _pending_deliveries และ log error เมื่อจบ (ไม่มีใครรอผลของมัน)"""
+    with _pending_deliveries_lock:
+        _pending_deliveries.add(future)
+
+    def done(future: concurrent.futures.Future) -> None:
+        with _pending_deliveries_lock:
+            _pending_deliveries.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                f"[ERROR] Failed to deliver response to {user_id}: {future.exception()!r}", extra={"user_id": user_id}
+            )
+
+    future.add_done_callback(done)
+
+
+def wait_for_deliveries(timeout: float | None = None) -> bool:
+    """รอ deliver_turn ที่ค้างอยู่ให้เสร็จ (ใช้ตอนปิดโปรเซสและในการทดสอบ) คืน False ถ้าเกิน timeout"""
+    with _pending_deliveries_lock:
+        pending = list(_pending_deliveries)
+    _, not_done = concurrent.futures.wait(pending, timeout=timeout)
+    return not not_done
+
+
+async def deliver_turn(delivery: ReplyDelivery, future: concurrent.futures.Future, user_id: str, user_input: str):
+    """รอ agent turn บน agent loop แล้วส่งคำตอบ (reply ถ้าทันอายุของ reply token ไม่ทันส่งข้อความชั่วคราวแล้ว push)"""
+    from adk_runner_service import SYNC_GRACE_SECONDS, SYNC_TIMEOUT_SECONDS, COALESCED, wait_text
+
+    # แสดง loading animation พร้อมกับ agent turn (ไม่รอ LINE API)
+    logger.debug("Showing loading animation")
+    delivery.show_loading()
+
+    turn = asyncio.wrap_future(future)
+    if not await delivery.wait(turn, delivery.reply_time_left()):
+        # agent ยังไม่เสร็จ: ใช้ reply token ส่งข้อความชั่วคราว แล้ว push คำตอบเมื่อเสร็จ
+        await delivery.send_interim()
+        await delivery.wait(turn, SYNC_TIMEOUT_SECONDS + SYNC_GRACE_SECONDS - delivery.elapsed())
+    response = wait_text(future, user_id, timeout=0)
+    if response is COALESCED:
+        # ข้อความนี้ถูกรวมกับข้อความถัดไป คำตอบจะส่งด้วย reply token ของข้อความล่าสุด
+        logger.info(f"[COALESCED] Message merged into a later turn for {user_id}")
+        return
+
+    logger.debug("ADK response: %s", response)
+
+    # ตรวจสอบว่าคำตอบมาจาก agent จริงหรือไม่
+    if response and response.strip():
+        # ส่งคำตอบจาก agent กลับไปยังผู้ใช้ (reply หรือ push ถ้าใช้ reply token ไปแล้ว)
+        logger.debug("Sending response to user")
+        outcome = await delivery.deliver(response)
+        logger.info("[SUCCESS] Response sent (%s): %.100s", outcome, response, extra={"user_id": user_id})
+    else:
+        # ถ้า agent ไม่ตอบ ให้ log และไม่ส่งอะไรกลับ (ยกเว้นเคยส่งข้อความชั่วคราวไปแล้ว)
+        logger.warning("[NO RESPONSE] Agent did not provide valid response for: %s", user_input, extra={"user_id": user_id})
+        await delivery.deliver_failure()
+
+
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_text_message(event):
     user_id = event.source.user_id
     user_input = event.message.text
+    webhook_event_id = getattr(event, "webhook_event_id", None)
     
-    logger.info(f"=== NEW MESSAGE RECEIVED ===")
-    logger.info(f"User ID: {user_id}")
-    logger.info(f"Message: {user_input}")
-    logger.info(f"Reply Token: {event.reply_token}")
+    logger.info(
+        "New message received",
+        extra={"user_id": user_id, "webhook_event_id": webhook_event_id},
+    )
+    logger.debug("Message: %s", user_input)
     
-    try:
-        # แสดง loading animation
-        logger.info("Showing loading animation")
-        line_bot_api.show_loading_animation(
-            ShowLoadingAnimationRequest(chat_id=event.source.user_id)
-        )
-        
-        # ใช้ synchronous wrapper ที่มีอยู่แล้วใน adk_runner_service
-        logger.info("Calling ADK runner service")
-        from adk_runner_service import generate_text_sync
-        response = generate_text_sync(user_input, user_id)
-        
-        logger.info(f"ADK response: {response}")
-        
-        # ตรวจสอบว่าคำตอบมาจาก agent จริงหรือไม่
-        if response and response.strip():
-            # ส่งคำตอบจาก agent กลับไปยังผู้ใช้
-            logger.info("Sending response to user")
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text=response)])
-            )
-            logger.info(f"[SUCCESS] Response sent: {response[:100]}...")
-        else:
-            # ถ้า agent ไม่ตอบ ให้ log และไม่ส่งอะไรกลับ
-            logger.warning(f"[NO RESPONSE] Agent did not provide valid response for: {user_input}")
-        
-    except Exception as e:
-        import traceback
-        logger.error(f"Error in handle_text_message: {e}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        # ไม่ส่ง error message กลับ ให้ log error เท่านั้น
-        logger.error(f"[ERROR] Failed to process message from {user_id}: {user_input}")
+    with tracing.correlate(user_id, webhook_event_id), tracing.span("line.message", message_id=event.message.id):
+        try:
+            from adk_runner_service import submit_text
+
+            timestamp = getattr(event, "timestamp", None)
+            delivery = ReplyDelivery(user_id, event.reply_token, received_at=timestamp / 1000 if timestamp else None)
+
+            # ส่ง turn เข้า agent loop แล้วให้ agent loop รอคำตอบและส่ง LINE API calls ต่อเอง
+            # worker thread คืนทันทีโดยไม่รอ agent turn หรือ network I/O ของ LINE
+            # (ข้อความของผู้ใช้คนเดียวกันยังรันตามลำดับที่ส่งเข้า turn scheduler)
+            logger.debug("Calling ADK runner service")
+            future = submit_text(user_input, user_id)
+            track_delivery(get_agent_loop().submit(deliver_turn(delivery, future, user_id, user_input)), user_id)
+
+        except Exception as e:
+            logger.exception(f"Error in handle_text_message: {e}", extra={"user_id": user_id})
+            # ไม่ส่ง error message กลับ ให้ log error เท่านั้น
+            logger.error(f"[ERROR] Failed to process message from {user_id}: {user_input}")
 
 @app.route("/health", methods=["GET"])
 def health_check():
-    return "OK", 200
+    """status=degraded เมื่อ circuit breaker ของ LINE MCP เปิดอยู่ (ยังตอบ 200 เพราะ agent ตอบได้โดยไม่มี MCP tools)"""
+    health = {"status": "ok", "mcp_breaker": None}
+    # ไม่บังคับโหลด ADK agent เพียงเพื่อตรวจสุขภาพ
+    runner_service = sys.modules.get("adk_runner_service")
+    if runner_service is not None:
+        breaker = runner_service.mcp_breaker_stats()
+        health["mcp_breaker"] = breaker
+        if breaker is not None and breaker["state"] != "closed":
+            health["status"] = "degraded"
+    return jsonify(health)
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    """สถิติภายในโปรเซสสำหรับดูพฤติกรรมภายใต้โหลดและ sizing instance"""
+    stats = {
+        "webhook_mode": WEBHOOK_MODE,
+        "webhook_queue": webhook_queue.stats(),
+        "line_api": line_api.stats(),
+        "deliveries_in_flight": len(_pending_deliveries),
+        "logging": log_config.stats(),
+    }
+    # ไม่บังคับโหลด ADK agent เพียงเพื่อดูสถิติ
+    runner_service = sys.modules.get("adk_runner_service")
+    stats["agent_loaded"] = runner_service is not None
+    if runner_service is not None:
+        stats.update(runner_service.stats())
+    return jsonify(stats)
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus metrics (รวมทุก worker เมื่อตั้ง PROMETHEUS_MULTIPROC_DIR)"""
+    return Response(metrics.render_latest(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
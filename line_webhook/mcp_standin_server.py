@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+MCP server จำลอง (stdio) สำหรับทดสอบแทน @line/line-bot-mcp-server แบบออฟไลน์
+
+ใช้ JSON-RPC บน stdin/stdout ด้วย standard library เท่านั้น
+มี tools ชื่อและ inputSchema เดียวกับ LINE Bot MCP server (ตอบข้อมูลจำลอง ไม่เรียก LINE API)
+ปรับพฤติกรรมได้ด้วย argument:
+    --startup-delay SECONDS   หน่วงเวลาก่อนเริ่มรับ request (จำลอง Node boot ช้า)
+    --latency SECONDS         เวลาหน่วงของ tools/call แต่ละครั้ง (จำลองเวลาของ LINE API)
+    --jitter SECONDS          สุ่มหน่วงเพิ่ม 0..jitter วินาทีต่อ call
+    --failure-rate RATE       สัดส่วน (0-1) ของ tools/call ที่ตอบ isError เหมือน LINE API ตอบ error
+    --seed N                  seed ของการสุ่ม (jitter/failure) เพื่อให้ผลซ้ำได้
+
+tools/call แต่ละครั้งถูกประมวลผลใน thread ของตัวเอง call ที่หน่วงอยู่จึงไม่บล็อก call อื่น
+(เหมือน Node server ที่รอ LINE API แบบ async)
+
+รัน: python mcp_standin_server.py --startup-delay 2 --latency 0.2 --failure-rate 0.05
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+SERVER_INFO = {"name": "line-bot-mcp-standin", "version": "0.2.0"}
+DEFAULT_PROTOCOL_VERSION = "2025-06-18"
+
+_USER_ID = {
+    "type": "string",
+    "description": "The user ID to receive a message. Defaults to DESTINATION_USER_ID.",
+}
+_TEXT_MESSAGE = {
+    "type": "object",
+    "properties": {"type": {"type": "string", "const": "text", "default": "text"}, "text": {"type": "string"}},
+    "required": ["text"],
+}
+_FLEX_MESSAGE = {
+    "type": "object",
+    "properties": {
+        "type": {"type": "string", "const": "flex", "default": "flex"},
+        "altText": {"type": "string", "description": "Alternative text shown when flex message cannot be displayed."},
+        "contents": {
+            "type": "object",
+            "description": "Flex message contents (bubble or carousel).",
+            "properties": {"type": {"type": "string", "enum": ["bubble", "carousel"]}},
+            "required": ["type"],
+        },
+    },
+    "required": ["altText", "contents"],
+}
+_RICH_MENU_ID = {"type": "string", "description": "The ID of the rich menu."}
+
+# ชื่อและ schema ตาม @line/line-bot-mcp-server
+TOOLS = [
+    {
+        "name": "push_text_message",
+        "description": "Push a simple text message to a user via LINE.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"userId": _USER_ID, "message": _TEXT_MESSAGE},
+            "required": ["message"],
+        },
+    },
+    {
+        "name": "push_flex_message",
+        "description": "Push a highly customizable flex message to a user via LINE.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"userId": _USER_ID, "message": _FLEX_MESSAGE},
+            "required": ["message"],
+        },
+    },
+    {
+        "name": "broadcast_text_message",
+        "description": "Broadcast a simple text message via LINE to all users who have followed your LINE Official Account.",
+        "inputSchema": {"type": "object", "properties": {"message": _TEXT_MESSAGE}, "required": ["message"]},
+    },
+    {
+        "name": "broadcast_flex_message",
+        "description": "Broadcast a highly customizable flex message via LINE to all users who have added your LINE Official Account.",
+        "inputSchema": {"type": "object", "properties": {"message": _FLEX_MESSAGE}, "required": ["message"]},
+    },
+    {
+        "name": "get_profile",
+        "description": "Get detailed profile information of a LINE user including display name, profile picture URL, status message and language.",
+        "inputSchema": {"type": "object", "properties": {"userId": _USER_ID}},
+    },
+    {
+        "name": "get_message_quota",
+        "description": "Get the message quota and consumption of the LINE Official Account.",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "get_rich_menu_list",
+        "description": "Get the list of rich menus associated with your LINE Official Account.",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "delete_rich_menu",
+        "description": "Delete a rich menu from your LINE Official Account.",
+        "inputSchema": {"type": "object", "properties": {"richMenuId": _RICH_MENU_ID}, "required": ["richMenuId"]},
+    },
+    {
+        "name": "set_rich_menu_default",
+        "description": "Set a rich menu as the default rich menu.",
+        "inputSchema": {"type": "object", "properties": {"richMenuId": _RICH_MENU_ID}, "required": ["richMenuId"]},
+    },
+    {
+        "name": "cancel_rich_menu_default",
+        "description": "Cancel the default rich menu.",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "create_rich_menu",
+        "description": "Create a rich menu based on the given actions. Generate and upload a rich menu image and set it as the default.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "chatBarText": {"type": "string", "description": "Text displayed in the chat bar."},
+                "actions": {
+                    "type": "array",
+                    "minItems": 1,
+                    "maxItems": 6,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "type": {"type": "string", "enum": ["postback", "message", "uri", "datetimepicker"]},
+                            "label": {"type": "string"},
+                        },
+                        "required": ["type"],
+                    },
+                },
+            },
+            "required": ["chatBarText", "actions"],
+        },
+    },
+    {
+        "name": "_crash",
+        "description": "Terminate the stand-in server process (for restart tests).",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+]
+TOOL_NAMES = {tool["name"] for tool in TOOLS}
+
+
+def _sent(message: dict) -> dict:
+    return {"sentMessages": [{"id": "standin-message-id", "quoteToken": "standin-quote-token", **message}]}
+
+
+def call_tool(name: str, arguments: dict) -> dict:
+    if name == "get_message_quota":
+        payload = {"limited": 500, "totalUsage": 42}
+    elif name in ("push_text_message", "push_flex_message"):
+        payload = _sent(arguments["message"])
+    elif name in ("broadcast_text_message", "broadcast_flex_message"):
+        payload = {}
+    elif name == "get_profile":
+        payload = {
+            "userId": arguments.get("userId", "Ustandin"),
+            "displayName": "Stand-in User",
+            "pictureUrl": "https://profile.line-scdn.net/standin",
+            "statusMessage": "",
+            "language": "th",
+        }
+    elif name == "get_rich_menu_list":
+        payload = {"richmenus": [{"richMenuId": "richmenu-standin", "chatBarText": "เมนู", "selected": False}]}
+    elif name in ("delete_rich_menu", "set_rich_menu_default", "cancel_rich_menu_default"):
+        payload = {}
+    elif name == "create_rich_menu":
+        payload = {"richMenuId": "richmenu-standin", "chatBarText": arguments["chatBarText"],
+                   "actions": len(arguments["actions"])}
+    elif name == "_crash":
+        os._exit(1)
+    else:
+        return {"content": [{"type": "text", "text": f"Unknown tool: {name}"}], "isError": True}
+    return {"content": [{"type": "text", "text": json.dumps(payload, ensure_ascii=False)}], "isError": False}
+
+
+class StandinBehavior:
+    """เวลาหน่วงและอัตราความล้มเหลวของ tools/call"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> tuple[float, bool]:
+        """คืน (เวลาหน่วง, ล้มเหลวหรือไม่) ของ call หนึ่งครั้ง"""
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter) if self.jitter else self.latency
+            return delay, self._random.random() < self.failure_rate
+
+
+def handle(request: dict, behavior: StandinBehavior | None = None) -> dict | None:
+    method = request.get("method")
+    params = request.get("params") or {}
+    if "id" not in request:
+        return None  # notification เช่น notifications/initialized
+
+    if method == "initialize":
+        result = {
+            "protocolVersion": params.get("protocolVersion", DEFAULT_PROTOCOL_VERSION),
+            "capabilities": {"tools": {"listChanged": False}},
+            "serverInfo": SERVER_INFO,
+        }
+    elif method == "ping":
+        result = {}
+    elif method == "tools/list":
+        result = {"tools": TOOLS}
+    elif method == "tools/call":
+        name = params.get("name")
+        delay, failed = behavior.draw() if behavior else (0.0, False)
+        if delay:
+            time.sleep(delay)
+        if failed and name in TOOL_NAMES and name != "_crash":
+            result = {
+                "content": [{"type": "text", "text": "LINE API error (stand-in): 500 Internal Server Error"}],
+                "isError": True,
+            }
+        else:
+            try:
+                result = call_tool(name, params.get("arguments") or {})
+            except (KeyError, TypeError, AttributeError) as e:
+                # LINE MCP server ตรวจ arguments ตาม inputSchema และตอบ isError เมื่อไม่ถูกต้อง
+                result = {"content": [{"type": "text", "text": f"Invalid arguments for {name}: {e!r}"}], "isError": True}
+    else:
+        return {
+            "jsonrpc": "2.0",
+            "id": request["id"],
+            "error": {"code": -32601, "message": f"Method not found: {method}"},
+        }
+    return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+
+def serve(startup_delay: float = 0.0, behavior: StandinBehavior | None = None) -> None:
+    time.sleep(startup_delay)
+    write_lock = threading.Lock()
+
+    def respond(request: dict) -> None:
+        response = handle(request, behavior)
+        if response is not None:
+            with write_lock:
+                sys.stdout.write(json.dumps(response, ensure_ascii=False) + "\n")
+                sys.stdout.flush()
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request = json.loads(line)
+        if request.get("method") == "tools/call":
+            threading.Thread(target=respond, args=(request,), daemon=True).start()
+        else:
+            respond(request)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--startup-delay", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    serve(
+        startup_delay=args.startup_delay,
+        behavior=StandinBehavior(args.latency, args.jitter, args.failure_rate, args.seed),
+    )
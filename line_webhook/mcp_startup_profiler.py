@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Profiler เวลา cold start ของ LINE Bot MCP server
+
+แยกเวลาเป็นช่วง:
+- resolve:        หา command ที่ใช้ launch (node โดยตรง หรือ npx)
+- spawn:          สร้าง subprocess
+- npx_resolution: เวลาที่ npx ใช้ก่อนเริ่ม node ของ server (เฉพาะตอน launch ผ่าน npx)
+- node_boot:      ตั้งแต่ spawn จน Node ของ server เริ่มทำงาน
+- initialize:     ตั้งแต่ Node เริ่มทำงานจนได้ response ของ MCP initialize
+- list_tools:     เวลาของ tools/list
+
+รัน: python main.py --profile-startup [--runs 3] [--npx] [--json]
+หรือ: python mcp_startup_profiler.py --command python --args mcp_standin_server.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PROTOCOL_VERSION = "2025-06-18"
+BOOT_MARKER = "__MCP_PROFILE_NODE_BOOT__"
+PHASES = ["resolve", "spawn", "npx_resolution", "node_boot", "initialize", "list_tools", "total"]
+
+# ถูกโหลดผ่าน NODE_OPTIONS=--require ก่อน module หลัก จึงบอกเวลาที่ Node boot เสร็จได้
+PRELOAD_SCRIPT = f'process.stderr.write("{BOOT_MARKER} " + Date.now() + "\\n");\n'
+
+
+async def _read_response(stdout, request_id: int) -> dict:
+    while True:
+        line = await stdout.readline()
+        if not line:
+            raise RuntimeError("MCP server closed stdout before responding")
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # ข้ามบรรทัดที่ไม่ใช่ JSON-RPC
+        if message.get("id") == request_id:
+            if "error" in message:
+                raise RuntimeError(f"MCP error: {message['error']}")
+            return message["result"]
+
+
+async def _send(stdin, message: dict) -> None:
+    stdin.write((json.dumps(message) + "\n").encode())
+    await stdin.drain()
+
+
+async def profile_once(command: str, args: list[str], env: dict, timeout: float = 60.0) -> dict:
+    """launch MCP server หนึ่งครั้งและคืนเวลาของแต่ละช่วง (วินาที)"""
+    with tempfile.NamedTemporaryFile("w", suffix=".js", delete=False) as preload:
+        preload.write(PRELOAD_SCRIPT)
+    env = dict(env)
+    env["NODE_OPTIONS"] = f"{env.get('NODE_OPTIONS', '')} --require {preload.name}".strip()
+
+    boot_marks: list[float] = []
+
+    async def read_stderr(stderr):
+        while line := await stderr.readline():
+            text = line.decode(errors="replace").strip()
+            if text.startswith(BOOT_MARKER):
+                boot_marks.append(float(text.split()[1]) / 1000)
+
+    wall_start = time.time()
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        command, *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+    )
+    spawned = time.perf_counter() - start
+    stderr_task = asyncio.create_task(read_stderr(process.stderr))
+
+    try:
+        await _send(process.stdin, {
+            "jsonrpc": "2.0", "id": 1, "method": "initialize",
+            "params": {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "mcp-startup-profiler", "version": "1.0"},
+            },
+        })
+        await asyncio.wait_for(_read_response(process.stdout, 1), timeout)
+        initialized = time.perf_counter() - start
+        await asyncio.sleep(0)  # ให้ stderr reader อ่าน boot marker ที่ค้างอยู่
+
+        await _send(process.stdin, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        await _send(process.stdin, {"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        tools = await asyncio.wait_for(_read_response(process.stdout, 2), timeout)
+        listed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), 5)
+        except asyncio.TimeoutError:
+            process.kill()
+        stderr_task.cancel()
+        os.unlink(preload.name)
+
+    # boot marker ตัวสุดท้ายคือ node ของ server (ตัวแรกอาจเป็น npx เอง)
+    marks = [mark - wall_start for mark in boot_marks if mark - wall_start <= initialized]
+    node_booted = marks[-1] if marks else None
+    return {
+        "spawn": spawned,
+        "npx_resolution": marks[-1] - marks[0] if len(marks) > 1 else None,
+        "node_boot": node_booted - spawned if node_booted is not None else None,
+        "initialize": initialized - (node_booted if node_booted is not None else spawned),
+        "list_tools": listed - initialized,
+        "total": listed,
+        "tool_count": len(tools.get("tools", [])),
+    }
+
+
+def resolve_command(force_npx: bool = False) -> tuple[str, list[str], dict, float]:
+    """หา command แบบเดียวกับที่ agent ใช้ พร้อม env ของ LINE Bot MCP server"""
+    if force_npx:
+        os.environ["MCP_SERVER_LAUNCH"] = "npx"
+    from line_oa_campaign_manager import agent
+
+    start = time.perf_counter()
+    command, args = agent.get_mcp_server_command()
+    resolved = time.perf_counter() - start
+
+    env = dict(os.environ)
+    if agent.line_bot_mcp_server_params is not None:
+        env.update(agent.line_bot_mcp_server_params.env or {})
+    return command, args, env, resolved
+
+
+def format_report(runs: list[dict], command: str, args: list[str]) -> str:
+    lines = [f"MCP server: {command} {' '.join(args)}", f"{'phase':<16}{'median':>12}{'max':>12}"]
+    for phase in PHASES:
+        values = [run[phase] for run in runs if run.get(phase) is not None]
+        if not values:
+            lines.append(f"{phase:<16}{'-':>12}{'-':>12}")
+            continue
+        lines.append(
+            f"{phase:<16}{statistics.median(values) * 1000:>9.1f} ms{max(values) * 1000:>9.1f} ms"
+        )
+    lines.append(f"tools: {runs[-1]['tool_count']}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Profile LINE Bot MCP server cold start")
+    parser.add_argument("--runs", type=int, default=3, help="จำนวนครั้งที่ launch")
+    parser.add_argument("--npx", action="store_true", help="บังคับ launch ผ่าน npx")
+    parser.add_argument("--command", help="command ที่ต้องการ profile แทน LINE Bot MCP server")
+    parser.add_argument("--args", nargs=argparse.REMAINDER, default=[], help="arguments ของ --command")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON")
+    options = parser.parse_args(argv)
+
+    if options.command:
+        command, args, env, resolved = options.command, options.args, dict(os.environ), 0.0
+    else:
+        command, args, env, resolved = resolve_command(options.npx)
+
+    runs = []
+    for _ in range(options.runs):
+        run = asyncio.run(profile_once(command, args, env, options.timeout))
+        run["resolve"] = resolved
+        run["total"] += resolved
+        runs.append(run)
+
+    if options.json:
+        print(json.dumps({"command": [command, *args], "runs": runs}, indent=2))
+    else:
+        print(format_report(runs, command, args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+รวมข้อความที่ผู้ใช้ส่งติดๆ กันเป็น agent turn เดียว (debounce ต่อ user_id)
+
+ผู้ใช้ LINE มักพิมพ์หนึ่งความคิดเป็นหลาย bubble ถ้าข้อความถัดไปของผู้ใช้คนเดียวกัน
+เข้ามาภายใน window_seconds ข้อความทั้งหมดจะถูกรวมแล้วส่งให้ agent ครั้งเดียว
+ผู้ส่งข้อความล่าสุดเป็นคนได้รายการข้อความ (และใช้ reply token ของตัวเองตอบ)
+ส่วนข้อความก่อนหน้าได้ None กลับไป (ถูกรวมเข้ากับ turn ถัดไปแล้ว)
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Burst:
+    __slots__ = ("texts", "latest", "started_at", "flushed")
+
+    def __init__(self):
+        self.texts: list[str] = []
+        self.latest = 0
+        self.started_at = time.perf_counter()
+        self.flushed = asyncio.Event()
+
+
+class MessageCoalescer:
+    """debounce ข้อความต่อผู้ใช้บน event loop เดียว"""
+
+    def __init__(self, window_seconds: float = 0.8, max_messages: int = 10):
+        self.window_seconds = window_seconds
+        self.max_messages = max_messages
+        self._bursts: dict[str, _Burst] = {}
+
+        self.messages = 0
+        self.individual_turns = 0
+        self.coalesced_turns = 0
+        self.coalesced_messages = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    async def submit(self, user_id: str, text: str) -> list[str] | None:
+        """
+        เพิ่มข้อความเข้า burst ของผู้ใช้แล้วรอจนไม่มีข้อความใหม่ภายใน window
+
+        Returns:
+            list[str]: ข้อความทั้งหมดของ burst ถ้าข้อความนี้เป็นข้อความล่าสุด
+            None: ถ้าข้อความนี้ถูกรวมเข้ากับข้อความที่ตามมา
+        """
+        self.messages += 1
+        if not self.enabled:
+            self.individual_turns += 1
+            return [text]
+
+        burst = self._bursts.get(user_id)
+        if burst is None:
+            burst = self._bursts[user_id] = _Burst()
+        burst.texts.append(text)
+        burst.latest += 1
+        position = burst.latest
+
+        if len(burst.texts) < self.max_messages:
+            try:
+                await asyncio.wait_for(burst.flushed.wait(), timeout=self.window_seconds)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # ผู้ส่งล่าสุดถูกยกเลิก (เช่น timeout) ไม่ให้ burst ค้างอยู่
+                if burst.latest == position and self._bursts.get(user_id) is burst:
+                    del self._bursts[user_id]
+                raise
+            if burst.latest != position or self._bursts.get(user_id) is not burst:
+                return None  # มีข้อความใหม่กว่าเข้ามา ให้ตัวนั้นเป็นคนส่ง turn
+
+        del self._bursts[user_id]
+        burst.flushed.set()
+        if len(burst.texts) > 1:
+            self.coalesced_turns += 1
+            self.coalesced_messages += len(burst.texts)
+            logger.info(
+                f"[COALESCE] Merged {len(burst.texts)} messages from {user_id} "
+                f"over {time.perf_counter() - burst.started_at:.2f}s"
+            )
+        else:
+            self.individual_turns += 1
+        return burst.texts
+
+    def stats(self) -> dict:
+        turns = self.individual_turns + self.coalesced_turns
+        return {
+            "window_seconds": self.window_seconds,
+            "pending_users": len(self._bursts),
+            "messages": self.messages,
+            "turns": turns,
+            "individual_turns": self.individual_turns,
+            "coalesced_turns": self.coalesced_turns,
+            "coalesced_messages": self.coalesced_messages,
+            "turns_saved": self.messages - turns - sum(len(b.texts) for b in self._bursts.values()),
+        }
@@ -0,0 +1,150 @@
+"""
+Prometheus metrics ของ webhook และ agent turn
+
+- line_oa_stage_seconds{stage}: เวลาของแต่ละช่วงใน turn
+  (signature_verification, loading_animation, session_acquisition, agent_run, reply_message,
+   interim_reply, push_message)
+- line_oa_tool_call_seconds{tool,outcome}: เวลาของ tool call แต่ละครั้ง (MCP tools และ gemini_generate_image)
+- counters: timeouts, retries, fallbacks และ empty responses ของ generate_text
+- line_oa_reply_deliveries_total{outcome}: คำตอบที่ส่งทันด้วย reply token (on_time) หรือผ่าน push (push_fallback)
+- line_oa_mcp_breaker_state: สถานะ circuit breaker ของ LINE MCP toolset (0 = closed, 1 = half_open, 2 = open)
+
+รันหลาย workers (เช่น gunicorn) ได้: ตั้ง PROMETHEUS_MULTIPROC_DIR เป็น directory ที่ว่างและเขียนได้
+ก่อนเริ่มโปรเซส แต่ละ worker จะเขียนค่าลงไฟล์ใน directory นั้น และ /metrics รวมค่าจากทุก worker
+"""
+
+import contextlib
+import os
+import threading
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+
+# bucket ครอบคลุมตั้งแต่ signature check (ms) จนถึง agent run ที่ใช้เวลาหลายสิบวินาที
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "line_oa_stage_seconds",
+    "Latency of each stage of a LINE webhook turn",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+TOOL_CALL_SECONDS = Histogram(
+    "line_oa_tool_call_seconds",
+    "Latency of agent tool calls",
+    ["tool", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_TIMEOUTS = Counter("line_oa_agent_timeouts_total", "Agent runs that exceeded their timeout", ["scope"])
+AGENT_RETRIES = Counter("line_oa_agent_retries_total", "Retries of failed tool calls within agent turns")
+DUPLICATE_TOOL_CALLS = Counter(
+    "line_oa_duplicate_tool_calls_total", "Side-effecting tool calls answered from the turn ledger instead of re-running"
+)
+AGENT_FALLBACKS = Counter("line_oa_agent_fallbacks_total", "Turns answered with the fallback message")
+AGENT_EMPTY_RESPONSES = Counter("line_oa_agent_empty_responses_total", "Turns where generate_text returned no response")
+REPLY_DELIVERIES = Counter(
+    "line_oa_reply_deliveries_total",
+    "Agent answers sent with the reply token (on_time) or by push after an interim reply (push_fallback)",
+    ["outcome"],
+)
+MCP_BREAKER_STATE = Gauge(
+    "line_oa_mcp_breaker_state",
+    "Circuit breaker state of the LINE MCP toolset (0 closed, 1 half_open, 2 open)",
+    multiprocess_mode="max",
+)
+MCP_BREAKER_TRANSITIONS = Counter(
+    "line_oa_mcp_breaker_transitions_total", "Circuit breaker state changes of the LINE MCP toolset", ["state"]
+)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+@contextlib.contextmanager
+def observe_stage(stage: str):
+    """จับเวลาช่วงหนึ่งของ turn ลง line_oa_stage_seconds (นับแม้เกิด exception)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+# เวลาเริ่มของ tool calls ที่ยังไม่จบ: function_call_id -> perf_counter
+_tool_started: dict[str, float] = {}
+_tool_started_lock = threading.Lock()
+
+
+def _tool_call_key(tool, tool_context) -> str:
+    return getattr(tool_context, "function_call_id", None) or f"{tool.name}:{id(tool_context)}"
+
+
+def before_tool_callback(tool, args, tool_context):
+    """ADK before_tool_callback: เริ่มจับเวลา tool call (คืน None เพื่อให้ tool ทำงานตามปกติ)"""
+    with _tool_started_lock:
+        _tool_started[_tool_call_key(tool, tool_context)] = time.perf_counter()
+    return None
+
+
+def _observe_tool(tool, tool_context, outcome: str) -> None:
+    with _tool_started_lock:
+        started = _tool_started.pop(_tool_call_key(tool, tool_context), None)
+    if started is not None:
+        TOOL_CALL_SECONDS.labels(tool.name, outcome).observe(time.perf_counter() - started)
+
+
+def after_tool_callback(tool, args, tool_context, tool_response):
+    """ADK after_tool_callback: บันทึกเวลา tool call ที่สำเร็จ"""
+    is_error = isinstance(tool_response, dict) and (tool_response.get("isError") or tool_response.get("is_error"))
+    _observe_tool(tool, tool_context, "error" if is_error else "ok")
+    return None
+
+
+def on_tool_error_callback(tool, args, tool_context, error):
+    """ADK on_tool_error_callback: บันทึกเวลา tool call ที่ raise exception (ไม่จัดการ error แทน)"""
+    _observe_tool(tool, tool_context, "exception")
+    return None
+
+
+def instrument_agent(agent) -> None:
+    """ผูก tool callbacks ของ metrics เข้ากับ agent (ต่อท้าย callbacks เดิมถ้ามี)"""
+    for field, callback in (
+        ("before_tool_callback", before_tool_callback),
+        ("after_tool_callback", after_tool_callback),
+        ("on_tool_error_callback", on_tool_error_callback),
+    ):
+        existing = getattr(agent, field, None)
+        if existing is None:
+            setattr(agent, field, callback)
+        else:
+            callbacks = existing if isinstance(existing, list) else [existing]
+            if callback not in callbacks:
+                setattr(agent, field, [*callbacks, callback])
+
+
+def render_latest() -> bytes:
+    """ข้อความ exposition format ของ metrics (รวมทุก worker เมื่อเปิด multiprocess mode)"""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead(pid: int) -> None:
+    """เรียกจาก hook child_exit ของ process manager เมื่อ worker จบ (เฉพาะ multiprocess mode)"""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
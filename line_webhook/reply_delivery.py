@@ -0,0 +1,156 @@
+"""
+ส่งคำตอบของ agent ให้ทันอายุของ reply token
+
+reply token ของ LINE ใช้ได้ครั้งเดียวและหมดอายุหลังรับ webhook ไม่นาน turn ที่ช้า (สร้างรูป + MCP calls)
+จึงเสี่ยงที่คำตอบจะหายไปเงียบๆ เมื่อ reply token หมดอายุ
+
+- รอ agent ไม่เกิน REPLY_BUDGET_SECONDS นับจากเวลาของ event: เสร็จทันตอบด้วย reply token ตามปกติ (on_time)
+- ไม่ทัน: ใช้ reply token ส่ง INTERIM_REPLY_MESSAGE แล้ว push คำตอบจริงเมื่อ agent เสร็จ (push_fallback)
+- ระหว่างรอ แสดง loading animation ซ้ำก่อนตัวเดิมหมดเวลา
+- reply ที่ LINE ปฏิเสธ reply token (400 เช่น token หมดอายุเพราะรอคิวนาน) ถูกส่งซ้ำด้วย push
+
+ทุกขั้นตอนรันบน agent loop และส่งผ่าน AsyncMessagingApi ของ line_api (worker thread ไม่ทำ network I/O ของ LINE)
+push message นับรวมในโควต้าข้อความรายเดือนของ LINE OA ต่างจาก reply
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Callable
+
+import line_api
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# เวลาสูงสุดที่รอ agent ก่อนใช้ reply token ส่งข้อความชั่วคราว (วินาที นับจากเวลาของ event)
+REPLY_BUDGET_SECONDS = float(os.getenv("REPLY_BUDGET_SECONDS", "25"))
+INTERIM_REPLY_MESSAGE = os.getenv(
+    "INTERIM_REPLY_MESSAGE", "กำลังดำเนินการให้อยู่ครับ อาจใช้เวลาสักครู่ เสร็จแล้วจะส่งผลให้ทันทีครับ"
+)
+# ข้อความที่ push เมื่อส่งข้อความชั่วคราวไปแล้วแต่ agent ไม่ได้คำตอบ (ผู้ใช้ไม่ควรรอเงียบๆ)
+FAILED_PUSH_MESSAGE = "ขออภัยครับ ไม่สามารถดำเนินการให้เสร็จได้ในขณะนี้ กรุณาลองใหม่อีกครั้งครับ"
+# ระยะเวลาของ loading animation แต่ละครั้ง (LINE รับ 5-60 วินาที เป็นขั้นละ 5)
+LOADING_ANIMATION_SECONDS = int(os.getenv("LOADING_ANIMATION_SECONDS", "20"))
+# แสดง loading animation ซ้ำก่อนตัวเดิมหมดเวลาเท่านี้ (วินาที)
+LOADING_REFRESH_MARGIN_SECONDS = 2.0
+# ก่อนส่งข้อความ รอ loading animation ที่ยังค้างอยู่ไม่เกินเท่านี้ (วินาที)
+# ไม่ให้ animation เริ่มหลังคำตอบ (LINE ซ่อน animation เมื่อ bot ส่งข้อความ แต่ไม่ซ่อนตัวที่เริ่มทีหลัง)
+LOADING_SETTLE_SECONDS = 1.0
+
+
+class ReplyDelivery:
+    """ส่งคำตอบของข้อความหนึ่งข้อความ: reply ถ้าทัน ไม่ทันส่งข้อความชั่วคราวแล้ว push คำตอบ (ใช้บน agent loop)"""
+
+    def __init__(
+        self,
+        user_id: str,
+        reply_token: str,
+        received_at: float | None = None,
+        reply_budget: float | None = None,
+        loading_seconds: int | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.user_id = user_id
+        self.reply_token = reply_token
+        self.reply_budget = REPLY_BUDGET_SECONDS if reply_budget is None else reply_budget
+        self.loading_seconds = LOADING_ANIMATION_SECONDS if loading_seconds is None else loading_seconds
+        self.clock = clock
+        now = clock()
+        # เวลาของ event จาก LINE (timestamp) รวมเวลารอคิวด้วย ไม่ใช้ค่าที่อยู่ในอนาคต (นาฬิกาคลาดเคลื่อน)
+        self.received_at = min(received_at, now) if received_at else now
+        self.loading_until = 0.0
+        self.loading_future: asyncio.Future | None = None
+        self.interim_sent = False
+
+    def elapsed(self) -> float:
+        return self.clock() - self.received_at
+
+    def reply_time_left(self) -> float:
+        return max(0.0, self.reply_budget - self.elapsed())
+
+    def show_loading(self) -> None:
+        """แสดง loading animation แบบ fire-and-forget (ไม่รอ LINE API และล้มเหลวได้โดยไม่กระทบการตอบ)"""
+        from linebot.v3.messaging import ShowLoadingAnimationRequest
+
+        # ตั้งเวลาแสดงซ้ำรอบถัดไปแม้เรียกไม่สำเร็จ (ไม่เรียกซ้ำถี่ๆ เมื่อ LINE API มีปัญหา)
+        self.loading_until = self.clock() + self.loading_seconds
+        try:
+            self.loading_future = line_api.fire_and_forget(
+                "show_loading_animation",
+                ShowLoadingAnimationRequest(chat_id=self.user_id, loading_seconds=self.loading_seconds),
+                stage="loading_animation",
+            )
+        except Exception as e:
+            logger.warning(f"[DELIVERY] Failed to show loading animation for {self.user_id}: {e}")
+
+    async def wait(self, future: asyncio.Future, timeout: float) -> bool:
+        """รอ future ไม่เกิน timeout วินาที พร้อมแสดง loading animation ซ้ำก่อนหมดเวลา คืน True ถ้าเสร็จ"""
+        until = self.clock() + timeout
+        while not future.done():
+            now = self.clock()
+            if now >= until:
+                return False
+            refresh_at = self.loading_until - LOADING_REFRESH_MARGIN_SECONDS
+            if now >= refresh_at:
+                self.show_loading()
+                refresh_at = self.loading_until - LOADING_REFRESH_MARGIN_SECONDS
+            await asyncio.wait([future], timeout=max(0.0, min(until, refresh_at) - self.clock()))
+        return True
+
+    async def _settle_loading(self) -> None:
+        if self.loading_future is not None and not self.loading_future.done():
+            await asyncio.wait([asyncio.wrap_future(self.loading_future)], timeout=LOADING_SETTLE_SECONDS)
+
+    async def _reply(self, text: str, stage: str) -> None:
+        from linebot.v3.messaging import ReplyMessageRequest, TextMessage
+
+        await self._settle_loading()
+        await line_api.call(
+            "reply_message_with_http_info",
+            ReplyMessageRequest(reply_token=self.reply_token, messages=[TextMessage(text=text)]),
+            stage=stage,
+        )
+
+    async def _push(self, text: str) -> None:
+        from linebot.v3.messaging import PushMessageRequest, TextMessage
+
+        await self._settle_loading()
+        await line_api.call(
+            "push_message_with_http_info",
+            PushMessageRequest(to=self.user_id, messages=[TextMessage(text=text)]),
+            stage="push_message",
+        )
+
+    async def send_interim(self) -> None:
+        """ใช้ reply token ส่งข้อความชั่วคราว (คำตอบจริงจะถูก push ภายหลัง)"""
+        self.interim_sent = True
+        try:
+            await self._reply(INTERIM_REPLY_MESSAGE, stage="interim_reply")
+            logger.info(f"[DELIVERY] Sent interim reply after {self.elapsed():.1f}s", extra={"user_id": self.user_id})
+        except Exception as e:
+            logger.warning(f"[DELIVERY] Failed to send interim reply: {e}", extra={"user_id": self.user_id})
+        self.show_loading()  # loading animation หายไปเมื่อ bot ส่งข้อความ
+
+    async def deliver(self, text: str) -> str:
+        """ส่งคำตอบด้วย reply token ถ้ายังไม่ได้ใช้ ไม่เช่นนั้น push คืน outcome (on_time หรือ push_fallback)"""
+        outcome = "push_fallback"
+        if not self.interim_sent:
+            try:
+                await self._reply(text, stage="reply_message")
+                outcome = "on_time"
+            except Exception as e:
+                # error อื่น (เช่น network timeout) ข้อความอาจถึงผู้ใช้แล้ว ไม่ push ซ้ำ
+                if getattr(e, "status", None) != 400:
+                    raise
+                logger.warning(f"[DELIVERY] Reply rejected, falling back to push: {e}", extra={"user_id": self.user_id})
+        if outcome == "push_fallback":
+            await self._push(text)
+        metrics.REPLY_DELIVERIES.labels(outcome).inc()
+        return outcome
+
+    async def deliver_failure(self) -> None:
+        """agent ไม่ได้คำตอบ: แจ้งผู้ใช้เฉพาะเมื่อส่งข้อความชั่วคราวไปแล้ว (เดิมไม่ตอบอะไรกลับ)"""
+        if self.interim_sent:
+            await self._push(FAILED_PUSH_MESSAGE)
@@ -0,0 +1,137 @@
+"""
+Cache คำตอบของ agent สำหรับคำถามซ้ำๆ แบบ FAQ (เช่น "เหลือข้อความเท่าไหร่", "ทำอะไรได้บ้าง")
+
+- key คือ scope (เช่น user_id) + ข้อความที่ normalize แล้ว (รองรับภาษาไทย: ตัดช่องว่าง, เครื่องหมายวรรคตอน,
+  คำลงท้ายสุภาพ) คำตอบที่มาจาก read-only tools (เช่น get_profile) จึงไม่ข้ามไปยังผู้ใช้คนอื่น
+- หมดอายุตาม TTL และจำกัดจำนวนแบบ LRU
+- ไม่ cache ข้อความที่ตรงกับ deny patterns (คำสั่งส่ง/บรอดแคสต์ข้อความ ฯลฯ)
+  และถ้ามี allow patterns จะ cache เฉพาะข้อความที่ตรงกับ allow patterns
+- ไม่ cache turn ที่ agent เรียก tool ที่ไม่อยู่ใน read-only tools (เช่น push/broadcast, สร้างรูป)
+"""
+
+import collections
+import logging
+import re
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# คำลงท้ายที่ไม่เปลี่ยนความหมายของคำถาม (ตัดออกจากท้ายข้อความซ้ำได้หลายคำ)
+THAI_POLITE_PARTICLES = ("ครับผม", "ครับ", "คับ", "ค่ะ", "คะ", "ค่า", "จ้า", "จ้ะ", "ฮะ", "นะ", "หน่อย")
+
+# คำสั่งที่มีผลข้างเคียง ห้าม cache เสมอ
+DEFAULT_DENY_PATTERNS = (
+    r"ส่ง", r"บรอดแคสต์", r"broadcast", r"push", r"แจ้งเตือน", r"ประกาศ",
+    r"สร้าง", r"ลบ", r"ตั้งค่า", r"เปลี่ยน", r"ยกเลิก", r"send", r"create", r"delete",
+)
+
+# tools ที่อ่านข้อมูลอย่างเดียว turn ที่เรียกเฉพาะ tools เหล่านี้ cache ได้
+DEFAULT_READ_ONLY_TOOLS = ("get_message_quota", "get_profile", "get_rich_menu_list")
+
+
+def normalize_question(text: str) -> str:
+    """normalize ข้อความให้คำถามเดียวกันที่พิมพ์ต่างกันเล็กน้อยได้ key เดียวกัน"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    # ภาษาไทยไม่เว้นวรรคระหว่างคำ ช่องว่างจึงไม่มีความหมาย; ตัดเครื่องหมายวรรคตอน/สัญลักษณ์ด้วย
+    # (ยกเว้น "ๆ" ที่เป็นไม้ยมก)
+    text = "".join(
+        ch for ch in text
+        if ch == "ๆ" or not (ch.isspace() or unicodedata.category(ch)[0] in "PSC")
+    )
+    stripped = True
+    while stripped:
+        stripped = False
+        for particle in THAI_POLITE_PARTICLES:
+            if text.endswith(particle) and len(text) > len(particle):
+                text = text[: -len(particle)]
+                stripped = True
+    return text
+
+
+class ResponseCache:
+    """TTL + LRU cache ของ (scope, normalized question) -> คำตอบของ agent"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 300.0,
+        max_entries: int = 512,
+        allow_patterns=(),
+        deny_patterns=DEFAULT_DENY_PATTERNS,
+        read_only_tools=DEFAULT_READ_ONLY_TOOLS,
+        clock=time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._allow = [re.compile(p, re.IGNORECASE) for p in allow_patterns if p]
+        self._deny = [re.compile(p, re.IGNORECASE) for p in deny_patterns if p]
+        self.read_only_tools = frozenset(read_only_tools)
+        self._clock = clock
+
+        # (scope, normalized question) -> (response, stored_at)
+        self._entries: collections.OrderedDict[tuple[str, str], tuple[str, float]] = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.uncacheable = 0
+        self.stores = 0
+
+    def is_cacheable_question(self, text: str) -> bool:
+        """ตรวจ allowlist/denylist จากข้อความต้นฉบับ"""
+        if any(p.search(text) for p in self._deny):
+            return False
+        if self._allow and not any(p.search(text) for p in self._allow):
+            return False
+        return True
+
+    def get(self, text: str, scope: str = "") -> str | None:
+        if not self.is_cacheable_question(text):
+            self.bypassed += 1
+            return None
+        key = (scope, normalize_question(text))
+        entry = self._entries.get(key)
+        if entry is not None and self._clock() - entry[1] < self.ttl_seconds:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, text: str, response: str, tool_names=(), scope: str = "") -> bool:
+        """
+        เก็บคำตอบถ้าคำถามและ tools ที่ agent เรียกใน turn นี้ cache ได้
+
+        Returns:
+            bool: True ถ้าเก็บลง cache
+        """
+        if not self.is_cacheable_question(text):
+            return False
+        side_effects = set(tool_names) - self.read_only_tools
+        if side_effects:
+            self.uncacheable += 1
+            logger.info(f"[RESPONSE-CACHE] Not caching turn with tools {sorted(side_effects)}")
+            return False
+        key = (scope, normalize_question(text))
+        self._entries[key] = (response, self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.stores += 1
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bypassed": self.bypassed,
+            "uncacheable": self.uncacheable,
+            "stores": self.stores,
+        }
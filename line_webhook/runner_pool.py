@@ -0,0 +1,71 @@
+"""
+Runner pool ขนาดจำกัดสำหรับ ADK Agent
+
+Runner ไม่มี state ของผู้ใช้ (state อยู่ใน session service) จึงใช้ร่วมกันได้ทุกผู้ใช้
+pool นี้เก็บ Runner หนึ่งตัวต่อ event loop (ปกติมีแค่ agent loop ของโปรเซส)
+และจำกัดจำนวนสูงสุด เพื่อไม่ให้หน่วยความจำโตตามจำนวนผู้ใช้
+"""
+
+import asyncio
+import collections
+import logging
+
+from google.adk.runners import Runner
+
+logger = logging.getLogger(__name__)
+
+
+class RunnerPool:
+    """เก็บ Runner ที่ใช้ร่วมกัน แยกตาม event loop พร้อม LRU eviction"""
+
+    def __init__(self, agent, app_name: str, session_service, max_runners: int = 4):
+        self.agent = agent
+        self.app_name = app_name
+        self.session_service = session_service
+        self.max_runners = max_runners
+
+        self._runners: collections.OrderedDict[asyncio.AbstractEventLoop, Runner] = (
+            collections.OrderedDict()
+        )
+        self.created = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._runners)
+
+    def get_runner(self) -> Runner:
+        """คืน Runner สำหรับ event loop ที่กำลังรันอยู่ (ต้องเรียกภายใน coroutine)"""
+        loop = asyncio.get_running_loop()
+        runner = self._runners.get(loop)
+        if runner is not None:
+            self._runners.move_to_end(loop)
+            return runner
+
+        # ลบ runner ของ loop ที่ปิดไปแล้ว
+        for old_loop in [l for l in self._runners if l.is_closed()]:
+            del self._runners[old_loop]
+            self.evictions += 1
+
+        runner = Runner(
+            agent=self.agent,
+            app_name=self.app_name,
+            session_service=self.session_service,
+        )
+        self._runners[loop] = runner
+        self.created += 1
+        logger.info(f"[RUNNER] Created shared runner for loop {id(loop):#x}")
+
+        # ไม่เรียก runner.close() ตอน evict เพราะ toolsets (เช่น MCP) ใช้ร่วมกันระหว่าง runners
+        while len(self._runners) > self.max_runners:
+            self._runners.popitem(last=False)
+            self.evictions += 1
+
+        return runner
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._runners),
+            "max_runners": self.max_runners,
+            "created": self.created,
+            "evictions": self.evictions,
+        }
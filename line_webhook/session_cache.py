@@ -0,0 +1,189 @@
+"""
+Session cache สำหรับ ADK sessions แยกตาม LINE user_id
+
+- ใช้ session เดิมของผู้ใช้ซ้ำข้ามข้อความ (agent จำบทสนทนาได้)
+- หมดอายุเมื่อผู้ใช้ไม่มีการใช้งานเกิน TTL
+- จำกัดจำนวน session สูงสุดแบบ LRU
+- ตอน evict จะลบ session ออกจาก session service ด้วย เพื่อไม่ให้หน่วยความจำโตขึ้นเรื่อยๆ
+- session ของผู้ใช้ที่มี turn กำลังรันอยู่ (ดู turn) ไม่ถูก evict หรือหมดอายุ
+- ล็อกแยกต่อผู้ใช้ตอนสร้าง session ส่วนการเรียก session service ไม่ถือล็อกร่วมของทุกผู้ใช้
+"""
+
+import asyncio
+import collections
+import contextlib
+import logging
+import time
+
+from google.adk.sessions import InMemorySessionService
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCache:
+    """LRU + idle TTL cache ของ mapping user_id -> session_id"""
+
+    def __init__(
+        self,
+        session_service,
+        app_name: str,
+        ttl_seconds: float = 1800.0,
+        max_entries: int = 1000,
+        clock=time.monotonic,
+    ):
+        self.session_service = session_service
+        self.app_name = app_name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+
+        # user_id -> (session_id, last_used) เรียงจากใช้ล่าสุดน้อยที่สุดไปมากที่สุด
+        # แก้ไขโดยไม่มี await คั่นกลาง (ทุก call รันบน event loop เดียว) จึงไม่ต้องมีล็อกร่วม
+        self._entries: collections.OrderedDict[str, tuple[str, float]] = collections.OrderedDict()
+        # user_id -> (ล็อกตอนสร้าง session, จำนวน coroutines ที่ใช้ล็อกอยู่)
+        self._user_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+        # user_id -> จำนวน turns ที่กำลังรัน
+        self._in_flight: collections.Counter[str] = collections.Counter()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    @contextlib.asynccontextmanager
+    async def _user_lock(self, user_id: str):
+        lock, users = self._user_locks.get(user_id, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._user_locks[user_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._user_locks[user_id]
+            if users == 1:
+                del self._user_locks[user_id]
+            else:
+                self._user_locks[user_id] = (lock, users - 1)
+
+    @contextlib.contextmanager
+    def turn(self, user_id: str):
+        """ครอบ turn ของผู้ใช้: ระหว่างนี้ session ของผู้ใช้ไม่ถูก evict/หมดอายุ และนับ idle TTL ใหม่เมื่อจบ turn"""
+        self._in_flight[user_id] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[user_id] -= 1
+            if not self._in_flight[user_id]:
+                del self._in_flight[user_id]
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = (entry[0], self._clock())
+                self._entries.move_to_end(user_id)
+
+    async def get_or_create(self, user_id: str, state: dict | None = None) -> str:
+        """คืน session_id ของผู้ใช้ ถ้าไม่มีหรือหมดอายุแล้วจะสร้างใหม่"""
+        async with self._user_lock(user_id):
+            now = self._clock()
+            # ตัดออกจาก cache ตอนนี้ แต่ลบจาก session service หลังปล่อยล็อก
+            victims = self._pop_expired(now)
+
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                session_id, _ = entry
+                self._entries[user_id] = (session_id, now)
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+                session = await self.session_service.create_session(
+                    app_name=self.app_name,
+                    user_id=user_id,
+                    state=state or {},
+                )
+                session_id = session.id
+                self._entries[user_id] = (session_id, self._clock())
+                victims += self._pop_over_capacity()
+
+        await self._delete_sessions(victims)
+        return session_id
+
+    async def evict(self, user_id: str) -> bool:
+        """ลบ session ของผู้ใช้ออกจาก cache และ session service (ไม่ลบถ้าผู้ใช้มี turn กำลังรัน)"""
+        if self._in_flight[user_id] or user_id not in self._entries:
+            return False
+        session_id, _ = self._entries.pop(user_id)
+        self.evictions += 1
+        await self._delete_sessions([(user_id, session_id)])
+        return True
+
+    async def expire_idle(self) -> int:
+        """ลบ session ที่ไม่ได้ใช้งานเกิน TTL และคืนจำนวนที่ลบ"""
+        victims = self._pop_expired(self._clock())
+        await self._delete_sessions(victims)
+        return len(victims)
+
+    def _pop_expired(self, now: float) -> list[tuple[str, str]]:
+        # entries เรียงตามเวลาใช้งานล่าสุด จึงหยุดได้ทันทีเมื่อเจอตัวที่ยังไม่หมดอายุ
+        expired = []
+        for user_id, (session_id, last_used) in list(self._entries.items()):
+            if now - last_used < self.ttl_seconds:
+                break
+            if self._in_flight[user_id]:
+                continue
+            del self._entries[user_id]
+            self.expirations += 1
+            expired.append((user_id, session_id))
+        return expired
+
+    def _pop_over_capacity(self) -> list[tuple[str, str]]:
+        # ข้ามผู้ใช้ที่มี turn กำลังรัน (ถ้าทุกตัวกำลังรัน cache เกิน max_entries ได้ชั่วคราว)
+        evicted = []
+        for user_id, (session_id, _) in list(self._entries.items()):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._in_flight[user_id]:
+                continue
+            del self._entries[user_id]
+            self.evictions += 1
+            evicted.append((user_id, session_id))
+        return evicted
+
+    async def _delete_sessions(self, sessions: list[tuple[str, str]]) -> None:
+        for user_id, session_id in sessions:
+            await self._delete_session(user_id, session_id)
+
+    async def _delete_session(self, user_id: str, session_id: str) -> None:
+        try:
+            await self.session_service.delete_session(
+                app_name=self.app_name,
+                user_id=user_id,
+                session_id=session_id,
+            )
+        except Exception as e:
+            logger.warning(f"[SESSION] Error deleting session {session_id} of {user_id}: {e}")
+            return
+
+        # InMemorySessionService เก็บ dict ว่างของ user ไว้หลังลบ session จึงต้องลบทิ้งเอง
+        if isinstance(self.session_service, InMemorySessionService):
+            user_buckets = self.session_service.sessions.get(self.app_name, {})
+            if not user_buckets.get(user_id):
+                user_buckets.pop(user_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ load test แบบ end-to-end ขนาดเล็ก: main.py รันเป็น server จริง ตรวจลายเซ็น
+เรียก Gemini stand-in และส่ง reply ไปยัง LINE API stand-in ครบทุก request
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_e2e import percentile, run_benchmark
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50.0, 95.0, 99.0)
+    assert percentile([0.2], 99) == 0.2
+
+
+def test_e2e_webhook_replies_through_standins():
+    results = run_benchmark(
+        concurrency_levels=(1, 3), requests_per_level=6, gemini_latency=0.0, line_latency=0.0, warm_up_requests=1
+    )
+    for level in results["levels"]:
+        assert level["ok"] == level["requests"] == 6, level
+        assert level["replies_delivered"] == level["model_calls"] == 6, level
+        assert 0 < level["latency_ms"]["p50"] <= level["latency_ms"]["p99"]
+
+
+if __name__ == "__main__":
+    test_percentile_nearest_rank()
+    test_e2e_webhook_replies_through_standins()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ circuit breaker ของ LINE MCP toolset: การเปลี่ยนสถานะ, การรัน agent โดยไม่มี MCP tools เมื่อ circuit เปิด
+และสถานะบน /health
+"""
+
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.agents import Agent
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+from mcp import StdioServerParameters
+
+from line_oa_campaign_manager.circuit_breaker import (
+    CLOSED,
+    DEGRADED_INSTRUCTION,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerToolset,
+)
+from fake_clock import FakeClock
+from line_oa_campaign_manager.deadline import DeadlineExceeded
+from line_oa_campaign_manager.mcp_pool import McpPoolExhausted, McpServerPool, PooledMcpToolset
+from line_oa_campaign_manager.scripted_llm import ScriptedLlm
+
+STANDIN_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_standin_server.py")
+
+
+def test_breaker_opens_on_failures_and_slow_calls_then_probes():
+    clock = FakeClock(1000.0)
+    transitions = []
+    breaker = CircuitBreaker(
+        failure_rate_threshold=0.5, slow_call_seconds=1.0, window_size=4, minimum_calls=4, open_seconds=30, clock=clock
+    )
+    breaker.on_state_change = lambda old, new: transitions.append((old, new))
+
+    breaker.record(False, 0.1)
+    breaker.record(True)
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED  # ยังไม่ครบ minimum_calls
+    breaker.record(False, 2.5)  # ช้ากว่า slow_call_seconds นับเป็นล้มเหลว
+    assert breaker.state == OPEN and breaker.stats()["retry_in_seconds"] == 30
+
+    assert not breaker.allow_request()
+    clock.now += 30
+    # หลัง open_seconds ให้ probe ได้ครั้งเดียว ระหว่าง probe turn อื่นยังถูกปฏิเสธ
+    assert breaker.allow_request() and breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record(True)
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED and breaker.allow_request()
+    assert transitions == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+    assert breaker.stats()["opened"] == 2 and breaker.stats()["rejected"] == 2
+
+
+def test_agent_runs_without_mcp_tools_while_circuit_is_open():
+    clock = FakeClock(1000.0)
+    # stand-in ตอบช้ากว่า slow_call_seconds ทุกครั้ง จึงเปิด circuit หลัง 2 calls
+    params = StdioServerParameters(command=sys.executable, args=[STANDIN_SERVER, "--latency", "0.1"])
+    breaker = CircuitBreaker(slow_call_seconds=0.04, minimum_calls=2, open_seconds=30, clock=clock)
+    script = {"turns": [
+        {"match": "โควต้า", "steps": [
+            {"function_call": {"name": "get_message_quota", "args": {}}},
+            {"text": "เช็คโควต้าแล้วครับ"},
+        ]},
+        {"steps": [{"text": "ระบบ LINE OA ขัดข้องชั่วคราวครับ"}]},
+    ]}
+    seen = []
+
+    async def scenario():
+        pool = McpServerPool(params, size=1, health_check_interval=0)
+        toolset = CircuitBreakerToolset(PooledMcpToolset(pool), breaker, probe=pool.ping)
+        agent = Agent(
+            name="breaker",
+            model=ScriptedLlm(script=script),
+            tools=[toolset],
+            before_model_callback=lambda callback_context, llm_request: seen.append(
+                (set(llm_request.tools_dict), DEGRADED_INSTRUCTION in str(llm_request.config.system_instruction))
+            ),
+            before_tool_callback=toolset.before_tool_callback,
+            after_tool_callback=toolset.after_tool_callback,
+            on_tool_error_callback=toolset.on_tool_error_callback,
+        )
+        runner = InMemoryRunner(agent=agent, app_name="breaker")
+
+        async def turn(text):
+            seen.clear()
+            session = await runner.session_service.create_session(app_name="breaker", user_id="U1")
+            message = types.Content(role="user", parts=[types.Part(text=text)])
+            events = [e async for e in runner.run_async(user_id="U1", session_id=session.id, new_message=message)]
+            return [p.text for e in events if e.content for p in e.content.parts or [] if p.text]
+
+        try:
+            await turn("โควต้าเหลือเท่าไหร่")
+            assert breaker.state == CLOSED and "get_message_quota" in seen[0][0]
+            await turn("โควต้าเหลือเท่าไหร่")
+            assert breaker.state == OPEN
+
+            # circuit เปิด: model ไม่เห็น MCP tools และได้คำสั่งให้แจ้งว่าระบบขัดข้อง
+            checkouts = pool.checkouts
+            texts = await turn("สวัสดี")
+            assert texts == ["ระบบ LINE OA ขัดข้องชั่วคราวครับ"]
+            assert seen and all(not tools and degraded for tools, degraded in seen)
+            assert pool.checkouts == checkouts
+
+            # ครบ open_seconds: turn ถัดไป ping server (half-open) แล้วปิด circuit
+            clock.now += 30
+            await turn("สวัสดี")
+            assert breaker.state == CLOSED
+            assert "get_message_quota" in seen[0][0] and not seen[0][1]
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_or_stale_probe_releases_half_open_slot():
+    clock = FakeClock(1000.0)
+    breaker = CircuitBreaker(minimum_calls=1, open_seconds=30, probe_timeout=20, clock=clock)
+    probe_started = asyncio.Event()
+
+    async def hanging_probe():
+        probe_started.set()
+        await asyncio.sleep(3600)
+
+    toolset = CircuitBreakerToolset(PooledMcpToolset(McpServerPool(None, size=1)), breaker, probe=hanging_probe)
+    breaker.record(True)
+    clock.now += 30
+
+    async def scenario():
+        # turn ที่กำลัง probe ถูกยกเลิก (เช่น wait_text หมดเวลา): turn ถัดไป probe ใหม่ได้
+        task = asyncio.ensure_future(toolset.get_tools())
+        await probe_started.wait()
+        assert breaker.state == HALF_OPEN and not breaker.allow_request()
+        task.cancel()
+        try:
+            await task
+            assert False, "expected CancelledError"
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+    # probe ที่ไม่เคยบันทึกผลหมดอายุหลัง probe_timeout
+    assert not breaker.allow_request()
+    clock.now += 20
+    assert breaker.allow_request()
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_open_circuit_answers_pending_tool_calls_immediately():
+    breaker = CircuitBreaker(minimum_calls=1)
+    toolset = CircuitBreakerToolset(PooledMcpToolset(McpServerPool(None, size=1)), breaker)
+    toolset.tool_names.add("push_text_message")
+    tool = type("Tool", (), {"name": "push_text_message"})()
+    context = type("Context", (), {"function_call_id": "call-1"})()
+
+    assert toolset.before_tool_callback(tool, {}, context) is None
+    toolset.on_tool_error_callback(tool, {}, context, ConnectionError("down"))
+    assert breaker.state == OPEN
+    response = toolset.before_tool_callback(tool, {}, context)
+    assert breaker.stats()["rejected"] == 1
+    assert response["isError"] and "temporarily unavailable" in response["content"][0]["text"]
+    # tools อื่นของ agent (เช่น gemini_generate_image_async) ไม่ถูกกระทบ
+    other = type("Tool", (), {"name": "gemini_generate_image_async"})()
+    assert toolset.before_tool_callback(other, {}, context) is None
+
+
+def test_pool_exhaustion_and_local_timeouts_do_not_open_circuit():
+    breaker = CircuitBreaker(minimum_calls=1, slow_call_seconds=5)
+    toolset = CircuitBreakerToolset(PooledMcpToolset(McpServerPool(None, size=1)), breaker)
+    toolset.tool_names.add("get_message_quota")
+    tool = type("Tool", (), {"name": "get_message_quota"})()
+    context = type("Context", (), {"function_call_id": "call-1"})()
+
+    for error in (McpPoolExhausted("pool full"), DeadlineExceeded("turn deadline"), asyncio.TimeoutError()):
+        assert toolset.before_tool_callback(tool, {}, context) is None
+        toolset.on_tool_error_callback(tool, {}, context, error)
+    assert breaker.state == CLOSED and breaker.stats()["window_calls"] == 0
+
+    # timeout ที่ช้าถึง slow_call_seconds ยังนับเป็น call ที่ช้า
+    assert breaker.record_error(asyncio.TimeoutError(), duration=5)
+    assert breaker.state == OPEN
+
+
+def test_degraded_flag_is_dropped_when_the_run_ends():
+    breaker = CircuitBreaker(minimum_calls=1)
+    toolset = CircuitBreakerToolset(PooledMcpToolset(McpServerPool(None, size=1)), breaker)
+    breaker.record(True)
+
+    class InvocationContext:
+        invocation_id = "e-1"
+
+    class ReadonlyContext:
+        def __init__(self, invocation_context):
+            self._invocation_context = invocation_context
+
+    invocation_context = InvocationContext()
+    readonly_context = ReadonlyContext(invocation_context)
+    assert asyncio.run(toolset.get_tools(readonly_context)) == []
+    assert "e-1" in toolset._degraded_invocations
+
+    # run ถูกยกเลิกก่อนถึง process_llm_request: flag หายไปพร้อม invocation context
+    del readonly_context, invocation_context
+    assert "e-1" not in toolset._degraded_invocations
+
+
+def test_health_reports_breaker_state():
+    import adk_runner_service
+    import main
+
+    breaker = CircuitBreaker(minimum_calls=1)
+    toolset = CircuitBreakerToolset(PooledMcpToolset(McpServerPool(None, size=1)), breaker)
+    client = main.app.test_client()
+    with patch.object(adk_runner_service, "line_bot_mcp_breaker_toolset", toolset):
+        health = client.get("/health")
+        assert health.status_code == 200
+        assert health.get_json()["status"] == "ok" and health.get_json()["mcp_breaker"]["state"] == CLOSED
+
+        breaker.record(True)
+        health = client.get("/health")
+        assert health.status_code == 200
+        assert health.get_json()["status"] == "degraded" and health.get_json()["mcp_breaker"]["state"] == OPEN
+        assert client.get("/stats").get_json()["mcp_breaker"]["state"] == OPEN
+
+
+if __name__ == "__main__":
+    test_breaker_opens_on_failures_and_slow_calls_then_probes()
+    test_agent_runs_without_mcp_tools_while_circuit_is_open()
+    test_cancelled_or_stale_probe_releases_half_open_slot()
+    test_open_circuit_answers_pending_tool_calls_immediately()
+    test_pool_exhaustion_and_local_timeouts_do_not_open_circuit()
+    test_degraded_flag_is_dropped_when_the_run_ends()
+    test_health_reports_breaker_state()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ deadline budget ต่อ turn, retry ระดับ call แบบ backoff และการกัน side-effecting tools ทำงานซ้ำ
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.agents import Agent
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+from mcp import StdioServerParameters
+
+from line_oa_campaign_manager import deadline, idempotency
+from line_oa_campaign_manager.mcp_pool import McpServerPool, PooledMcpToolset
+from line_oa_campaign_manager.scripted_llm import ScriptedLlm
+
+STANDIN_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_standin_server.py")
+
+
+def is_error(response: dict) -> bool:
+    return bool(response.get("isError") or response.get("is_error"))  # ชื่อ field ต่างกันตามเวอร์ชันของ mcp
+
+
+def test_budget_nests_and_bounds_call_timeouts():
+    assert deadline.remaining() is None
+    assert deadline.call_timeout(5) == 5
+    with deadline.budget(10):
+        with deadline.budget(60) as inner:
+            # scope ชั้นในไม่ขยาย deadline ของชั้นนอก
+            assert inner.remaining() <= 10
+            assert deadline.call_timeout(30) <= 10
+            assert deadline.call_timeout(1) == 1
+    with deadline.budget(0):
+        try:
+            deadline.call_timeout(1)
+            assert False, "expected DeadlineExceeded"
+        except deadline.DeadlineExceeded:
+            pass
+    assert all(0 <= deadline.backoff_delay(attempt, 0.1, 0.5) <= 0.5 for attempt in range(10))
+
+
+def test_retry_async_backs_off_within_the_budget():
+    calls = []
+
+    async def flaky():
+        calls.append(time.perf_counter())
+        if len(calls) < 3:
+            raise ConnectionError("boom")
+        return "ok"
+
+    async def scenario():
+        with deadline.budget(5) as turn_budget:
+            result = await deadline.retry_async(flaky, attempts=3, base_delay=0.01, max_delay=0.05)
+            return result, turn_budget.retries
+
+    assert asyncio.run(scenario()) == ("ok", 2)
+
+    # exception ที่ไม่ควร retry ถูก raise ทันที
+    calls.clear()
+
+    async def not_retried():
+        return await deadline.retry_async(flaky, attempts=3, should_retry=lambda e: False)
+
+    with contextlib.suppress(ConnectionError):
+        asyncio.run(not_retried())
+    assert len(calls) == 1
+
+    # call ที่ช้ากว่าเวลาที่เหลือของ turn หยุดที่ deadline ไม่ retry ต่อ
+    async def slow():
+        calls.append(time.perf_counter())
+        await asyncio.sleep(5)
+
+    async def out_of_budget():
+        with deadline.budget(0.2):
+            await deadline.retry_async(slow, attempts=5, timeout=10)
+
+    calls.clear()
+    started = time.perf_counter()
+    try:
+        asyncio.run(out_of_budget())
+        assert False, "expected DeadlineExceeded"
+    except deadline.DeadlineExceeded:
+        pass
+    assert len(calls) == 1
+    assert time.perf_counter() - started < 1.0
+
+
+def test_duplicate_side_effect_calls_in_one_turn_run_once():
+    sent = []
+
+    def push_text_message(message: dict) -> dict:
+        """ส่งข้อความ"""
+        sent.append(message)
+        return {"sentMessages": [{"id": str(len(sent))}]}
+
+    push = {"function_call": {"name": "push_text_message", "args": {"message": {"text": "โปรโมชั่น"}}}}
+    script = {"turns": [{"steps": [push, push, {"text": "ส่งแล้วครับ"}]}]}
+    agent = Agent(
+        name="idempotency",
+        model=ScriptedLlm(script=script),
+        tools=[push_text_message],
+        before_tool_callback=idempotency.before_tool_callback,
+        after_tool_callback=idempotency.after_tool_callback,
+        on_tool_error_callback=idempotency.on_tool_error_callback,
+    )
+    runner = InMemoryRunner(agent=agent, app_name="idempotency")
+
+    async def run_turn():
+        session = await runner.session_service.create_session(app_name="idempotency", user_id="U1")
+        message = types.Content(role="user", parts=[types.Part(text="ส่งโปรโมชั่น")])
+        with idempotency.turn_scope() as ledger:
+            events = [e async for e in runner.run_async(user_id="U1", session_id=session.id, new_message=message)]
+        return events, ledger
+
+    events, ledger = asyncio.run(run_turn())
+    assert len(sent) == 1
+    assert ledger.suppressed == 1
+    responses = [r.response for e in events for r in e.get_function_responses()]
+    assert len(responses) == 2 and "already executed" in responses[1]["content"][-1]["text"]
+
+    # turn ใหม่ส่งได้ตามปกติ
+    asyncio.run(run_turn())
+    assert len(sent) == 2
+
+
+def test_pooled_tools_retry_only_read_only_calls():
+    params = StdioServerParameters(command=sys.executable, args=[STANDIN_SERVER, "--failure-rate", "1"])
+
+    async def scenario():
+        pool = McpServerPool(params, size=1, health_check_interval=0)
+        try:
+            toolset = PooledMcpToolset(pool, retry_attempts=3, retry_base_delay=0.01, retry_max_delay=0.02)
+            tools = {tool.name: tool for tool in await toolset.get_tools()}
+            checkouts = pool.checkouts
+            with deadline.budget(10):
+                quota = await tools["get_message_quota"].run_async(args={}, tool_context=None)
+            assert is_error(quota) and pool.checkouts - checkouts == 3
+
+            checkouts = pool.checkouts
+            with deadline.budget(10):
+                push = await tools["push_text_message"].run_async(args={"message": {"text": "x"}}, tool_context=None)
+            assert is_error(push) and pool.checkouts - checkouts == 1
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_turn_deadline_reaches_agent_loop_and_stops_slow_turns():
+    import adk_runner_service
+    import metrics
+
+    seen_remaining = []
+
+    class SlowRunner:
+        async def run_async(self, user_id, session_id, new_message):
+            seen_remaining.append(deadline.remaining())
+            await asyncio.sleep(10)
+            yield  # pragma: no cover
+
+    timeouts = metrics.AGENT_TIMEOUTS.labels("agent_run")
+    before = timeouts._value.get()
+    with patch.object(adk_runner_service.runner_pool, "get_runner", lambda: SlowRunner()), \
+            contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        # deadline ของ sync wrapper (0.5s) สั้นกว่า AGENT_TURN_TIMEOUT_SECONDS จึงถูกใช้ทั้ง turn
+        response = adk_runner_service.generate_text_sync("ช้ามาก", "U-deadline", timeout=0.5)
+        elapsed = time.perf_counter() - started
+
+    assert response is None
+    assert elapsed < 2.0, elapsed
+    assert seen_remaining and seen_remaining[0] <= 0.5
+    assert timeouts._value.get() == before + 1
+
+
+if __name__ == "__main__":
+    test_budget_nests_and_bounds_call_timeouts()
+    test_retry_async_backs_off_within_the_budget()
+    test_duplicate_side_effect_calls_in_one_turn_run_once()
+    test_pooled_tools_retry_only_read_only_calls()
+    test_turn_deadline_reaches_agent_loop_and_stops_slow_turns()
+    print("✅ การทดสอบสำเร็จ")
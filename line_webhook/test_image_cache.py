@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ ImageCache: normalize prompt, หมดอายุตาม TTL, evict แบบ LRU และใช้ร่วมกันข้าม ImageCache instances ผ่านไฟล์ SQLite เดียวกัน
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_clock import FakeClock
+from line_oa_campaign_manager.image_cache import ImageCache, normalize_prompt, prompt_key
+
+MODEL = "gemini-2.5-flash-image-preview"
+URL = "https://storage.googleapis.com/line-oa-campaign-manager-images/a.png"
+
+
+def test_normalized_prompts_share_key():
+    assert normalize_prompt("  แบนเนอร์\u200b  ลดราคา\nSALE ") == "แบนเนอร์ ลดราคา sale"
+    assert prompt_key("Banner  SALE", MODEL) == prompt_key("banner sale", MODEL)
+    assert prompt_key("banner sale", MODEL) != prompt_key("banner sale", "other-model")
+
+
+def test_hit_and_ttl_expiry():
+    clock = FakeClock()
+    cache = ImageCache(ttl_seconds=60, clock=clock)
+    assert cache.get("banner sale", MODEL) is None
+    cache.put("banner sale", MODEL, URL, generation_seconds=8.0)
+    assert cache.get("Banner   SALE", MODEL) == URL
+
+    clock.now = 61
+    assert cache.get("banner sale", MODEL) is None
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["saved_generation_seconds"] == 8.0
+
+
+def test_lru_eviction():
+    cache = ImageCache(max_entries=2, clock=FakeClock())
+    cache.put("a", MODEL, "url-a")
+    cache.put("b", MODEL, "url-b")
+    assert cache.get("a", MODEL) == "url-a"  # a ถูกใช้ล่าสุด
+    cache.put("c", MODEL, "url-c")
+    assert cache.get("b", MODEL) is None
+    assert cache.get("a", MODEL) == "url-a"
+    assert cache.stats()["size"] == 2
+
+
+def test_sqlite_file_is_shared_across_cache_objects():
+    clock = FakeClock()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "images.sqlite3")
+        ImageCache(db_path=db_path, ttl_seconds=60, clock=clock).put("banner sale", MODEL, URL, 5.0)
+
+        restarted = ImageCache(db_path=db_path, ttl_seconds=60, clock=clock)
+        assert restarted.get("banner sale", MODEL) == URL
+        assert restarted.stats()["sqlite_hits"] == 1
+        assert restarted.get("banner sale", MODEL) == URL
+        assert restarted.stats()["memory_hits"] == 1
+
+        clock.now = 120
+        assert ImageCache(db_path=db_path, ttl_seconds=60, clock=clock).get("banner sale", MODEL) is None
+
+
+if __name__ == "__main__":
+    test_normalized_prompts_share_key()
+    test_hit_and_ttl_expiry()
+    test_lru_eviction()
+    test_sqlite_file_is_shared_across_cache_objects()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ gemini_generate_image_async: ไม่ block event loop และจำกัดจำนวนการสร้างรูปพร้อมกันตาม semaphore
+(ใช้ Gemini และ GCS จำลอง)
+"""
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from line_oa_campaign_manager import agent
+
+GENERATION_SECONDS = 0.2
+UPLOAD_SECONDS = 0.1
+
+
+class FakeAsyncModels:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_content(self, model, contents, config):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(GENERATION_SECONDS)
+        finally:
+            self.active -= 1
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=b"png", mime_type="image/png"))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class FakeBlob:
+    def upload_from_string(self, data, content_type=None):
+        time.sleep(UPLOAD_SECONDS)  # upload แบบ blocking ต้องไม่ทำให้ event loop หยุด
+
+
+class FakeBucket:
+    def blob(self, name):
+        return FakeBlob()
+
+
+def test_async_tool_limits_concurrency_without_blocking_loop():
+    models = FakeAsyncModels()
+    original = (agent._genai_client, agent._image_bucket, agent.image_cache, agent.IMAGE_MAX_CONCURRENCY)
+    agent._genai_client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    agent._image_bucket = FakeBucket()
+    agent.image_cache = None
+    agent.IMAGE_MAX_CONCURRENCY = 2
+    agent._image_request("warm-up")  # pydantic สร้าง schema ของ request types ครั้งแรกครั้งเดียว ไม่นับรวม
+
+    async def scenario():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        urls = await asyncio.gather(*(agent.gemini_generate_image_async(f"แบนเนอร์ {i}") for i in range(6)))
+        elapsed = time.perf_counter() - start
+        ticking.cancel()
+        max_gap = max(b - a for a, b in zip(ticks, ticks[1:]))
+        return urls, elapsed, max_gap
+
+    try:
+        urls, elapsed, max_gap = asyncio.run(scenario())
+    finally:
+        agent._genai_client, agent._image_bucket, agent.image_cache, agent.IMAGE_MAX_CONCURRENCY = original
+
+    print(f"6 images in {elapsed:.2f}s, max loop stall {max_gap * 1000:.1f} ms, max concurrent {models.max_active}")
+    assert all(url.startswith("https://storage.googleapis.com/") for url in urls)
+    assert models.max_active == 2
+    assert elapsed >= 3 * GENERATION_SECONDS  # 6 รูป / semaphore 2 = 3 รอบ
+    assert max_gap < UPLOAD_SECONDS  # upload ไม่ได้รันบน event loop
+    stats = agent.image_generation_stats()
+    assert stats["active"] == 0 and stats["waiting"] == 0
+    assert stats["completed"] >= 6
+
+
+def test_cache_lookup_runs_off_the_event_loop():
+    class SlowCache:
+        """image cache ที่ lookup ช้าเหมือน SQLite ที่ถูก lock (busy timeout)"""
+
+        def get(self, prompt, model):
+            time.sleep(UPLOAD_SECONDS)
+            return "https://storage.googleapis.com/line-oa-campaign-manager-images/cached.png"
+
+    original = agent.image_cache
+    agent.image_cache = SlowCache()
+
+    async def scenario():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        await asyncio.sleep(0.02)
+        url = await agent.gemini_generate_image_async("แบนเนอร์ลดราคา")
+        await asyncio.sleep(0.02)
+        ticking.cancel()
+        return url, max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    try:
+        url, max_gap = asyncio.run(scenario())
+    finally:
+        agent.image_cache = original
+    assert url.endswith("/cached.png")
+    assert max_gap < UPLOAD_SECONDS / 2
+
+
+if __name__ == "__main__":
+    test_async_tool_limits_concurrency_without_blocking_loop()
+    test_cache_lookup_runs_off_the_event_loop()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+ทดสอบงบเวลา import ของ main.py (cold start ก่อน Flask bind port)
+
+รัน `python -X importtime -c "import main"` ใน subprocess แล้วตรวจว่า
+- เวลา import สะสมของ main ไม่เกินงบ (IMPORT_TIME_BUDGET_MS)
+- ไม่มี module หนัก (ADK, genai, GCS, MCP) ถูก import ตอนเริ่มโปรเซส
+
+รัน: python test_import_time.py  (พิมพ์ 15 module ที่ใช้เวลามากที่สุด)
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+DEFERRED_MODULES = [
+    "adk_runner_service",
+    "google.adk",
+    "google.genai",
+    "google.cloud.storage",
+    "mcp",
+    "linebot.v3.messaging",
+]
+
+
+def run_importtime() -> tuple[list[tuple[str, int, int]], list[str]]:
+    """คืน (รายการ (module, self_us, cumulative_us), module หนักที่ถูก import)"""
+    env = dict(os.environ)
+    env.setdefault("MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN", "test_channel_token")
+    env.setdefault("MANAGER_OA_LINE_CHANNEL_SECRET", "test_channel_secret")
+    env["ADK_WARM_UP"] = "lazy"  # วัดเฉพาะ critical path ของ import
+
+    code = (
+        "import json, sys; import main; "
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=HERE, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return entries, loaded
+
+
+def test_main_import_time_within_budget():
+    entries, loaded = run_importtime()
+    main_ms = next(cumulative for name, _, cumulative in entries if name == "main") / 1000
+    print(f"import main: {main_ms:.1f} ms (budget {IMPORT_TIME_BUDGET_MS:.0f} ms)")
+    assert not loaded, f"heavy modules imported at startup: {loaded}"
+    assert main_ms < IMPORT_TIME_BUDGET_MS, f"import main took {main_ms:.1f} ms"
+
+
+if __name__ == "__main__":
+    entries, loaded = run_importtime()
+    for name, _, cumulative in sorted(entries, key=lambda e: e[2], reverse=True)[:15]:
+        print(f"{cumulative / 1000:9.1f} ms  {name}")
+    print(f"heavy modules imported: {loaded or 'none'}")
+    test_main_import_time_within_budget()
+    print("✅ การทดสอบสำเร็จ")
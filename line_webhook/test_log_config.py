@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ structured logging: JSON ต่อบรรทัด, ปิดบัง field ลับ, ตัดความยาว, ระดับแยกตาม component และการสุ่มเก็บ
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import log_config
+
+
+@contextlib.contextmanager
+def preserved_logging():
+    """คืนค่า root logger, ระดับของ loggers และหยุด QueueListener ของ setup_logging หลังทดสอบ"""
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    levels = {
+        name: logger.level for name, logger in logging.Logger.manager.loggerDict.items()
+        if isinstance(logger, logging.Logger)
+    }
+    try:
+        yield
+    finally:
+        if log_config._listener is not None:
+            log_config._listener.stop()
+            log_config._listener = None
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+        for name, logger in logging.Logger.manager.loggerDict.items():
+            if isinstance(logger, logging.Logger):
+                logger.setLevel(levels.get(name, logging.NOTSET))
+
+
+@pytest.fixture(autouse=True)
+def restore_logging():
+    with preserved_logging():
+        yield
+
+
+def capture(**kwargs) -> io.StringIO:
+    stream = io.StringIO()
+    log_config.setup_logging(stream=stream, **kwargs)
+    return stream
+
+
+def read_lines(stream: io.StringIO) -> list[dict]:
+    log_config.flush_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_lines_with_redaction_and_truncation():
+    stream = capture(level="INFO", levels="", log_format="json", sample_rate=1.0)
+    logger = logging.getLogger("adk_runner_service")
+    logger.info(
+        "Response: %s", "ก" * 2000,
+        extra={"user_id": "U1", "reply_token": "secret-token", "payload": {"Authorization": "Bearer x", "n": 1}},
+    )
+    [entry] = read_lines(stream)
+    assert entry["severity"] == "INFO"
+    assert entry["logger"] == "adk_runner_service"
+    assert entry["user_id"] == "U1"
+    assert entry["reply_token"] == log_config.REDACTED
+    assert entry["payload"] == {"Authorization": log_config.REDACTED, "n": 1}
+    assert len(entry["message"]) < 600 and entry["message"].endswith("chars)")
+
+
+def test_per_component_levels():
+    stream = capture(level="INFO", levels="adk_runner_service=WARNING,main=DEBUG", log_format="json", sample_rate=1.0)
+    logging.getLogger("adk_runner_service").info("hidden")
+    logging.getLogger("adk_runner_service").warning("shown")
+    logging.getLogger("main").debug("debug shown")
+    assert [entry["message"] for entry in read_lines(stream)] == ["shown", "debug shown"]
+
+
+def test_sampling_only_applies_to_marked_records():
+    stream = capture(level="DEBUG", levels="", log_format="json", sample_rate=0.0)
+    logger = logging.getLogger("adk_runner_service")
+    for i in range(100):
+        logger.debug("event %d", i, extra={"sample": True})
+    logger.debug("always kept")
+    assert [entry["message"] for entry in read_lines(stream)] == ["always kept"]
+
+
+def test_exception_is_serialized():
+    stream = capture(level="INFO", levels="", log_format="json", sample_rate=1.0)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger("main").exception("failed")
+    [entry] = read_lines(stream)
+    assert entry["severity"] == "ERROR"
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_secrets_in_message_and_exception_are_redacted():
+    stream = capture(level="INFO", levels="", log_format="json", sample_rate=1.0)
+    logger = logging.getLogger("main")
+    logger.info('body: {"replyToken":"abc123","text":"hi"} access_token=xyz Authorization: Bearer t0k3n')
+    try:
+        raise ValueError("bad header Authorization: Bearer leaked-token")
+    except ValueError:
+        logger.exception("channel_secret=s3cret failed")
+    first, second = read_lines(stream)
+    for secret in ("abc123", "xyz", "t0k3n"):
+        assert secret not in first["message"]
+    assert '"text":"hi"' in first["message"]
+    assert "s3cret" not in second["message"] and "leaked-token" not in second["exception"]
+    assert "ValueError" in second["exception"]
+
+
+def test_full_queue_drops_and_counts_records():
+    stream = io.StringIO()
+    listener = log_config.setup_logging(stream=stream, level="INFO", levels="", log_format="json",
+                                        sample_rate=1.0, queue_maxsize=5)
+    listener.stop()  # หยุด listener ให้คิวเต็ม
+    logger = logging.getLogger("main")
+    for i in range(8):
+        logger.info("line %d", i)
+    assert log_config.stats() == {"queued": 5, "queue_maxsize": 5, "dropped": 3}
+    listener.start()
+    assert [entry["message"] for entry in read_lines(stream)] == [f"line {i}" for i in range(5)]
+
+
+if __name__ == "__main__":
+    for test in (
+        test_json_lines_with_redaction_and_truncation,
+        test_per_component_levels,
+        test_sampling_only_applies_to_marked_records,
+        test_exception_is_serialized,
+        test_secrets_in_message_and_exception_are_redacted,
+        test_full_queue_drops_and_counts_records,
+    ):
+        with preserved_logging():
+            test()
+    print("✅ การทดสอบสำเร็จ")
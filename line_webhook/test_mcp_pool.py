@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ McpServerPool กับ MCP server จำลอง (mcp_standin_server.py) ที่ start ช้า
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp import StdioServerParameters
+
+from line_oa_campaign_manager.mcp_pool import McpPoolExhausted, McpServerPool, PooledMcpToolset
+
+STANDIN_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_standin_server.py")
+STARTUP_DELAY = 1.0
+
+
+def standin_params(startup_delay: float = STARTUP_DELAY) -> StdioServerParameters:
+    return StdioServerParameters(
+        command=sys.executable,
+        args=[STANDIN_SERVER, "--startup-delay", str(startup_delay)],
+    )
+
+
+def test_prewarm_starts_servers_concurrently_and_reuses_them():
+    async def scenario():
+        pool = McpServerPool(standin_params(), size=3)
+        try:
+            started = time.perf_counter()
+            await pool.start()
+            prewarm = time.perf_counter() - started
+            # spawn พร้อมกัน จึงใช้เวลาใกล้เคียงกับ process เดียว
+            assert prewarm < STARTUP_DELAY * 2, prewarm
+
+            started = time.perf_counter()
+            for _ in range(10):
+                result = await pool.call_tool("get_message_quota", {})
+                assert result.content
+            per_call = (time.perf_counter() - started) / 10
+            # หลัง pre-warm ไม่ต้องรอ startup อีก
+            assert per_call < STARTUP_DELAY / 4, per_call
+            assert pool.stats()["alive"] == 3
+            assert pool.stats()["restarts"] == 0
+            print(f"prewarm={prewarm:.2f}s per_call={per_call * 1000:.1f} ms")
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_each_call_checks_out_and_returns_a_connection():
+    async def scenario():
+        pool = McpServerPool(standin_params(0), size=1, checkout_timeout=0.2, health_check_interval=0)
+        try:
+            await pool.start()
+            assert pool._health_task is None
+            # run ที่เรียก tool หลายครั้งไม่ได้ถือ connection ไว้ระหว่าง calls
+            await pool.call_tool("get_message_quota", {})
+            assert pool.stats()["idle"] == 1
+            await pool.call_tool("push_text_message", {"message": {"text": "hi"}})
+            assert pool.stats()["idle"] == 1
+            assert pool.stats()["checkouts"] == 2
+
+            # pool เต็มจริง ๆ ได้ error แยกจาก timeout ของ tool
+            async with pool.checkout():
+                try:
+                    await pool.call_tool("get_message_quota", {})
+                    raise AssertionError("expected McpPoolExhausted")
+                except McpPoolExhausted:
+                    pass
+            assert pool.stats()["exhausted"] == 1
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_crashed_server_is_restarted():
+    async def scenario():
+        pool = McpServerPool(standin_params(0), size=1, health_check_interval=0.2)
+        try:
+            await pool.start()
+            try:
+                await asyncio.wait_for(pool.call_tool("_crash", {}), timeout=5)
+            except Exception:
+                pass
+            await asyncio.sleep(0.5)
+            result = await pool.call_tool("get_message_quota", {})
+            assert result is not None
+            assert pool.stats()["restarts"] >= 1
+            assert pool.stats()["alive"] == 1
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_toolset_exposes_pool_tools():
+    async def scenario():
+        pool = McpServerPool(standin_params(0), size=1)
+        try:
+            toolset = PooledMcpToolset(pool, tool_filter=["get_message_quota", "push_text_message"])
+            tools = await toolset.get_tools()
+            assert sorted(tool.name for tool in tools) == ["get_message_quota", "push_text_message"]
+            declaration = next(t for t in tools if t.name == "push_text_message")._get_declaration()
+            assert declaration.parameters_json_schema["required"] == ["message"]
+            response = await tools[0].run_async(args={}, tool_context=None)
+            assert "content" in response
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_prewarm_starts_servers_concurrently_and_reuses_them()
+    test_each_call_checks_out_and_returns_a_connection()
+    test_crashed_server_is_restarted()
+    test_toolset_exposes_pool_tools()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ mcp_standin_server.py (tools/schemas ของ LINE MCP server, latency, failure rate)
+และ benchmark_mcp_tools.py แบบสั้น
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_mcp_tools import run_benchmark
+from mcp_standin_server import StandinBehavior, handle
+
+LINE_MCP_TOOLS = {
+    "push_text_message", "push_flex_message", "broadcast_text_message", "broadcast_flex_message",
+    "get_profile", "get_message_quota", "get_rich_menu_list", "delete_rich_menu",
+    "set_rich_menu_default", "cancel_rich_menu_default", "create_rich_menu",
+}
+
+
+def call(name: str, arguments: dict, behavior: StandinBehavior | None = None) -> dict:
+    request = {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": name, "arguments": arguments}}
+    return handle(request, behavior)["result"]
+
+
+def test_tools_match_line_mcp_server():
+    tools = handle({"jsonrpc": "2.0", "id": 1, "method": "tools/list"})["result"]["tools"]
+    assert {tool["name"] for tool in tools} - {"_crash"} == LINE_MCP_TOOLS
+    schemas = {tool["name"]: tool["inputSchema"] for tool in tools}
+    assert schemas["push_flex_message"]["properties"]["message"]["required"] == ["altText", "contents"]
+    assert schemas["create_rich_menu"]["required"] == ["chatBarText", "actions"]
+
+    result = call("push_text_message", {"userId": "U1", "message": {"text": "สวัสดี"}})
+    assert not result["isError"]
+    assert json.loads(result["content"][0]["text"])["sentMessages"][0]["text"] == "สวัสดี"
+    assert call("unknown_tool", {})["isError"]
+    assert call("push_text_message", {})["isError"]
+
+
+def test_failure_rate_and_latency():
+    behavior = StandinBehavior(latency=0.02, failure_rate=0.5, seed=7)
+    started = time.perf_counter()
+    results = [call("get_message_quota", {}, behavior) for _ in range(20)]
+    elapsed = time.perf_counter() - started
+    failures = sum(result["isError"] for result in results)
+    assert 0 < failures < 20, failures
+    assert elapsed >= 20 * 0.02
+
+    # seed เดียวกันให้ลำดับความล้มเหลวเดิม
+    again = StandinBehavior(latency=0, failure_rate=0.5, seed=7)
+    assert [call("get_message_quota", {}, again)["isError"] for _ in range(20)] == [r["isError"] for r in results]
+    assert not any(call("get_message_quota", {}, StandinBehavior())["isError"] for _ in range(20))
+
+
+def test_benchmark_reports_each_mode():
+    latency = 0.05
+    results = run_benchmark(calls=5, one_shot_calls=2, latency=latency, pool_size=1)["results"]
+    assert set(results) == {"one_shot", "persistent", "pool"}
+    for mode, result in results.items():
+        assert result["errors"] == 0, mode
+        assert result["call_ms"]["p50"] >= latency * 1000, mode
+    # one_shot ต้อง spawn + initialize ทุก call จึงช้ากว่าใช้ session ค้าง
+    assert results["one_shot"]["end_to_end_call_ms"]["mean"] > results["persistent"]["end_to_end_call_ms"]["mean"]
+    assert results["persistent"]["connect_ms"]["n"] == 1
+
+
+def test_benchmark_cli_runs_default_modes_in_one_process():
+    # ค่าเริ่มต้นของ CLI (latency 0, pool 2 ตัว) และ one_shot รันก่อน pool ใน process เดียวกัน
+    # timeout กันไม่ให้ benchmark ที่ค้าง (เช่น health loop ที่ interval 0) ค้างทั้งชุดทดสอบ
+    completed = subprocess.run(
+        [sys.executable, "benchmark_mcp_tools.py", "--calls", "5", "--one-shot-calls", "2"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=60, check=True,
+    )
+    results = json.loads(completed.stdout)["results"]
+    assert list(results) == ["one_shot", "persistent", "pool"]
+    assert all(result["errors"] == 0 for result in results.values())
+    assert results["pool"]["pool_size"] == 2
+
+
+if __name__ == "__main__":
+    test_tools_match_line_mcp_server()
+    test_failure_rate_and_latency()
+    test_benchmark_reports_each_mode()
+    test_benchmark_cli_runs_default_modes_in_one_process()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+ทดสอบการรวมข้อความที่ผู้ใช้ส่งติดกันเป็น agent turn เดียว (MessageCoalescer)
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from message_coalescer import MessageCoalescer
+
+WINDOW_SECONDS = 0.2
+
+
+def test_burst_is_merged_into_latest_message():
+    async def scenario():
+        coalescer = MessageCoalescer(window_seconds=WINDOW_SECONDS)
+
+        async def send(text, delay):
+            await asyncio.sleep(delay)
+            return await coalescer.submit("U1", text)
+
+        results = await asyncio.gather(send("สวัสดี", 0), send("อยากทำแคมเปญ", 0.05), send("ลดราคา 50%", 0.1))
+        return results, coalescer.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [None, None, ["สวัสดี", "อยากทำแคมเปญ", "ลดราคา 50%"]]
+    assert stats["coalesced_turns"] == 1
+    assert stats["coalesced_messages"] == 3
+    assert stats["turns_saved"] == 2
+    assert stats["pending_users"] == 0
+
+
+def test_messages_outside_window_and_other_users_stay_separate():
+    async def scenario():
+        coalescer = MessageCoalescer(window_seconds=WINDOW_SECONDS)
+        first = await coalescer.submit("U1", "a")
+        both = await asyncio.gather(coalescer.submit("U1", "b"), coalescer.submit("U2", "c"))
+        return [first, *both], coalescer.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [["a"], ["b"], ["c"]]
+    assert stats["individual_turns"] == 3
+    assert stats["coalesced_turns"] == 0
+
+
+def test_flushes_at_max_messages():
+    async def scenario():
+        coalescer = MessageCoalescer(window_seconds=10, max_messages=3)
+        return await asyncio.wait_for(
+            asyncio.gather(*(coalescer.submit("U1", str(i)) for i in range(3))), timeout=1
+        )
+
+    assert asyncio.run(scenario()) == [None, None, ["0", "1", "2"]]
+
+
+def test_disabled_window_passes_through():
+    coalescer = MessageCoalescer(window_seconds=0)
+    assert asyncio.run(coalescer.submit("U1", "a")) == ["a"]
+    assert coalescer.stats()["individual_turns"] == 1
+
+
+def test_generate_text_sync_runs_one_turn_for_a_burst():
+    import adk_runner_service
+
+    calls = []
+
+    async def fake_generate_text(user_input, user_id=None):
+        calls.append(list(user_input))
+        return f"ตอบ {len(user_input)} ข้อความ"
+
+    def send(text, delay):
+        time.sleep(delay)
+        return adk_runner_service.generate_text_sync(text, "U-burst", timeout=5)
+
+    with patch.object(adk_runner_service, "generate_text", fake_generate_text), \
+            patch.object(adk_runner_service.message_coalescer, "window_seconds", WINDOW_SECONDS):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(send, ["ขอโปรโมชั่น", "สำหรับร้านกาแฟ", "ช่วงสงกรานต์"], [0, 0.05, 0.1]))
+
+    assert calls == [["ขอโปรโมชั่น", "สำหรับร้านกาแฟ", "ช่วงสงกรานต์"]]
+    assert results[:2] == [adk_runner_service.COALESCED, adk_runner_service.COALESCED]
+    assert results[2] == "ตอบ 3 ข้อความ"
+
+
+if __name__ == "__main__":
+    test_burst_is_merged_into_latest_message()
+    test_messages_outside_window_and_other_users_stay_separate()
+    test_flushes_at_max_messages()
+    test_disabled_window_passes_through()
+    test_generate_text_sync_runs_one_turn_for_a_burst()
+    print("✅ การทดสอบสำเร็จ")
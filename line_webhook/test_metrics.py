@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ Prometheus metrics: histogram ของแต่ละช่วง, เวลาของ tool calls, endpoint /metrics
+และการรวมค่าจากหลาย worker processes ด้วย PROMETHEUS_MULTIPROC_DIR
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN', 'test_channel_token')
+os.environ.setdefault('MANAGER_OA_LINE_CHANNEL_SECRET', 'test_channel_secret')
+os.environ.setdefault('ADK_WARM_UP', 'lazy')
+
+from prometheus_client import REGISTRY
+
+import metrics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_observe_stage_records_on_success_and_error():
+    before = sample("line_oa_stage_seconds_count", stage="test_stage")
+    with metrics.observe_stage("test_stage"):
+        pass
+    try:
+        with metrics.observe_stage("test_stage"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert sample("line_oa_stage_seconds_count", stage="test_stage") == before + 2
+
+
+def test_tool_callbacks_time_each_call():
+    tool = SimpleNamespace(name="get_profile")
+    ok_before = sample("line_oa_tool_call_seconds_count", tool="get_profile", outcome="ok")
+    failed_before = sample("line_oa_tool_call_seconds_count", tool="get_profile", outcome="exception")
+
+    # สอง calls ของ tool เดียวกันที่ทับซ้อนกันแยกกันด้วย function_call_id
+    first, second = SimpleNamespace(function_call_id="call-1"), SimpleNamespace(function_call_id="call-2")
+    assert metrics.before_tool_callback(tool, {}, first) is None
+    assert metrics.before_tool_callback(tool, {}, second) is None
+    assert metrics.after_tool_callback(tool, {}, first, {"displayName": "A"}) is None
+    assert metrics.on_tool_error_callback(tool, {}, second, RuntimeError("MCP down")) is None
+
+    assert sample("line_oa_tool_call_seconds_count", tool="get_profile", outcome="ok") == ok_before + 1
+    assert sample("line_oa_tool_call_seconds_count", tool="get_profile", outcome="exception") == failed_before + 1
+    assert not metrics._tool_started
+
+
+def test_instrument_agent_keeps_existing_callbacks():
+    def existing(tool, args, tool_context):
+        return None
+
+    agent = SimpleNamespace(before_tool_callback=existing, after_tool_callback=None, on_tool_error_callback=None)
+    metrics.instrument_agent(agent)
+    metrics.instrument_agent(agent)
+    assert agent.before_tool_callback == [existing, metrics.before_tool_callback]
+    assert agent.after_tool_callback is metrics.after_tool_callback
+
+
+def test_metrics_endpoint_exposes_signature_verification():
+    import main
+    from test_webhook_queue import sign
+
+    client = main.app.test_client()
+    body = json.dumps({"destination": "U0", "events": []})
+    response = client.post("/", data=body, headers={"X-Line-Signature": sign(body, main.CHANNEL_SECRET)})
+    assert response.status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    assert 'line_oa_stage_seconds_count{stage="signature_verification"}' in text
+    assert "line_oa_agent_timeouts_total" in text
+
+
+def test_multiprocess_mode_aggregates_workers():
+    with tempfile.TemporaryDirectory() as multiproc_dir:
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": multiproc_dir}
+        worker = "import metrics; metrics.AGENT_RETRIES.inc(); metrics.STAGE_SECONDS.labels('agent_run').observe(0.2)"
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", worker], cwd=HERE, env=env, check=True)
+        exposition = subprocess.run(
+            [sys.executable, "-c", "import metrics, sys; sys.stdout.write(metrics.render_latest().decode())"],
+            cwd=HERE, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    assert "line_oa_agent_retries_total 2.0" in exposition
+    assert 'line_oa_stage_seconds_count{stage="agent_run"} 2.0' in exposition
+
+
+if __name__ == "__main__":
+    test_observe_stage_records_on_success_and_error()
+    test_tool_callbacks_time_each_call()
+    test_instrument_agent_keeps_existing_callbacks()
+    test_metrics_endpoint_exposes_signature_verification()
+    test_multiprocess_mode_aggregates_workers()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+ทดสอบการส่งคำตอบตามอายุของ reply token: reply ทันเวลา, ข้อความชั่วคราวแล้ว push คำตอบ
+การแสดง loading animation ซ้ำระหว่างรอแบบ fire-and-forget และ LINE API client แบบ async บน agent loop
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from unittest.mock import AsyncMock, patch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN', 'test_channel_token')
+os.environ.setdefault('MANAGER_OA_LINE_CHANNEL_SECRET', 'test_channel_secret')
+os.environ.setdefault('ADK_WARM_UP', 'lazy')
+
+import line_api
+import metrics
+import reply_delivery
+from agent_loop import run_coroutine
+from reply_delivery import ReplyDelivery
+from test_webhook_queue import as_submit_text, make_text_event, sign
+
+
+def delivered(outcome: str) -> float:
+    return metrics.REPLY_DELIVERIES.labels(outcome)._value.get()
+
+
+def sent_texts(mock_call) -> list[str]:
+    return [message.text for call in mock_call.call_args_list for message in call.args[0].messages]
+
+
+def test_fast_turn_replies_on_time():
+    line_bot_api = AsyncMock()
+    before = delivered("on_time")
+
+    async def scenario():
+        delivery = ReplyDelivery("U1", "token-1", reply_budget=5)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result("สวัสดีครับ")
+        assert await delivery.wait(future, delivery.reply_time_left())
+        return await delivery.deliver(future.result())
+
+    with patch("line_api.get_async_line_bot_api", AsyncMock(return_value=line_bot_api)):
+        assert run_coroutine(scenario()) == "on_time"
+    assert sent_texts(line_bot_api.reply_message_with_http_info) == ["สวัสดีครับ"]
+    assert line_bot_api.push_message_with_http_info.await_count == 0
+    assert delivered("on_time") == before + 1
+
+
+def test_slow_turn_sends_interim_reply_then_pushes_and_keeps_loading_animation():
+    line_bot_api = AsyncMock()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(lambda: time.sleep(1.0) or "สร้างรูปเรียบร้อยแล้วครับ")
+    before = delivered("push_fallback")
+    # loading animation ครั้งละ 5 วินาที (ขั้นต่ำของ LINE) แสดงซ้ำทุก 0.3 วินาที
+    delivery = ReplyDelivery("U1", "token-1", reply_budget=0.2, loading_seconds=5)
+
+    async def scenario():
+        turn = asyncio.wrap_future(future)
+        delivery.show_loading()
+        assert not await delivery.wait(turn, delivery.reply_time_left())
+        await delivery.send_interim()
+        assert await delivery.wait(turn, 5)
+        return await delivery.deliver(future.result())
+
+    with patch.object(reply_delivery, "LOADING_REFRESH_MARGIN_SECONDS", 4.7), \
+            patch("line_api.fire_and_forget") as fire_and_forget, \
+            patch("line_api.get_async_line_bot_api", AsyncMock(return_value=line_bot_api)):
+        assert run_coroutine(scenario()) == "push_fallback"
+
+        assert sent_texts(line_bot_api.reply_message_with_http_info) == [reply_delivery.INTERIM_REPLY_MESSAGE]
+        assert sent_texts(line_bot_api.push_message_with_http_info) == ["สร้างรูปเรียบร้อยแล้วครับ"]
+        loading_calls = [call for call in fire_and_forget.call_args_list if call.args[0] == "show_loading_animation"]
+        assert len(loading_calls) >= 3
+        assert delivered("push_fallback") == before + 1
+
+        # agent ไม่ได้คำตอบหลังส่งข้อความชั่วคราวแล้ว: แจ้งผู้ใช้ด้วย push
+        run_coroutine(delivery.deliver_failure())
+        assert sent_texts(line_bot_api.push_message_with_http_info)[-1] == reply_delivery.FAILED_PUSH_MESSAGE
+
+
+def test_rejected_reply_token_falls_back_to_push():
+    class InvalidReplyToken(Exception):
+        status = 400
+
+    line_bot_api = AsyncMock()
+    line_bot_api.reply_message_with_http_info.side_effect = InvalidReplyToken("Invalid reply token")
+    with patch("line_api.get_async_line_bot_api", AsyncMock(return_value=line_bot_api)):
+        # event ที่รอคิวนานจนเกิน budget: ส่งข้อความชั่วคราวทันที ไม่รอ agent
+        delivery = ReplyDelivery("U1", "token-1", received_at=time.time() - 60, reply_budget=25)
+        assert delivery.reply_time_left() == 0
+        assert run_coroutine(delivery.deliver("คำตอบ")) == "push_fallback"
+        assert sent_texts(line_bot_api.push_message_with_http_info) == ["คำตอบ"]
+
+        # error อื่นไม่ push ซ้ำ (ข้อความอาจถึงผู้ใช้แล้ว)
+        line_bot_api.reply_message_with_http_info.side_effect = TimeoutError("read timeout")
+        try:
+            run_coroutine(ReplyDelivery("U1", "token-2").deliver("คำตอบ"))
+            assert False, "expected TimeoutError"
+        except TimeoutError:
+            pass
+    assert line_bot_api.push_message_with_http_info.await_count == 1
+
+
+def test_line_calls_run_on_agent_loop_with_pooled_async_client():
+    from linebot.v3.messaging import ShowLoadingAnimationRequest
+
+    from api_standin_servers import start_line_api_standin
+
+    standin = start_line_api_standin(latency=0.5)
+    try:
+        with patch.dict(os.environ, {"LINE_API_HOST": standin.url}), patch.object(line_api, "_async_api", None):
+            delivery = ReplyDelivery("U-loading", "token-1")
+            started = time.perf_counter()
+            delivery.show_loading()
+            assert time.perf_counter() - started < 0.2  # ไม่รอ LINE API (latency 0.5s)
+            delivery.loading_future.result(timeout=5)
+            assert standin.count("/v2/bot/chat/loading/start") == 1
+            assert standin.bodies[-1][1] == {"chatId": "U-loading", "loadingSeconds": delivery.loading_seconds}
+
+            # reply หลายข้อความพร้อมกันบน agent loop โดยไม่ใช้ thread ต่อ call
+            async def reply_all():
+                deliveries = [ReplyDelivery(f"U{i}", f"token-{i}") for i in range(10)]
+                return await asyncio.gather(*(d.deliver(f"คำตอบ {i}") for i, d in enumerate(deliveries)))
+
+            started = time.perf_counter()
+            assert run_coroutine(reply_all()) == ["on_time"] * 10
+            assert time.perf_counter() - started < 2.5  # 10 calls ทีละ call ใช้ 5 วินาที
+            assert standin.count("/v2/bot/message/reply") == 10
+            api = run_coroutine(line_api.get_async_line_bot_api())
+            assert api.api_client.rest_client.pool_manager.connector.limit == line_api.LINE_API_POOL_SIZE
+
+            # client ใช้ได้เฉพาะบน agent loop (aiohttp.ClientSession ไม่ thread-safe)
+            try:
+                asyncio.run(line_api.get_async_line_bot_api())
+                assert False, "expected RuntimeError"
+            except RuntimeError:
+                pass
+
+            # LINE API ตอบช้ากว่า timeout: log และนับ failed โดยไม่ raise ให้ผู้เรียก
+            failed = line_api.stats()["failed"]
+            line_api.fire_and_forget("show_loading_animation", ShowLoadingAnimationRequest(chat_id="U-loading"), timeout=0.1)
+            deadline = time.monotonic() + 5
+            while line_api.stats()["failed"] == failed and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert line_api.stats()["failed"] == failed + 1
+
+            # call ที่ถูกยกเลิก (เช่น ตอนปิด loop) นับแยกจาก failed
+            cancelled = line_api.stats()["cancelled"]
+            future = line_api.fire_and_forget("show_loading_animation", ShowLoadingAnimationRequest(chat_id="U-loading"))
+            time.sleep(0.1)
+            future.cancel()
+            while line_api.stats()["in_flight"] and time.monotonic() < deadline + 5:
+                time.sleep(0.05)
+            assert line_api.stats()["cancelled"] == cancelled + 1
+            assert line_api.stats()["failed"] == failed + 1
+            assert line_api.stats()["in_flight"] == 0
+            run_coroutine(line_api.close_async_line_bot_api())
+    finally:
+        standin.stop()
+
+
+def test_webhook_pushes_answer_after_interim_reply():
+    import main
+
+    def slow_agent(user_input, user_id=None):
+        time.sleep(0.5)
+        return f"echo: {user_input}"
+
+    body = json.dumps({"destination": "Udestination", "events": [make_text_event("U-slow", "สร้างแบนเนอร์")]})
+    line_bot_api = AsyncMock()
+    with patch.object(main, "WEBHOOK_MODE", "sync"), \
+            patch("line_api.get_async_line_bot_api", AsyncMock(return_value=line_bot_api)), \
+            patch("line_api.fire_and_forget"), \
+            patch.object(reply_delivery, "REPLY_BUDGET_SECONDS", 0.1), \
+            patch("adk_runner_service.submit_text", as_submit_text(slow_agent)):
+        with main.app.test_client() as client:
+            response = client.post(
+                "/",
+                data=body,
+                content_type="application/json",
+                headers={"X-Line-Signature": sign(body, main.CHANNEL_SECRET)},
+            )
+        # webhook ตอบทันที คำตอบถูกส่งจาก agent loop ภายหลัง
+        assert response.status_code == 200
+        assert main.wait_for_deliveries(timeout=10)
+    assert sent_texts(line_bot_api.reply_message_with_http_info) == [reply_delivery.INTERIM_REPLY_MESSAGE]
+    assert sent_texts(line_bot_api.push_message_with_http_info) == ["echo: สร้างแบนเนอร์"]
+    assert line_bot_api.push_message_with_http_info.call_args.args[0].to == "U-slow"
+
+
+if __name__ == "__main__":
+    test_fast_turn_replies_on_time()
+    test_slow_turn_sends_interim_reply_then_pushes_and_keeps_loading_animation()
+    test_rejected_reply_token_falls_back_to_push()
+    test_line_calls_run_on_agent_loop_with_pooled_async_client()
+    test_webhook_pushes_answer_after_interim_reply()
+    print("✅ การทดสอบสำเร็จ")
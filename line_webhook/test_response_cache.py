@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ ResponseCache: normalize คำถามภาษาไทย, TTL, allowlist/denylist
+และการไม่ cache turn ที่ agent เรียก tool ที่มีผลข้างเคียง
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_clock import FakeClock
+from response_cache import ResponseCache, normalize_question
+
+
+def test_thai_questions_normalize_to_same_key():
+    assert normalize_question("เดือนนี้ เหลือ ข้อความ กี่ข้อความ ครับ?") == normalize_question("เดือนนี้เหลือข้อความกี่ข้อความคะ")
+    assert normalize_question("ทำอะไรได้บ้าง นะครับ!!") == normalize_question("ทำอะไรได้บ้าง")
+    assert normalize_question("What can you do?") == "whatcanyoudo"
+    assert normalize_question("ครับ") == "ครับ"  # ไม่ตัดจนเหลือข้อความว่าง
+
+
+def test_hit_miss_and_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl_seconds=60, clock=clock)
+    assert cache.get("ทำอะไรได้บ้าง") is None
+    assert cache.put("ทำอะไรได้บ้าง", "ช่วยวางแผนแคมเปญได้ครับ")
+    assert cache.get("ทำอะไร ได้บ้างครับ?") == "ช่วยวางแผนแคมเปญได้ครับ"
+    clock.now = 61
+    assert cache.get("ทำอะไรได้บ้าง") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 2, 1)
+
+
+def test_denylist_and_allowlist():
+    cache = ResponseCache(clock=FakeClock())
+    assert not cache.put("ส่งข้อความหาลูกค้าทุกคน", "ส่งแล้วครับ")
+    assert cache.get("ส่งข้อความหาลูกค้าทุกคน") is None
+    assert not cache.put("broadcast promo now", "done")
+    assert cache.stats()["bypassed"] == 1
+
+    allow_only = ResponseCache(allow_patterns=[r"เหลือ.*ข้อความ", r"ทำอะไรได้"], clock=FakeClock())
+    assert allow_only.put("เหลือข้อความกี่ข้อความ", "500 ข้อความ")
+    assert not allow_only.put("แนะนำแคมเปญหน่อย", "...")
+
+
+def test_side_effecting_tool_calls_are_not_cached():
+    cache = ResponseCache(clock=FakeClock())
+    assert cache.put("เหลือข้อความกี่ข้อความ", "500 ข้อความ", tool_names={"get_message_quota"})
+    assert not cache.put("โปรโมชั่นวันนี้", "ส่งแล้ว", tool_names={"get_profile", "push_text_message"})
+    assert not cache.put("ขอรูปแบนเนอร์", "https://...", tool_names={"gemini_generate_image_async"})
+    assert cache.stats()["uncacheable"] == 2
+
+
+def test_entries_are_scoped():
+    cache = ResponseCache(clock=FakeClock())
+    assert cache.put("โปรไฟล์ของฉัน", "คุณชื่อเอ", tool_names={"get_profile"}, scope="U-a")
+    assert cache.get("โปรไฟล์ของฉัน", scope="U-a") == "คุณชื่อเอ"
+    assert cache.get("โปรไฟล์ของฉัน", scope="U-b") is None
+
+
+def test_generate_text_skips_agent_on_cache_hit():
+    from google.adk.events import Event
+    from google.genai import types
+
+    import adk_runner_service
+
+    class FakeRunner:
+        def __init__(self, tool_name):
+            self.tool_name = tool_name
+            self.runs = 0
+
+        async def run_async(self, user_id, session_id, new_message):
+            self.runs += 1
+            call = types.Part(function_call=types.FunctionCall(name=self.tool_name, args={}))
+            yield Event(author="agent", content=types.Content(role="model", parts=[call]))
+            yield Event(author="agent", content=types.Content(role="model", parts=[types.Part(text="500 ข้อความ")]))
+
+    async def ask(runner, text, user_id="U-cache"):
+        with patch.object(adk_runner_service.runner_pool, "get_runner", lambda: runner):
+            return await adk_runner_service.generate_text(text, user_id)
+
+    async def history(user_id):
+        session_id = await adk_runner_service.get_or_create_session(user_id)
+        session = await adk_runner_service.session_service.get_session(
+            app_name=adk_runner_service.APP_NAME, user_id=user_id, session_id=session_id
+        )
+        return [(event.author, event.content.parts[0].text) for event in session.events]
+
+    with patch.object(adk_runner_service, "response_cache", ResponseCache()), \
+            contextlib.redirect_stdout(io.StringIO()):
+        read_only = FakeRunner("get_message_quota")
+        assert asyncio.run(ask(read_only, "เหลือข้อความกี่ข้อความครับ")) == "500 ข้อความ"
+        assert asyncio.run(ask(read_only, "เหลือข้อความ กี่ข้อความ คะ")) == "500 ข้อความ"
+        assert read_only.runs == 1
+        # คำตอบจาก cache ถูกบันทึกลง session เหมือน turn ปกติ
+        assert asyncio.run(history("U-cache"))[-2:] == [
+            ("user", "เหลือข้อความ กี่ข้อความ คะ"), (adk_runner_service.line_oa_agent.name, "500 ข้อความ"),
+        ]
+        # ผู้ใช้คนอื่นไม่ได้คำตอบจาก cache ของ U-cache
+        assert asyncio.run(ask(read_only, "เหลือข้อความกี่ข้อความครับ", "U-cache-other")) == "500 ข้อความ"
+        assert read_only.runs == 2
+
+        side_effect = FakeRunner("broadcast_text_message")
+        assert asyncio.run(ask(side_effect, "โปรโมชั่นประจำสัปดาห์")) == "500 ข้อความ"
+        assert asyncio.run(ask(side_effect, "โปรโมชั่นประจำสัปดาห์")) == "500 ข้อความ"
+        assert side_effect.runs == 2
+        assert adk_runner_service.response_cache.stats()["hits"] == 1
+
+
+if __name__ == "__main__":
+    test_thai_questions_normalize_to_same_key()
+    test_hit_miss_and_ttl()
+    test_denylist_and_allowlist()
+    test_side_effecting_tool_calls_are_not_cached()
+    test_entries_are_scoped()
+    test_generate_text_skips_agent_on_cache_hit()
+    print("✅ การทดสอบสำเร็จ")
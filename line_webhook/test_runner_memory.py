@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Memory regression test: ผู้ใช้ต่างกัน 50,000 คนต้องไม่ทำให้ RSS ของโปรเซสโตตามจำนวนผู้ใช้
+
+รัน generate_text ผ่าน agent loop ถาวรด้วย stub agent (ไม่เรียก Gemini)
+ปรับจำนวนผู้ใช้และ threshold ได้ด้วย MEMORY_TEST_USERS / MEMORY_TEST_MAX_GROWTH_MB
+"""
+
+import contextlib
+import gc
+import logging
+import os
+import resource
+import sys
+from typing import NamedTuple
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+import adk_runner_service
+from agent_loop import run_coroutine
+from runner_pool import RunnerPool
+from session_cache import SessionCache
+
+NUM_USERS = int(os.getenv("MEMORY_TEST_USERS", "50000"))
+WARMUP_USERS = 2000
+MAX_GROWTH_MB = float(os.getenv("MEMORY_TEST_MAX_GROWTH_MB", "64"))
+SESSION_MAX_ENTRIES = 1000
+
+
+class StubAgent(BaseAgent):
+    """agent จำลองที่ตอบข้อความเดียวโดยไม่เรียก LLM"""
+
+    async def _run_async_impl(self, ctx):
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            content=types.Content(role="model", parts=[types.Part(text="ok")]),
+        )
+
+
+def current_rss_mb() -> float:
+    """RSS ปัจจุบันของโปรเซส (MB)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        # fallback สำหรับระบบที่ไม่มี /proc (ค่าสูงสุดแทนค่าปัจจุบัน)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StubAgentService(NamedTuple):
+    runners: RunnerPool
+    sessions: SessionCache
+    session_service: InMemorySessionService
+
+
+@contextlib.contextmanager
+def stub_agent_service():
+    """RunnerPool และ SessionCache ของการทดสอบนี้เท่านั้น (ไม่แทนที่ globals ของ adk_runner_service)"""
+    service = InMemorySessionService()
+    yield StubAgentService(
+        runners=RunnerPool(StubAgent(name="stub_agent"), adk_runner_service.APP_NAME, service),
+        sessions=SessionCache(service, adk_runner_service.APP_NAME, max_entries=SESSION_MAX_ENTRIES),
+        session_service=service,
+    )
+
+
+@pytest.fixture
+def agent_service(caplog):
+    # pytest เก็บทุก log record ของ test ไว้ในหน่วยความจำ: เก็บเฉพาะ WARNING ขึ้นไป (pytest คืน level เดิมหลัง test)
+    caplog.set_level(logging.WARNING)
+    with stub_agent_service() as service:
+        yield service
+
+
+async def simulate_users(agent_service: StubAgentService, start: int, stop: int) -> None:
+    for i in range(start, stop):
+        response = await adk_runner_service.generate_text(
+            "สวัสดี", f"U{i:032x}", runners=agent_service.runners, sessions=agent_service.sessions
+        )
+        assert response == "ok", response
+
+
+def test_rss_stays_flat_for_many_distinct_users(agent_service):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run_coroutine(simulate_users(agent_service, 0, WARMUP_USERS))
+        gc.collect()
+        baseline = current_rss_mb()
+        run_coroutine(simulate_users(agent_service, WARMUP_USERS, NUM_USERS))
+        gc.collect()
+        final = current_rss_mb()
+
+    growth = final - baseline
+    print(f"users={NUM_USERS} baseline={baseline:.1f} MB final={final:.1f} MB growth={growth:.1f} MB")
+
+    assert len(agent_service.runners) == 1
+    assert len(agent_service.sessions) <= SESSION_MAX_ENTRIES
+    sessions = agent_service.session_service.sessions.get(adk_runner_service.APP_NAME, {})
+    assert sum(len(s) for s in sessions.values()) <= SESSION_MAX_ENTRIES
+    assert growth < MAX_GROWTH_MB, f"RSS grew {growth:.1f} MB for {NUM_USERS} users"
+
+
+if __name__ == "__main__":
+    with stub_agent_service() as service:
+        test_rss_stays_flat_for_many_distinct_users(service)
+    print("✅ การทดสอบสำเร็จ")
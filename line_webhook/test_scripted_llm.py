@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ ScriptedLlm: เลือก turn ตาม regex, ตอบ step ตามจำนวน model calls ใน turn
+และรันผ่าน ADK Runner จริงพร้อมเรียก tool ตาม script
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.agents import Agent
+from google.adk.models.llm_request import LlmRequest
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from line_oa_campaign_manager.scripted_llm import DEFAULT_SCRIPT, ScriptedLlm, load_script
+
+SCRIPT = {
+    "default_delay_ms": 0,
+    "turns": [
+        {"match": "โควต้า", "steps": [
+            {"function_call": {"name": "get_message_quota", "args": {}}, "delay_ms": 50},
+            {"text": "เหลือ 458 ข้อความครับ"},
+        ]},
+        {"steps": [{"text": "สวัสดีครับ"}]},
+    ],
+}
+
+
+def user(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def test_turn_position_counts_model_responses_since_last_user_message():
+    call = types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="t", args={}))])
+    response = types.Content(role="user", parts=[types.Part(
+        function_response=types.FunctionResponse(name="t", response={"ok": True})
+    )])
+    request = LlmRequest(contents=[user("เก่า"), types.Content(role="model", parts=[types.Part(text="ตอบ")]),
+                                   user("เหลือโควต้าไหม"), call, response])
+    assert ScriptedLlm.turn_position(request) == ("เหลือโควต้าไหม", 1)
+    assert ScriptedLlm.turn_position(LlmRequest(contents=[user("สวัสดี")])) == ("สวัสดี", 0)
+
+
+def test_script_selection_and_end_of_script():
+    llm = ScriptedLlm(script=SCRIPT)
+    assert llm.select_steps("เหลือโควต้าไหม")[0]["function_call"]["name"] == "get_message_quota"
+    assert llm.select_steps("hello") == [{"text": "สวัสดีครับ"}]
+
+    async def respond(contents):
+        return [response async for response in llm.generate_content_async(LlmRequest(contents=contents))]
+
+    # model call เกินจำนวน steps จบด้วยข้อความสุดท้ายแทนการเรียก tool ซ้ำ
+    call = types.Content(role="model", parts=[types.Part(text="...")])
+    [response] = asyncio.run(respond([user("hello"), call]))
+    assert response.content.parts[0].text == "สวัสดีครับ"
+    assert load_script("default") is DEFAULT_SCRIPT
+
+
+def test_runner_executes_scripted_tool_calls():
+    calls = []
+
+    def get_message_quota() -> dict:
+        """คืนโควต้าข้อความ"""
+        calls.append(time.perf_counter())
+        return {"limited": 500, "totalUsage": 42}
+
+    agent = Agent(name="scripted", model=ScriptedLlm(script=SCRIPT), tools=[get_message_quota])
+    runner = InMemoryRunner(agent=agent, app_name="scripted")
+
+    async def run(text):
+        session = await runner.session_service.create_session(app_name="scripted", user_id="U1")
+        started = time.perf_counter()
+        events = [event async for event in runner.run_async(user_id="U1", session_id=session.id, new_message=user(text))]
+        return events, time.perf_counter() - started
+
+    events, elapsed = asyncio.run(run("เหลือโควต้ากี่ข้อความ"))
+    assert len(calls) == 1
+    assert [bool(event.get_function_calls()) for event in events] == [True, False, False]
+    assert events[1].get_function_responses()[0].response == {"limited": 500, "totalUsage": 42}
+    assert events[-1].content.parts[0].text == "เหลือ 458 ข้อความครับ"
+    assert elapsed >= 0.05  # delay_ms ของ step แรก
+
+
+if __name__ == "__main__":
+    test_turn_position_counts_model_responses_since_last_user_message()
+    test_script_selection_and_end_of_script()
+    test_runner_executes_scripted_tool_calls()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ SessionCache: ใช้ session เดิมซ้ำ, หมดอายุตาม TTL, evict แบบ LRU, ไม่ลบ session ที่มี turn กำลังรัน
+และล็อกแยกต่อผู้ใช้
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.sessions import InMemorySessionService
+
+from fake_clock import FakeClock
+from session_cache import SessionCache
+
+APP_NAME = "test_app"
+
+
+def count_sessions(service: InMemorySessionService) -> int:
+    return sum(len(sessions) for sessions in service.sessions.get(APP_NAME, {}).values())
+
+
+def test_reuses_session_per_user():
+    async def scenario():
+        service = InMemorySessionService()
+        cache = SessionCache(service, APP_NAME, ttl_seconds=60, max_entries=10, clock=FakeClock())
+        first = await cache.get_or_create("U1")
+        second = await cache.get_or_create("U1")
+        assert first == second
+        assert count_sessions(service) == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_idle_ttl_expires_and_deletes_session():
+    async def scenario():
+        clock = FakeClock()
+        service = InMemorySessionService()
+        cache = SessionCache(service, APP_NAME, ttl_seconds=60, max_entries=10, clock=clock)
+        first = await cache.get_or_create("U1")
+        clock.now = 61
+        second = await cache.get_or_create("U1")
+        assert first != second
+        assert count_sessions(service) == 1
+        assert cache.stats()["expirations"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_lru_bound_keeps_memory_flat():
+    async def scenario():
+        clock = FakeClock()
+        service = InMemorySessionService()
+        cache = SessionCache(service, APP_NAME, ttl_seconds=3600, max_entries=100, clock=clock)
+        for i in range(5000):
+            clock.now = i
+            await cache.get_or_create(f"U{i}")
+            if i % 10 == 0:
+                await cache.get_or_create("U_active")  # ผู้ใช้ที่คุยบ่อยต้องไม่ถูก evict
+        assert len(cache) == 100
+        assert count_sessions(service) == 100
+        assert len(service.sessions[APP_NAME]) == 100
+        assert "U_active" in cache
+        assert cache.stats()["evictions"] == 5001 - 100
+
+    asyncio.run(scenario())
+
+
+def test_sessions_with_turns_in_flight_are_not_evicted():
+    async def scenario():
+        clock = FakeClock()
+        service = InMemorySessionService()
+        cache = SessionCache(service, APP_NAME, ttl_seconds=60, max_entries=1, clock=clock)
+        with cache.turn("U1"):
+            first = await cache.get_or_create("U1")
+            await cache.get_or_create("U2")  # เกิน max_entries แต่ U1 กำลังรัน turn จึงลบ U2 แทน
+            assert "U1" in cache and "U2" not in cache
+            clock.now = 120
+            assert await cache.expire_idle() == 0
+            assert not await cache.evict("U1")
+        # จบ turn แล้วนับ idle TTL ใหม่จากตอนนี้
+        assert await cache.get_or_create("U1") == first
+        clock.now = 181
+        assert await cache.expire_idle() == 1
+        assert count_sessions(service) == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_session_service_only_blocks_the_same_user():
+    class SlowSessionService(InMemorySessionService):
+        async def create_session(self, **kwargs):
+            await asyncio.sleep(0.2 if kwargs["user_id"] == "U-slow" else 0)
+            return await super().create_session(**kwargs)
+
+    async def scenario():
+        service = SlowSessionService()
+        cache = SessionCache(service, APP_NAME, clock=FakeClock())
+        slow = asyncio.ensure_future(asyncio.gather(cache.get_or_create("U-slow"), cache.get_or_create("U-slow")))
+        await asyncio.sleep(0.01)
+        # ผู้ใช้อื่นไม่ต้องรอ create_session ของ U-slow
+        await asyncio.wait_for(cache.get_or_create("U-fast"), timeout=0.1)
+        first, second = await slow
+        # ข้อความที่มาพร้อมกันของผู้ใช้คนเดียวกันได้ session เดียวกัน
+        assert first == second and count_sessions(service) == 2
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_reuses_session_per_user()
+    test_idle_ttl_expires_and_deletes_session()
+    test_lru_bound_keeps_memory_flat()
+    test_sessions_with_turns_in_flight_are_not_evicted()
+    test_slow_session_service_only_blocks_the_same_user()
+    print("✅ การทดสอบสำเร็จ")
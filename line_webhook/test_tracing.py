@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+ทดสอบ tracing: span ของ agent run / ADK events / tool calls ถูกเขียนลงไฟล์ JSONL
+อยู่ใน trace เดียวกับ span ของ webhook และมี user_id กับ webhookEventId ทุก span
+"""
+
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.events import Event
+from google.genai import types
+
+import tracing
+from agent_loop import run_coroutine
+from turn_scheduler import TurnScheduler
+
+TRACE_FILE = ""
+
+
+@contextlib.contextmanager
+def tracing_to(directory: str):
+    """ตั้ง TracerProvider ให้ export ลง directory/traces.jsonl แล้วปิดและคืนค่า global provider ของ OpenTelemetry"""
+    from opentelemetry import trace
+    from opentelemetry.util._once import Once
+
+    global TRACE_FILE
+    TRACE_FILE = os.path.join(directory, "traces.jsonl")
+    tracing.setup_tracing(TRACE_FILE, batch=False)
+    try:
+        yield TRACE_FILE
+    finally:
+        tracing.shutdown_tracing()
+        # OpenTelemetry ตั้ง global provider ได้ครั้งเดียว คืนเป็นค่าเริ่มต้น (no-op) ให้ tests อื่น
+        trace._TRACER_PROVIDER = None
+        trace._TRACER_PROVIDER_SET_ONCE = Once()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def trace_file(tmp_path_factory):
+    with tracing_to(str(tmp_path_factory.mktemp("traces"))) as path:
+        yield path
+
+
+def read_spans(trace_id: str | None = None) -> list[dict]:
+    tracing.flush_tracing()
+    with open(TRACE_FILE, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f]
+    return [span for span in spans if trace_id is None or span["trace_id"] == trace_id]
+
+
+def current_trace_id() -> str:
+    from opentelemetry import trace
+
+    return f"{trace.get_current_span().get_span_context().trace_id:032x}"
+
+
+def tool_call_events(call_id: str = "call-1") -> list[Event]:
+    call = types.Part(function_call=types.FunctionCall(id=call_id, name="get_message_quota", args={}))
+    response = types.Part(function_response=types.FunctionResponse(
+        id=call_id, name="get_message_quota", response={"totalUsage": 10}
+    ))
+    return [
+        Event(author="agent", content=types.Content(role="model", parts=[call])),
+        Event(author="agent", content=types.Content(role="user", parts=[response])),
+        Event(author="agent", content=types.Content(role="model", parts=[types.Part(text="ใช้ไป 10 ข้อความ")])),
+    ]
+
+
+def test_spans_follow_turn_into_agent_loop_and_scheduler():
+    scheduler = TurnScheduler(max_concurrency=2)
+
+    async def turn():
+        with tracing.span("inner"):
+            return current_trace_id()
+
+    def handle(user_id, event_id):
+        with tracing.correlate(user_id, event_id), tracing.span("line.message"):
+            return current_trace_id(), run_coroutine(scheduler.run("U-same", turn))
+
+    # สอง turns ของผู้ใช้คนเดียวกันรันผ่าน worker เดียวกันใน scheduler แต่ต้องอยู่ใน trace ของตัวเอง
+    with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        results = list(pool.map(handle, ["U-same", "U-same"], ["EV-1", "EV-2"]))
+    for (outer_trace, inner_trace), event_id in zip(results, ["EV-1", "EV-2"]):
+        assert outer_trace == inner_trace
+        spans = {span["name"]: span for span in read_spans(outer_trace)}
+        message, inner = spans["line.message"], spans["inner"]
+        assert inner["parent_span_id"] == message["span_id"]
+        assert inner["attributes"] == {"user_id": "U-same", "webhookEventId": event_id}
+
+
+def test_event_spans_pair_function_calls_with_responses():
+    with tracing.span("adk.agent_run"):
+        trace_id = current_trace_id()
+        event_spans = tracing.EventSpans()
+        for event in tool_call_events():
+            event_spans.on_event(event)
+        event_spans.on_event(tool_call_events("call-2")[0])  # call ที่ไม่มี response
+        event_spans.close()
+
+    spans = read_spans(trace_id)
+    [run] = [span for span in spans if span["name"] == "adk.agent_run"]
+    events = [span for span in spans if span["name"] == "adk.event"]
+    tools = sorted((span for span in spans if span["name"] == "adk.tool"), key=lambda s: s["attributes"]["adk.tool.call_id"])
+    assert [span["attributes"]["adk.event.kind"] for span in events] == ["function_call", "function_response", "text", "function_call"]
+    assert all(span["parent_span_id"] == run["span_id"] for span in events + tools)
+    assert [tool["attributes"]["adk.tool.name"] for tool in tools] == ["get_message_quota"] * 2
+    assert [tool["status"] for tool in tools] == ["UNSET", "ERROR"]
+
+
+def test_generate_text_emits_agent_run_and_tool_spans():
+    import adk_runner_service
+
+    class FakeRunner:
+        async def run_async(self, user_id, session_id, new_message):
+            for event in tool_call_events():
+                yield event
+
+    with patch.object(adk_runner_service.runner_pool, "get_runner", lambda: FakeRunner()), \
+            contextlib.redirect_stdout(io.StringIO()):
+        with tracing.correlate("U-trace", "EV-trace"), tracing.span("line.message"):
+            trace_id = current_trace_id()
+            assert run_coroutine(adk_runner_service.generate_text("เหลือกี่ข้อความ", "U-trace")) == "ใช้ไป 10 ข้อความ"
+
+    spans = read_spans(trace_id)
+    names = [span["name"] for span in spans]
+    assert names.count("adk.agent_run") == 1 and names.count("adk.tool") == 1 and names.count("adk.event") == 3
+    assert all(span["attributes"]["user_id"] == "U-trace" for span in spans)
+    assert all(span["attributes"]["webhookEventId"] == "EV-trace" for span in spans)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory, tracing_to(directory):
+        test_spans_follow_turn_into_agent_loop_and_scheduler()
+        test_event_spans_pair_function_calls_with_responses()
+        test_generate_text_emits_agent_run_and_tool_spans()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Load test ของ TurnScheduler บน agent loop จริง (จำลอง Flask threads หลายตัวส่ง turns เข้ามา)
+
+- turns ของผู้ใช้คนเดียวกันรันตามลำดับ ไม่ซ้อนกัน
+- throughput เพิ่มขึ้นตามจำนวนผู้ใช้จนถึง max_concurrency
+- backlog เกินขีดจำกัดถูกปฏิเสธด้วย SchedulerBusy
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agent_loop import get_agent_loop
+from turn_scheduler import SchedulerBusy, TurnScheduler
+
+TURN_SECONDS = 0.05
+
+
+class TurnRecorder:
+    """turn จำลองที่บันทึกลำดับการรันและจำนวน turns ที่ซ้อนกัน"""
+
+    def __init__(self):
+        self.order: dict[str, list[int]] = {}
+        self.active_users: set[str] = set()
+        self.overlaps = 0
+
+    def turn(self, user_id: str, seq: int):
+        async def run():
+            if user_id in self.active_users:
+                self.overlaps += 1
+            self.active_users.add(user_id)
+            try:
+                await asyncio.sleep(TURN_SECONDS)
+            finally:
+                self.active_users.discard(user_id)
+            self.order.setdefault(user_id, []).append(seq)
+            return f"{user_id}:{seq}"
+
+        return run
+
+
+def run_load(scheduler: TurnScheduler, users: int, messages_per_user: int) -> tuple[TurnRecorder, float]:
+    recorder = TurnRecorder()
+
+    def send_user_messages(user_id: str):
+        # ส่งข้อความของผู้ใช้ต่อกันโดยไม่รอผล เหมือน webhook หลายตัวที่เข้ามาติดกัน
+        futures = [
+            get_agent_loop().submit(scheduler.run(user_id, recorder.turn(user_id, seq)))
+            for seq in range(messages_per_user)
+        ]
+        return [future.result(timeout=30) for future in futures]
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(send_user_messages, [f"U{i}" for i in range(users)]))
+    elapsed = time.perf_counter() - start
+    assert all(len(user_results) == messages_per_user for user_results in results)
+    return recorder, elapsed
+
+
+def test_orders_turns_per_user():
+    scheduler = TurnScheduler(max_concurrency=8, max_pending=1000, max_pending_per_user=100)
+    recorder, _ = run_load(scheduler, users=10, messages_per_user=5)
+    assert recorder.overlaps == 0
+    assert len(recorder.order) == 10
+    for user_id, order in recorder.order.items():
+        assert order == list(range(5)), f"{user_id} ran out of order: {order}"
+    stats = scheduler.stats()
+    assert stats["completed"] == 50
+    assert stats["max_running"] <= 8
+    assert stats["pending"] == 0 and stats["active_users"] == 0
+
+
+def test_throughput_scales_across_users():
+    results = {}
+    for users in (1, 4, 8):
+        scheduler = TurnScheduler(max_concurrency=8, max_pending=1000, max_pending_per_user=100)
+        _, elapsed = run_load(scheduler, users=users, messages_per_user=5)
+        results[users] = users * 5 / elapsed
+        print(f"{users} users: {results[users]:.1f} turns/s (max_running={scheduler.stats()['max_running']})")
+    assert results[4] > 2.5 * results[1]
+    assert results[8] > 5 * results[1]
+
+
+def test_rejects_when_backlog_full():
+    async def scenario():
+        scheduler = TurnScheduler(max_concurrency=1, max_pending=3, max_pending_per_user=2)
+        recorder = TurnRecorder()
+        tasks = [asyncio.create_task(scheduler.run("U1", recorder.turn("U1", 0)))]
+        await asyncio.sleep(0)  # turn แรกเริ่มรันแล้ว ไม่นับเป็น pending
+        tasks += [asyncio.create_task(scheduler.run("U1", recorder.turn("U1", seq))) for seq in (1, 2)]
+        await asyncio.sleep(0)
+        try:
+            await scheduler.run("U1", recorder.turn("U1", 3))
+            raise AssertionError("expected SchedulerBusy for per-user backlog")
+        except SchedulerBusy:
+            pass
+        tasks.append(asyncio.create_task(scheduler.run("U2", recorder.turn("U2", 0))))
+        await asyncio.sleep(0)
+        try:
+            await scheduler.run("U3", recorder.turn("U3", 0))
+            raise AssertionError("expected SchedulerBusy for global backlog")
+        except SchedulerBusy:
+            pass
+        await asyncio.gather(*tasks)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 2
+    assert stats["completed"] == 4
+    assert stats["max_running"] == 1
+
+
+def test_cancelled_turn_is_skipped():
+    async def scenario():
+        scheduler = TurnScheduler(max_concurrency=1)
+        recorder = TurnRecorder()
+        first = asyncio.create_task(scheduler.run("U1", recorder.turn("U1", 0)))
+        second = asyncio.create_task(scheduler.run("U1", recorder.turn("U1", 1)))
+        await asyncio.sleep(0)
+        second.cancel()
+        await first
+        await asyncio.sleep(TURN_SECONDS * 2)
+        return recorder.order, scheduler.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == {"U1": [0]}
+    assert stats["pending"] == 0 and stats["active_users"] == 0
+
+
+if __name__ == "__main__":
+    test_orders_turns_per_user()
+    test_throughput_scales_across_users()
+    test_rejects_when_backlog_full()
+    test_cancelled_turn_is_skipped()
+    print("✅ การทดสอบสำเร็จ")
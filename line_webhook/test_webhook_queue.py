@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+ทดสอบโหมด queue ของ webhook: ตอบ LINE ทันที แล้วให้ worker pool ประมวลผล events
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, patch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('MANAGER_OA_LINE_CHANNEL_ACCESS_TOKEN', 'test_channel_token')
+os.environ.setdefault('MANAGER_OA_LINE_CHANNEL_SECRET', 'test_channel_secret')
+os.environ.setdefault('ADK_WARM_UP', 'lazy')
+
+AGENT_DELAY_SECONDS = 0.5
+
+
+def make_text_event(user_id: str, text: str, index: int = 0) -> dict:
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "webhookEventId": f"01TESTEVENT{index:015d}",
+        "deliveryContext": {"isRedelivery": False},
+        "source": {"type": "user", "userId": user_id},
+        "replyToken": f"reply_token_{index}",
+        "message": {"type": "text", "id": str(index), "quoteToken": f"q{index}", "text": text},
+    }
+
+
+def sign(body: str, channel_secret: str) -> str:
+    digest = hmac.new(channel_secret.encode(), body.encode(), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+def as_submit_text(agent):
+    """
+    แปลง agent จำลองแบบ sync เป็น submit_text ที่คืน future (ใช้แทน adk_runner_service.submit_text)
+    ข้อความของผู้ใช้คนเดียวกันรันทีละข้อความตามลำดับที่ส่งเข้ามา เหมือน turn scheduler
+    """
+    executors: dict[str, ThreadPoolExecutor] = {}
+    lock = threading.Lock()
+
+    def submit_text(user_input, user_id=None):
+        with lock:
+            if user_id not in executors:
+                executors[user_id] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fake-agent")
+            return executors[user_id].submit(agent, user_input, user_id)
+
+    return submit_text
+
+
+def test_queue_mode_acknowledges_immediately():
+    import main
+
+    def slow_agent(user_input, user_id=None):
+        time.sleep(AGENT_DELAY_SECONDS)
+        return f"echo: {user_input}"
+
+    body = json.dumps({
+        "destination": "Udestination",
+        "events": [make_text_event(f"U{i}", f"สวัสดี {i}", i) for i in range(3)],
+    })
+
+    line_bot_api = AsyncMock()
+    with patch.object(main, "WEBHOOK_MODE", "queue"), \
+            patch("line_api.get_async_line_bot_api", AsyncMock(return_value=line_bot_api)), \
+            patch("line_api.fire_and_forget"), \
+            patch("adk_runner_service.submit_text", as_submit_text(slow_agent)):
+        with main.app.test_client() as client:
+            start = time.perf_counter()
+            response = client.post(
+                "/",
+                data=body,
+                content_type="application/json",
+                headers={"X-Line-Signature": sign(body, main.CHANNEL_SECRET)},
+            )
+            elapsed = time.perf_counter() - start
+
+            assert response.status_code == 200
+            assert elapsed < AGENT_DELAY_SECONDS
+
+            assert main.webhook_queue.join(timeout=10)
+            assert main.wait_for_deliveries(timeout=10)
+            assert line_bot_api.reply_message_with_http_info.await_count == 3
+
+            stats = client.get("/stats").get_json()["webhook_queue"]
+            assert stats["depth"] == 0
+            assert stats["processed"] >= 3
+            print(f"ack={elapsed * 1000:.1f} ms, queue stats={stats}")
+
+
+def test_queue_rejects_when_full():
+    from webhook_queue import WebhookEventQueue
+
+    queue = WebhookEventQueue(dispatch=lambda event, destination: time.sleep(0.2), maxsize=2, workers=1)
+    assert queue.put_events(["a"])
+    time.sleep(0.05)  # ให้ worker หยิบ event แรกไปก่อน
+    assert queue.put_events(["b", "c"])
+    assert not queue.put_events(["d"])
+    assert queue.join(timeout=5)
+    stats = queue.stats()
+    assert stats["processed"] == 3
+    assert stats["rejected"] == 1
+    assert stats["wait_seconds"]["max"] > 0
+
+
+if __name__ == "__main__":
+    test_queue_mode_acknowledges_immediately()
+    test_queue_rejects_when_full()
+    print("✅ การทดสอบสำเร็จ")
@@ -0,0 +1,204 @@
+"""
+OpenTelemetry tracing ของ webhook และ agent turn พร้อม exporter ลงไฟล์ JSONL
+
+- span: line.webhook (request) > line.message (event) > adk.agent_run > adk.event / adk.tool
+  และ mcp.* ของแต่ละ MCP request (span ของ ADK เอง เช่น call_llm ก็ถูกเก็บด้วย)
+- ทุก span มี attribute user_id และ webhookEventId จาก baggage (ดู correlate)
+- เปิดด้วย TRACE_EXPORT_FILE=/tmp/traces.jsonl (หนึ่ง span ต่อบรรทัด ใช้ได้แบบ offline และในการทดสอบ)
+  ถ้าไม่ตั้งค่า span ทั้งหมดเป็น no-op
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+from opentelemetry import baggage, context, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    SimpleSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")
+# attribute ที่ใช้เชื่อม span กับผู้ใช้และ webhook event ของ LINE
+CORRELATION_KEYS = ("user_id", "webhookEventId")
+
+tracer = trace.get_tracer("line_webhook")
+
+_provider: TracerProvider | None = None
+_provider_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return _provider is not None
+
+
+def span_to_dict(span) -> dict:
+    """แปลง ReadableSpan เป็น dict หนึ่งบรรทัดของไฟล์ JSONL"""
+    parent = span.parent
+    return {
+        "name": span.name,
+        "trace_id": f"{span.context.trace_id:032x}",
+        "span_id": f"{span.context.span_id:016x}",
+        "parent_span_id": f"{parent.span_id:016x}" if parent else None,
+        "kind": span.kind.name,
+        "start_time_unix_nano": span.start_time,
+        "end_time_unix_nano": span.end_time,
+        "duration_ms": (span.end_time - span.start_time) / 1e6,
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+        "events": [
+            {"name": event.name, "time_unix_nano": event.timestamp, "attributes": dict(event.attributes or {})}
+            for event in span.events
+        ],
+        "service": (span.resource.attributes or {}).get("service.name"),
+    }
+
+
+class CorrelationSpanProcessor(SpanProcessor):
+    """คัดลอก user_id / webhookEventId จาก baggage ไปเป็น attribute ของทุก span ที่เริ่ม"""
+
+    def on_start(self, span, parent_context=None) -> None:
+        for key in CORRELATION_KEYS:
+            value = baggage.get_baggage(key, parent_context)
+            if value is not None:
+                span.set_attribute(key, value)
+
+
+class JsonlFileSpanExporter(SpanExporter):
+    """เขียน span ที่จบแล้วต่อท้ายไฟล์ หนึ่ง JSON ต่อบรรทัด"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans) -> SpanExportResult:
+        lines = "".join(json.dumps(span_to_dict(span), ensure_ascii=False, default=str) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def setup_tracing(export_file: str = TRACE_EXPORT_FILE, batch: bool = True) -> TracerProvider | None:
+    """
+    ตั้ง TracerProvider ของโปรเซสให้ export ลง export_file (เรียกครั้งแรกเท่านั้นที่มีผล)
+    batch=False export ทันทีที่ span จบ (ใช้ในการทดสอบ)
+    """
+    global _provider
+    if not export_file:
+        return None
+    with _provider_lock:
+        if _provider is None:
+            provider = TracerProvider(
+                resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "line-oa-webhook")})
+            )
+            provider.add_span_processor(CorrelationSpanProcessor())
+            exporter = JsonlFileSpanExporter(export_file)
+            provider.add_span_processor(BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter))
+            trace.set_tracer_provider(provider)
+            _provider = provider
+    return _provider
+
+
+def shutdown_tracing() -> None:
+    """export span ที่ค้างแล้วปิด TracerProvider ของ setup_tracing (เรียก setup_tracing ใหม่ได้หลังจากนี้)"""
+    global _provider
+    with _provider_lock:
+        provider, _provider = _provider, None
+    if provider is not None:
+        provider.shutdown()
+
+
+def flush_tracing(timeout_millis: int = 5000) -> None:
+    """เขียน span ที่ค้างใน batch ออกไฟล์ (ใช้ในการทดสอบและก่อนปิดโปรเซส)"""
+    if _provider is not None:
+        _provider.force_flush(timeout_millis)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """span ลูกของ span ปัจจุบัน (attribute ที่เป็น None ถูกข้าม)"""
+    with tracer.start_as_current_span(
+        name, attributes={key: value for key, value in attributes.items() if value is not None}
+    ) as current:
+        yield current
+
+
+@contextlib.contextmanager
+def correlate(user_id: str | None = None, webhook_event_id: str | None = None):
+    """ผูก user_id / webhookEventId กับทุก span ที่เริ่มภายใน context นี้ (รวมถึงใน agent loop)"""
+    ctx = context.get_current()
+    for key, value in zip(CORRELATION_KEYS, (user_id, webhook_event_id)):
+        if value is not None:
+            ctx = baggage.set_baggage(key, value, ctx)
+    token = context.attach(ctx)
+    try:
+        yield
+    finally:
+        context.detach(token)
+
+
+class EventSpans:
+    """
+    span ของ agent run หนึ่งครั้งจาก stream ของ ADK events
+    - adk.event: เวลาตั้งแต่ event ก่อนหน้าถึง event นี้ (เวลาที่ model หรือ tool ใช้สร้าง event)
+    - adk.tool: เวลาตั้งแต่ function call จนได้ function response ที่มี id เดียวกัน
+    """
+
+    def __init__(self):
+        self.enabled = enabled()
+        self._parent = context.get_current()
+        self._last = time.time_ns()
+        self._calls: dict[str, trace.Span] = {}
+
+    def on_event(self, event) -> None:
+        if not self.enabled:
+            return
+        now = time.time_ns()
+        calls = event.get_function_calls()
+        responses = event.get_function_responses()
+        kind = "function_call" if calls else "function_response" if responses else "text"
+        event_span = tracer.start_span(
+            "adk.event",
+            context=self._parent,
+            start_time=self._last,
+            attributes={
+                "adk.event.id": event.id,
+                "adk.event.author": event.author or "",
+                "adk.event.kind": kind,
+                "adk.event.final": event.is_final_response(),
+                "adk.event.function_calls": [call.name for call in calls],
+            },
+        )
+        event_span.end(end_time=now)
+
+        for call in calls:
+            self._calls[call.id or call.name] = tracer.start_span(
+                "adk.tool",
+                context=self._parent,
+                start_time=now,
+                attributes={"adk.tool.name": call.name, "adk.tool.call_id": call.id or ""},
+            )
+        for response in responses:
+            tool_span = self._calls.pop(response.id or response.name, None)
+            if tool_span is not None:
+                result = response.response or {}
+                if isinstance(result, dict) and (result.get("error") or result.get("isError")):
+                    tool_span.set_status(trace.Status(trace.StatusCode.ERROR))
+                tool_span.end(end_time=now)
+        self._last = time.time_ns()
+
+    def close(self) -> None:
+        """ปิด span ของ function call ที่ไม่ได้รับ response (เช่น run ถูกยกเลิกหรือ timeout)"""
+        for tool_span in self._calls.values():
+            tool_span.set_status(trace.Status(trace.StatusCode.ERROR, "no function response"))
+            tool_span.end()
+        self._calls.clear()
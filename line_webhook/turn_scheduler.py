@@ -0,0 +1,131 @@
+"""
+Scheduler ของ agent turns บน agent loop
+
+- turns ของผู้ใช้คนเดียวกันรันทีละ turn ตามลำดับที่เข้ามา (FIFO) ไม่แย่งกันใช้ session
+- turns ของผู้ใช้ต่างคนรันพร้อมกันได้ไม่เกิน max_concurrency (จำกัดจำนวน request ไปยัง Gemini)
+- ถ้า turns ที่รออยู่เกิน max_pending (หรือ max_pending_per_user) จะปฏิเสธทันทีด้วย SchedulerBusy
+  เพื่อให้ผู้เรียกตอบผู้ใช้ว่าระบบไม่ว่าง แทนที่จะรอจนหมด timeout
+"""
+
+import asyncio
+import collections
+import contextvars
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerBusy(Exception):
+    """turns ที่รออยู่เกินขีดจำกัด"""
+
+
+class TurnScheduler:
+    """คิว FIFO แยกตาม user_id พร้อม global concurrency limit และ backpressure"""
+
+    def __init__(self, max_concurrency: int = 8, max_pending: int = 100, max_pending_per_user: int = 5):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_pending_per_user = max_pending_per_user
+
+        # user_id -> deque ของ (turn factory, future, enqueued_at)
+        self._queues: dict[str, collections.deque] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        self._semaphore: asyncio.Semaphore | None = None
+
+        self.pending = 0
+        self.running = 0
+        self.max_running = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._wait_seconds: collections.deque[float] = collections.deque(maxlen=1000)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, user_id: str, turn):
+        """
+        รอคิวของ user_id แล้วรัน turn() (coroutine function) คืนผลของ turn
+
+        Raises:
+            SchedulerBusy: ถ้า backlog เกินขีดจำกัด
+        """
+        queue = self._queues.get(user_id)
+        user_pending = len(queue) if queue else 0
+        if self.pending >= self.max_pending or user_pending >= self.max_pending_per_user:
+            self.rejected += 1
+            logger.warning(
+                f"[SCHEDULER] Rejecting turn for {user_id} "
+                f"(pending={self.pending}, user_pending={user_pending})"
+            )
+            raise SchedulerBusy(user_id)
+
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._queues[user_id] = collections.deque()
+        # turn รันใน contextvars ของผู้เรียก (เช่น trace context ของ webhook) ไม่ใช่ของ worker
+        queue.append((turn, future, time.perf_counter(), contextvars.copy_context()))
+        self.pending += 1
+        if user_id not in self._workers:
+            self._workers[user_id] = asyncio.create_task(self._drain(user_id))
+        # ถ้าผู้เรียกยกเลิก (เช่น timeout) future จะถูก cancel และ turn ที่ยังไม่เริ่มจะถูกข้าม
+        return await future
+
+    async def _drain(self, user_id: str) -> None:
+        queue = self._queues[user_id]
+        try:
+            while queue:
+                turn, future, enqueued_at, turn_context = queue.popleft()
+                self.pending -= 1
+                if future.done():
+                    continue
+                async with self._get_semaphore():
+                    if future.done():
+                        continue
+                    self._wait_seconds.append(time.perf_counter() - enqueued_at)
+                    self.running += 1
+                    self.max_running = max(self.max_running, self.running)
+                    task = asyncio.create_task(turn(), context=turn_context)
+                    future.add_done_callback(lambda f, task=task: task.cancel() if f.cancelled() else None)
+                    try:
+                        result = await asyncio.shield(task)
+                        self.completed += 1
+                        if not future.done():
+                            future.set_result(result)
+                    except asyncio.CancelledError:
+                        if not task.done():
+                            raise  # worker เองถูกยกเลิก
+                        self.cancelled += 1
+                    except Exception as e:
+                        self.failed += 1
+                        if not future.done():
+                            future.set_exception(e)
+                    finally:
+                        self.running -= 1
+        finally:
+            del self._queues[user_id]
+            del self._workers[user_id]
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_seconds)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "running": self.running,
+            "max_running": self.max_running,
+            "active_users": len(self._workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "wait_seconds": {
+                "p50": waits[len(waits) // 2] if waits else 0.0,
+                "p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "max": waits[-1] if waits else 0.0,
+            },
+        }
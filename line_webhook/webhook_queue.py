@@ -0,0 +1,214 @@
+"""
+คิวงานภายในโปรเซสสำหรับ LINE webhook events
+
+webhook จะตรวจ signature แล้วใส่ events ลงคิวนี้ และตอบ 200 กลับไปยัง LINE ทันที
+จากนั้น worker threads จะดึง events ออกมาส่งให้ handler ของ LINE SDK ประมวลผล
+
+events ใน webhook เดียวกันถูกแบ่งกลุ่มตามผู้ส่ง (user/group/room) กลุ่มต่างกันประมวลผลพร้อมกันได้
+ส่วน events ในกลุ่มเดียวกันประมวลผลตามลำดับเสมอ
+"""
+
+import collections
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from linebot.v3.webhooks import MessageEvent
+
+logger = logging.getLogger(__name__)
+
+# จำนวน wait time ล่าสุดที่เก็บไว้คำนวณ percentile
+WAIT_TIME_WINDOW = 1000
+
+
+def dispatch_event(handler, event, destination=None) -> None:
+    """
+    เรียก handler function ที่ลงทะเบียนไว้กับ WebhookHandler สำหรับ event เดียว
+    (ใช้ lookup เดียวกับ WebhookHandler.handle ของ LINE SDK)
+    """
+    func = None
+    key = None
+
+    if isinstance(event, MessageEvent):
+        key = f"{event.__class__.__name__}_{event.message.__class__.__name__}"
+        func = handler._handlers.get(key)
+
+    if func is None:
+        key = event.__class__.__name__
+        func = handler._handlers.get(key)
+
+    if func is None:
+        func = handler._default
+
+    if func is None:
+        logger.info(f"No handler of {key} and no default handler")
+        return
+
+    code = func.__code__
+    if code.co_flags & 0x04 or code.co_argcount == 2:  # *args หรือรับ destination
+        func(event, destination)
+    elif code.co_argcount == 1:
+        func(event)
+    else:
+        func()
+
+
+def event_source_key(event) -> str:
+    """key ของผู้ส่ง event (events ที่ key เดียวกันต้องประมวลผลตามลำดับ)"""
+    source = getattr(event, "source", None)
+    for attr in ("user_id", "group_id", "room_id"):
+        value = getattr(source, attr, None)
+        if value:
+            return f"{attr}:{value}"
+    return f"event:{getattr(event, 'webhook_event_id', None) or id(event)}"
+
+
+def group_events_by_source(events) -> list[list]:
+    """แบ่ง events ตามผู้ส่ง โดยคงลำดับเดิมภายในกลุ่ม และเรียงกลุ่มตาม event แรกของแต่ละกลุ่ม"""
+    groups: dict[str, list] = {}
+    for event in events:
+        groups.setdefault(event_source_key(event), []).append(event)
+    return list(groups.values())
+
+
+class WebhookEventQueue:
+    """คิวแบบจำกัดขนาด (bounded) พร้อม worker pool สำหรับประมวลผล webhook events
+
+    แต่ละรายการในคิวคือกลุ่ม events ของผู้ส่งเดียวกันจาก webhook หนึ่งครั้ง
+    worker หนึ่งตัวประมวลผลทั้งกลุ่มตามลำดับ กลุ่มของผู้ส่งต่างกันกระจายไปหลาย workers
+    """
+
+    def __init__(self, dispatch, maxsize: int = 100, workers: int = 4):
+        """
+        Args:
+            dispatch: function(event, destination) ที่ใช้ประมวลผล event หนึ่งตัว
+            maxsize: จำนวน events สูงสุดที่รอในคิวได้
+            workers: จำนวน worker threads
+        """
+        self.dispatch = dispatch
+        self.maxsize = maxsize
+        self.workers = workers
+
+        self._items: collections.deque = collections.deque()
+        self._depth = 0  # จำนวน events ทั้งหมดในคิว (นับรวมทุกกลุ่ม)
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._pid: int | None = None
+        self._busy_workers = 0
+
+        # สถิติสำหรับใช้ sizing instance
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_times: collections.deque = collections.deque(maxlen=WAIT_TIME_WINDOW)
+        self._max_wait = 0.0
+
+    def start(self) -> None:
+        """เริ่ม worker threads (เริ่มใหม่ให้อัตโนมัติหลัง fork)"""
+        with self._cond:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker, name=f"webhook-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"[QUEUE] Started {self.workers} webhook workers (maxsize={self.maxsize})")
+
+    def put_events(self, events, destination=None) -> bool:
+        """
+        ใส่ events ทั้งหมดจาก webhook หนึ่งครั้งลงคิวแบบ all-or-nothing
+
+        Returns:
+            bool: False ถ้าคิวไม่พอ (ไม่มี event ใดถูกใส่ลงคิว)
+        """
+        self.start()
+        events = list(events)
+        now = time.monotonic()
+        with self._cond:
+            if self._depth + len(events) > self.maxsize:
+                self.rejected += len(events)
+                logger.warning(
+                    f"[QUEUE] Queue full ({self._depth}/{self.maxsize}), "
+                    f"rejected {len(events)} events"
+                )
+                return False
+            groups = group_events_by_source(events)
+            for group in groups:
+                self._items.append((group, destination, now, contextvars.copy_context()))
+            self._depth += len(events)
+            self.enqueued += len(events)
+            self._cond.notify(len(groups))
+        return True
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                group, destination, enqueued_at, group_context = self._items.popleft()
+                self._depth -= len(group)
+                wait_time = time.monotonic() - enqueued_at
+                self._wait_times.append(wait_time)
+                self._max_wait = max(self._max_wait, wait_time)
+                self._busy_workers += 1
+
+            processed = failed = 0
+            for event in group:
+                try:
+                    group_context.run(self.dispatch, event, destination)
+                    processed += 1
+                except Exception as e:
+                    import traceback
+                    failed += 1
+                    logger.error(f"[QUEUE] Error processing event: {e}")
+                    logger.error(f"[QUEUE] Traceback: {traceback.format_exc()}")
+
+            with self._cond:
+                self._busy_workers -= 1
+                self.processed += processed
+                self.failed += failed
+                self._cond.notify_all()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """รอจนคิวว่างและไม่มี worker ทำงานอยู่ (ใช้ในการทดสอบ)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._items or self._busy_workers:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def depth(self) -> int:
+        with self._cond:
+            return self._depth
+
+    def stats(self) -> dict:
+        """สถิติของคิว: ความลึกของคิว และ wait time (วินาที) ก่อน worker หยิบไปทำ"""
+        with self._cond:
+            waits = sorted(self._wait_times)
+            return {
+                "depth": self._depth,
+                "pending_groups": len(self._items),
+                "maxsize": self.maxsize,
+                "workers": self.workers,
+                "busy_workers": self._busy_workers,
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_seconds": {
+                    "avg": sum(waits) / len(waits) if waits else 0.0,
+                    "p50": waits[len(waits) // 2] if waits else 0.0,
+                    "p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                    "max": self._max_wait,
+                },
+            }